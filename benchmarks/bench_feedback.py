@@ -0,0 +1,101 @@
+"""
+反馈写入基准测试：每个请求在事件循环上单独提交 vs 后台批量写入（durable / async 两种确认模式）
+
+并发提交 --requests 条反馈记录（每次最多 --concurrency 个请求在途），测量吞吐量、请求延迟（p50/p99）
+以及事件循环的最大停顿（一个每 1ms 唤醒的计时任务观察到的最大延迟）；每种模式使用单独的临时数据库，并校验写入条数。
+
+用法:
+    python benchmarks/bench_feedback.py
+    python benchmarks/bench_feedback.py --requests 5000 --concurrency 200 --batch-size 64
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from revelation.data import database
+from revelation.data.database import create_feedback_record, init_db, session_scope
+from revelation.data.feedback_writer import FeedbackWriter
+
+
+async def _ticker(stop, lags):
+    """记录事件循环的调度延迟"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - start) * 1000.0 - 1.0)
+
+
+async def _run(submit, requests, concurrency):
+    """返回 (总耗时 s, 排好序的请求延迟 ms, 事件循环最大停顿 ms)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await submit(f"2024-01-01/{i:08d}.jpg", f"label_{i % 500}")
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(_ticker(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    latencies.sort()
+    return elapsed, latencies, max(lags, default=0.0)
+
+
+async def _legacy(image_path, label):
+    """原先的实现：在事件循环上单独打开会话并提交"""
+    create_feedback_record(image_path=image_path, label=label)
+
+
+async def _bench(mode, args):
+    database._db_path = os.path.join(tempfile.mkdtemp(), "feedback.db")
+    init_db()
+
+    writer = None
+    if mode == "legacy":
+        submit = _legacy
+    else:
+        writer = FeedbackWriter(queue_size=args.requests, batch_size=args.batch_size,
+                                flush_ms=args.flush_ms, ack_mode=mode)
+        await writer.start()
+        submit = writer.submit
+
+    elapsed, latencies, max_lag = await _run(submit, args.requests, args.concurrency)
+    if writer is not None:
+        # async 模式入队即返回，计入写完队列的时间
+        drain = time.perf_counter()
+        await writer.stop()
+        elapsed += time.perf_counter() - drain
+
+    with session_scope() as db:
+        written = db.query(database.FeedbackRecord).count()
+
+    n = len(latencies)
+    batches = writer.stats()["total_batches"] if writer is not None else n
+    print(f"{mode:8s}{args.requests / elapsed:10.0f} req/s  p50 {latencies[n // 2]:8.2f} ms  "
+          f"p99 {latencies[min(n - 1, int(n * 0.99))]:8.2f} ms  max loop stall {max_lag:8.2f} ms  "
+          f"{batches:5d} commits  written {written}/{args.requests}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--flush-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    for mode in ("legacy", "durable", "async"):
+        asyncio.run(_bench(mode, args))
+
+
+if __name__ == "__main__":
+    main()
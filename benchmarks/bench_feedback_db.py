@@ -0,0 +1,131 @@
+"""
+反馈数据库基准测试：默认 SQLite 设置 vs 调优后的设置（WAL、synchronous、页缓存、连接池、索引），百万行规模
+
+每种设置使用单独的临时数据库，先批量填充到 --rows 行（不计时），再测量：
+单条提交和按批提交的插入速率，以及 offset / keyset 深翻页、按 label、按创建时间查询的延迟（p50/p99）。
+默认设置即原先的实现：每次操作新建连接、DELETE 日志 + synchronous=FULL、label 和 created_at 无索引。
+
+用法:
+    python benchmarks/bench_feedback_db.py
+    python benchmarks/bench_feedback_db.py --rows 1000000 --single 2000 --batches 200 --queries 200
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from revelation.data import database
+from revelation.data.database import (
+    FeedbackRecord, Base, init_db, session_scope,
+    create_feedback_record, create_feedback_records, get_feedback_records
+)
+
+_LABELS = 5000
+_START = datetime(2024, 1, 1)
+
+
+def _init_default(db_path):
+    """原先的引擎：无连接参数调优、每次操作新建连接、只有主键索引"""
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False}, poolclass=NullPool)
+    Base.metadata.create_all(bind=engine)
+    for index in FeedbackRecord.__table__.indexes:
+        index.drop(bind=engine)
+    database._engine = engine
+    database._SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+
+def _fill(rows, chunk=50000):
+    """批量填充，每秒一条记录"""
+    table = FeedbackRecord.__table__
+    for start in range(0, rows, chunk):
+        batch = []
+        for i in range(start, min(rows, start + chunk)):
+            created_at = _START + timedelta(seconds=i)
+            batch.append({
+                "image_path": f"{created_at:%Y-%m-%d}/{i:08d}.jpg", "label": f"label_{i % _LABELS}",
+                "created_at": created_at, "updated_at": created_at
+            })
+        with database._engine.begin() as conn:
+            conn.execute(table.insert(), batch)
+
+
+def _rate(fn, count):
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+
+def _latency(fn, args_list):
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    latencies.sort()
+    n = len(latencies)
+    return f"p50 {latencies[n // 2]:8.3f} ms  p99 {latencies[min(n - 1, int(n * 0.99))]:8.3f} ms"
+
+
+def _offset_page(skip, limit):
+    """原先的分页：offset 扫描并丢弃前面的行"""
+    with session_scope() as db:
+        return db.query(FeedbackRecord).order_by(FeedbackRecord.id).offset(skip).limit(limit).all()
+
+
+def _bench(mode, args):
+    db_path = os.path.join(tempfile.mkdtemp(), "feedback.db")
+    if mode == "default":
+        _init_default(db_path)
+    else:
+        database._db_path = db_path
+        init_db()
+
+    start = time.perf_counter()
+    _fill(args.rows)
+    print(f"[{mode}] filled {args.rows} rows in {time.perf_counter() - start:.1f} s, "
+          f"file {os.path.getsize(db_path) / 1024 / 1024:.0f} MiB")
+
+    now = _START + timedelta(seconds=args.rows)
+    single = _rate(lambda: [create_feedback_record(f"single/{i}.jpg", f"label_{i % _LABELS}")
+                            for i in range(args.single)], args.single)
+    records = [[(f"batch/{b}-{i}.jpg", f"label_{i % _LABELS}", now) for i in range(args.batch_size)]
+               for b in range(args.batches)]
+    batched = _rate(lambda: [create_feedback_records(batch) for batch in records], args.batches * args.batch_size)
+    print(f"  inserts   single commit {single:9.0f} rows/s   batch of {args.batch_size} {batched:9.0f} rows/s")
+
+    rng = random.Random(0)
+    depths = [rng.randrange(args.rows) for _ in range(args.queries)]
+    labels = [f"label_{rng.randrange(_LABELS)}" for _ in range(args.queries)]
+    since = [_START + timedelta(seconds=rng.randrange(args.rows)) for _ in range(args.queries)]
+    limit = args.limit
+    print(f"  offset page      {_latency(_offset_page, [(d, limit) for d in depths])}")
+    print(f"  keyset page      {_latency(get_feedback_records, [(limit, d) for d in depths])}")
+    print(f"  by label         {_latency(lambda l: get_feedback_records(limit, label=l), [(l,) for l in labels])}")
+    print(f"  since created_at {_latency(lambda t: get_feedback_records(limit, since=t), [(t,) for t in since])}")
+
+    database._engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000, help="填充的记录数")
+    parser.add_argument("--single", type=int, default=1000, help="单条提交的插入数")
+    parser.add_argument("--batches", type=int, default=200, help="按批提交的批次数")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200, help="每类查询的次数")
+    parser.add_argument("--limit", type=int, default=100, help="每页记录数")
+    args = parser.parse_args()
+
+    for mode in ("default", "tuned"):
+        _bench(mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+装备名称模糊/拼音搜索基准测试：每类查询的命中率和延迟（p50/p99），与只做精确子串匹配对比
+
+查询由CSV中的名称生成：名称子串、替换一个字的子串（错别字）、全拼、首字母、替换一个字母的全拼；
+命中指生成查询所用的名称出现在前 limit 条结果中。
+
+用法:
+    python benchmarks/bench_fuzzy_search.py
+    python benchmarks/bench_fuzzy_search.py --csv data/gear_model_info.csv --queries 500
+"""
+
+import argparse
+import random
+import time
+
+from revelation.data import gear_model
+from revelation.data.gear_model import load_gear_model_info, search_gears_by_name, autocomplete_gear_names
+from revelation.data.pinyin import transliterate
+
+
+def _typo(text, alphabet, rng):
+    i = rng.randrange(len(text))
+    replacement = rng.choice(alphabet)
+    while replacement == text[i]:
+        replacement = rng.choice(alphabet)
+    return text[:i] + replacement + text[i + 1:]
+
+
+def _make_queries(names, count, rng):
+    """{类别: [(查询, 名称)]}"""
+    chars = sorted({ch for name in names for ch in name if not ch.isascii()})
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    long_names = [name for name in names if len(name) >= 3]
+    syllables = dict(zip(names, transliterate(names) or [None] * len(names)))
+
+    queries = {"substring": [], "typo": [], "pinyin": [], "initials": [], "pinyin typo": []}
+    for _ in range(count):
+        name = rng.choice(long_names)
+        length = rng.randint(2, min(6, len(name)))
+        offset = rng.randint(0, len(name) - length)
+        queries["substring"].append((name[offset:offset + length], name))
+
+        length = rng.randint(3, min(6, len(name)))
+        offset = rng.randint(0, len(name) - length)
+        queries["typo"].append((_typo(name[offset:offset + length], chars, rng), name))
+
+        if syllables[name] is None:
+            continue
+        name_syllables = syllables[name]
+        start = rng.randrange(len(name_syllables))
+        end = rng.randint(start + 1, len(name_syllables))
+        full = ''.join(name_syllables[start:end])
+        queries["pinyin"].append((full, name))
+        queries["initials"].append((''.join(s[:1] for s in name_syllables[start:end]), name))
+        if len(full) >= 6:
+            queries["pinyin typo"].append((_typo(full, letters, rng), name))
+
+    return {kind: [(query.strip(), name) for query, name in items if query.strip()] for kind, items in queries.items()}
+
+
+def _run(fn, queries, limit):
+    """返回 (命中率, 排好序的延迟 ms)"""
+    hits = 0
+    latencies = []
+    for query, name in queries:
+        start = time.perf_counter()
+        results = fn(query, limit)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        hits += any((r['name'] if isinstance(r, dict) else r) == name for r in results)
+    latencies.sort()
+    return hits / max(1, len(queries)), latencies
+
+
+def _summary(latencies):
+    n = len(latencies)
+    if not n:
+        return "no queries"
+    return (f"p50 {latencies[n // 2]:7.3f} ms  p99 {latencies[min(n - 1, int(n * 0.99))]:7.3f} ms  "
+            f"max {latencies[-1]:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default="data/gear_model_info.csv", help="装备模型信息CSV")
+    parser.add_argument("--queries", type=int, default=300, help="每类查询数")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    load_gear_model_info(args.csv)
+    print(f"load + index: {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"(pinyin {'enabled' if gear_model._pinyin_index is not None else 'disabled'})")
+
+    queries = _make_queries(gear_model._name_index.names, args.queries, random.Random(0))
+    pinyin_index, max_distance = gear_model._pinyin_index, gear_model.GEAR_FUZZY_MAX_DISTANCE
+
+    for kind, items in queries.items():
+        print(f"[{kind}] {len(items)} queries")
+        for mode in ("exact", "fuzzy"):
+            # exact 模式关闭拼音和模糊匹配，即原先的子串搜索
+            gear_model._pinyin_index = pinyin_index if mode == "fuzzy" else None
+            gear_model.GEAR_FUZZY_MAX_DISTANCE = max_distance if mode == "fuzzy" else 0
+            for title, fn in (("search", search_gears_by_name), ("autocomplete", autocomplete_gear_names)):
+                hit_rate, latencies = _run(fn, items, args.limit)
+                print(f"  {mode:5s} {title:12s} hit {hit_rate:6.1%}  {_summary(latencies)}")
+
+    gear_model._pinyin_index, gear_model.GEAR_FUZZY_MAX_DISTANCE = pinyin_index, max_distance
+
+
+if __name__ == "__main__":
+    main()
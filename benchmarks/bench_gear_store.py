@@ -0,0 +1,104 @@
+"""
+装备模型信息存储基准测试：按物品ID的字典 vs 列式存储（常驻内存和加载耗时）
+
+分别测量：原先的 CSV -> {物品ID: dict} + {模型路径: [物品ID]}，列式存储从CSV解析，以及从快照 mmap 加载；
+另外测量 load_gear_model_info 加载后的总内存（列式存储 + 名称索引 + 拼音索引 + 同模装备 JSON）。
+内存为构建后仍被引用的 Python 分配（tracemalloc，mmap 的页和 pypinyin 的词典不计入），并校验三者内容一致。
+
+用法:
+    python benchmarks/bench_gear_store.py
+    python benchmarks/bench_gear_store.py --csv data/gear_model_info.csv --snapshot /tmp/gear_model_info.bin
+"""
+
+import argparse
+import csv
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from revelation.data.gear_model import load_gear_model_info, save_gear_snapshot
+from revelation.data.gear_store import GearTable
+
+
+def _legacy_load(csv_path):
+    """原先的实现：每个装备一个字典，模型路径分组为物品ID列表"""
+    data = {}
+    groups = defaultdict(list)
+    with open(csv_path, 'r', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            item_id = row.get('物品ID', '')
+            item_name = row.get('物品名称', '').strip('"')
+            model_path = row.get('模型路径', '')
+            if not item_id or not item_name or not model_path:
+                continue
+            data[item_id] = {'id': item_id, 'name': item_name, 'model_path': model_path}
+            groups[model_path].append(item_id)
+    return data, groups
+
+
+def _measure(fn, repeat):
+    """返回 (结果, 最快耗时 ms, 结果常驻的 Python 分配 MiB)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    resident, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best * 1000, resident / 1024 / 1024
+
+
+def _as_dict(table):
+    model_paths = list(table.model_paths)
+    return {
+        gear_id: {'id': gear_id, 'name': name, 'model_path': model_paths[model_id]}
+        for gear_id, name, model_id in zip(table.gear_ids(), table.names, table.model_ids.tolist())
+    }
+
+
+def _as_groups(table):
+    gear_ids = table.gear_ids()
+    return {table.model_paths[model_id]: [gear_ids[row] for row in rows] for model_id, rows in table.groups()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default="data/gear_model_info.csv", help="装备模型信息CSV")
+    parser.add_argument("--snapshot", help="快照路径（默认写入临时目录）")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    snapshot = args.snapshot or os.path.join(tempfile.mkdtemp(), "gear_model_info.bin")
+    save_gear_snapshot(GearTable.from_csv(args.csv), args.csv, snapshot)
+
+    (data, groups), legacy_ms, legacy_mb = _measure(lambda: _legacy_load(args.csv), args.repeat)
+    parsed, parse_ms, parse_mb = _measure(lambda: GearTable.from_csv(args.csv), args.repeat)
+    mapped, mmap_ms, mmap_mb = _measure(lambda: GearTable.load(snapshot), args.repeat)
+    _, full_ms, full_mb = _measure(lambda: load_gear_model_info(args.csv, ""), args.repeat)
+    _, full_mmap_ms, full_mmap_mb = _measure(lambda: load_gear_model_info(args.csv, snapshot), args.repeat)
+
+    mismatches = sum(
+        _as_dict(table) != data or _as_groups(table) != groups
+        for table in (parsed, mapped)
+    )
+    print(f"{len(data)} gears, {len(groups)} model paths, content mismatches: {mismatches}")
+    print(f"snapshot: {os.path.getsize(snapshot) / 1024:.1f} KiB, column data {parsed.nbytes() / 1024:.1f} KiB")
+    print(f"{'':18s}{'load':>12s}{'resident':>14s}")
+    print(f"{'dict  from CSV':18s}{legacy_ms:9.1f} ms{legacy_mb:10.2f} MiB")
+    print(f"{'table from CSV':18s}{parse_ms:9.1f} ms{parse_mb:10.2f} MiB")
+    print(f"{'table mmap':18s}{mmap_ms:9.1f} ms{mmap_mb:10.2f} MiB")
+    print("total after load_gear_model_info (table, name index, pinyin index, same-model JSON):")
+    print(f"{'loaded from CSV':18s}{full_ms:9.1f} ms{full_mb:10.2f} MiB")
+    print(f"{'loaded mmap':18s}{full_mmap_ms:9.1f} ms{full_mmap_mb:10.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
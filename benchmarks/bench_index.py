@@ -0,0 +1,80 @@
+"""
+Gallery 检索索引基准测试：精确检索 vs IVF 近似检索（延迟和 recall@K）
+
+用法:
+    python benchmarks/bench_index.py --cache models/aethersight_gallery.pth
+    python benchmarks/bench_index.py --gallery 300000 --labels 30000
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from revelation.ml.search import build_label_index
+from revelation.ml.index import ExactIndex, IVFIndex, evaluate_recall
+
+
+def _synthetic_gallery(count, num_labels, dim):
+    """每个label围绕一个中心生成若干相近的嵌入"""
+    centers = F.normalize(torch.randn(num_labels, dim), dim=1)
+    label_of = torch.randint(0, num_labels, (count,))
+    embs = F.normalize(centers[label_of] + 0.3 * torch.randn(count, dim) / dim ** 0.5, dim=1)
+    return embs, [f"gear_{i}" for i in label_of.tolist()]
+
+
+def _latency_ms(index, queries, top_k, repeat):
+    index.search(queries, top_k)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        index.search(queries, top_k)
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cache", help="gallery缓存路径（aethersight_gallery.pth），不指定则使用合成数据")
+    parser.add_argument("--gallery", type=int, default=300000, help="合成gallery条目数")
+    parser.add_argument("--labels", type=int, default=30000, help="合成label数")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF簇数量，0为自动")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=1, help="延迟测试的查询批大小")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    if args.cache:
+        data = torch.load(args.cache, map_location="cpu")
+        embs, labels = data["embs"].float(), data["labels"]
+    else:
+        embs, labels = _synthetic_gallery(args.gallery, args.labels, args.dim)
+
+    label_names, label_ids = build_label_index(labels)
+    sample = torch.randperm(embs.shape[0])[:args.queries]
+    queries = F.normalize(embs[sample] + 0.3 * torch.randn_like(embs[sample]) / embs.shape[1] ** 0.5, dim=1)
+    latency_queries = queries[:args.batch]
+
+    exact = ExactIndex(embs, label_ids, len(label_names))
+    exact_ms = _latency_ms(exact, latency_queries, args.top_k, args.repeat)
+    print(f"gallery={embs.shape[0]} labels={len(label_names)} batch={args.batch} top_k={args.top_k}")
+    print(f"exact:            {exact_ms:8.2f} ms  recall@1=1.0000  recall@{args.top_k}=1.0000")
+
+    start = time.perf_counter()
+    ivf = IVFIndex(embs, label_ids, len(label_names), nlist=args.nlist)
+    print(f"IVF train: {time.perf_counter() - start:.1f} s (nlist={ivf.nlist})")
+
+    for nprobe in args.nprobe:
+        ivf.nprobe = max(1, min(nprobe, ivf.nlist))
+        ms = _latency_ms(ivf, latency_queries, args.top_k, args.repeat)
+        recall_1 = evaluate_recall(ivf, exact, queries, k=1)
+        recall_k = evaluate_recall(ivf, exact, queries, k=args.top_k)
+        print(f"ivf nprobe={ivf.nprobe:<4d} {ms:8.2f} ms  recall@1={recall_1:.4f}  recall@{args.top_k}={recall_k:.4f}  "
+              f"({exact_ms / ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
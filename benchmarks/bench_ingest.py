@@ -0,0 +1,100 @@
+"""
+Gallery 读取管线基准测试：逐图 PIL/torchvision 变换 vs 缩小解码 + uint8 缩放 + 批量归一化（不含模型前向）
+
+用法:
+    python benchmarks/bench_ingest.py --root /path/to/gallery
+    python benchmarks/bench_ingest.py --images 512 --width 1920 --height 1080
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from revelation.ml.dataset import imread_unicode
+from revelation.ml.gallery import scan_gallery, create_ingest_loader
+from revelation.ml.preprocess import InferenceTransform, normalize_batch
+
+
+class LegacyDataset(Dataset):
+    """原实现：cv2 全分辨率解码 -> BGR2RGB -> PIL -> Resize/ToTensor/Normalize"""
+
+    def __init__(self, image_paths, transform):
+        self.image_paths = image_paths
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, idx):
+        img = imread_unicode(self.image_paths[idx])
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return self.transform(img), 0
+
+
+def _synthetic_images(directory, count, width, height, formats):
+    """按 formats 轮流生成合成截图"""
+    rng = np.random.default_rng(0)
+    base = cv2.resize(rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    paths = []
+    for i in range(count):
+        img = np.roll(base, i * 7, axis=1)
+        path = os.path.join(directory, f"{i}.{formats[i % len(formats)]}")
+        cv2.imwrite(path, img)
+        paths.append(path)
+    return paths
+
+
+def _throughput(loader, consume, count):
+    start = time.perf_counter()
+    for imgs, _ in loader:
+        consume(imgs)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--root", help="gallery图片根目录，不指定则使用合成图片")
+    parser.add_argument("--images", type=int, default=256, help="合成图片数 / 从 --root 取的最大图片数")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--formats", default="jpg,png", help="合成图片格式，逗号分隔")
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.root:
+            paths = [os.path.join(args.root, entry[0]) for entry in scan_gallery(args.root)[:args.images]]
+        else:
+            paths = _synthetic_images(tmp, args.images, args.width, args.height,
+                                      args.formats.split(","))
+
+        transform = InferenceTransform(args.size)
+        legacy = DataLoader(LegacyDataset(paths, transform), batch_size=args.batch_size,
+                            num_workers=args.num_workers)
+        fast = create_ingest_loader(paths, [0] * len(paths), size=args.size,
+                                    batch_size=args.batch_size, num_workers=args.num_workers)
+
+        print(f"images={len(paths)} size={args.size} batch={args.batch_size} workers={args.num_workers}")
+        legacy_ips = _throughput(legacy, lambda imgs: None, len(paths))
+        print(f"{'legacy':<10s} {legacy_ips:8.1f} images/sec")
+        fast_ips = _throughput(fast, normalize_batch, len(paths))
+        print(f"{'pipeline':<10s} {fast_ips:8.1f} images/sec  ({fast_ips / legacy_ips:.2f}x)")
+
+        sample = paths[:8]
+        expected = torch.stack([LegacyDataset(sample, transform)[i][0] for i in range(len(sample))])
+        actual = normalize_batch(next(iter(create_ingest_loader(sample, [0] * len(sample),
+                                                                 size=args.size, num_workers=0)))[0])
+        diff = (expected - actual).abs()
+        print(f"max abs diff vs legacy: {diff.max():.4f}  mean: {diff.mean():.4f} (normalized units)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+装备名称搜索基准测试：逐条线性扫描 vs n-gram 倒排索引（每次查询延迟和结果一致性）
+
+查询取自CSV中名称的随机子串（1~4 个字符）以及逐字输入的前缀，模拟搜索框的输入。
+
+用法:
+    python benchmarks/bench_name_search.py
+    python benchmarks/bench_name_search.py --csv data/gear_model_info.csv --queries 2000
+"""
+
+import argparse
+import random
+import time
+
+from revelation.data import gear_model
+from revelation.data.gear_model import load_gear_model_info, search_gears_by_name, autocomplete_gear_names
+
+
+def _legacy_search(data, query, limit):
+    """原先的实现：逐条小写后判断子串，再排序"""
+    query_lower = query.lower()
+    results = []
+    for gear_id, gear_info in data.items():
+        gear_name = gear_info.get('name', '')
+        if query_lower in gear_name.lower():
+            results.append({'id': gear_id, 'name': gear_name, 'label': f"{gear_name}_{gear_id}"})
+    results.sort(key=lambda x: (
+        x['name'].lower().startswith(query_lower),
+        x['name'].lower().index(query_lower) if query_lower in x['name'].lower() else 999,
+        len(x['name'])
+    ))
+    return results[:limit]
+
+
+def _legacy_autocomplete(data, query, limit):
+    query_lower = query.lower()
+    names = set()
+    for gear_info in data.values():
+        gear_name = gear_info.get('name', '')
+        if query_lower in gear_name.lower():
+            names.add(gear_name)
+    return sorted(names, key=lambda x: (
+        x.lower().startswith(query_lower),
+        x.lower().index(query_lower) if query_lower in x.lower() else 999,
+        len(x)
+    ))[:limit]
+
+
+def _rank_keys(names, query):
+    """排序键序列（原实现中排序键相同的名称顺序取决于 set 的迭代顺序，只比较排序键）"""
+    query_lower = query.lower()
+    return [(name.lower().startswith(query_lower), name.lower().index(query_lower), len(name)) for name in names]
+
+
+def _latencies_ms(fn, queries, limit):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query, limit)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    latencies.sort()
+    return latencies
+
+
+def _summary(latencies):
+    n = len(latencies)
+    return (f"avg {sum(latencies) / n:7.3f} ms  p50 {latencies[n // 2]:7.3f} ms  "
+            f"p99 {latencies[min(n - 1, int(n * 0.99))]:7.3f} ms  max {latencies[-1]:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default="data/gear_model_info.csv", help="装备模型信息CSV")
+    parser.add_argument("--queries", type=int, default=1000, help="随机子串查询数")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    load_gear_model_info(args.csv)
+    data = gear_model.get_gear_model_info()
+    print(f"load + index: {(time.perf_counter() - start) * 1000:.1f} ms ({len(data)} gears)")
+    # 只比较精确子串匹配（拼音和模糊匹配见 bench_fuzzy_search.py）
+    gear_model._pinyin_index = None
+    gear_model.GEAR_FUZZY_MAX_DISTANCE = 0
+
+    rng = random.Random(0)
+    names = [info['name'] for info in data.values()]
+    queries = []
+    for _ in range(args.queries):
+        name = rng.choice(names)
+        length = rng.randint(1, min(4, len(name)))
+        offset = rng.randint(0, len(name) - length)
+        queries.append(name[offset:offset + length])
+    for name in rng.sample(names, 20):
+        queries.extend(name[:i] for i in range(1, len(name) + 1))
+    queries.extend(["a", "A1", "手", "之", "zzz", "不存在的装备"])
+    # 接口会去掉首尾空白
+    queries = [query.strip() for query in queries if query.strip()]
+
+    mismatches = 0
+    for query in queries:
+        if search_gears_by_name(query, args.limit) != _legacy_search(data, query, args.limit):
+            mismatches += 1
+        indexed = autocomplete_gear_names(query, args.limit)
+        legacy = _legacy_autocomplete(data, query, args.limit)
+        if _rank_keys(indexed, query) != _rank_keys(legacy, query):
+            mismatches += 1
+    print(f"{len(queries)} queries, limit={args.limit}, mismatches vs linear scan: {mismatches}")
+
+    for title, fn in [
+        ("search  linear", lambda query, limit: _legacy_search(data, query, limit)),
+        ("search  index ", search_gears_by_name),
+        ("autocomplete linear", lambda query, limit: _legacy_autocomplete(data, query, limit)),
+        ("autocomplete index ", autocomplete_gear_names),
+    ]:
+        print(f"{title:20s} {_summary(_latencies_ms(fn, queries, args.limit))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Gallery 量化基准测试：fp32 / fp16 / int8 的检索延迟、驻留内存和 recall@K
+
+用法:
+    python benchmarks/bench_quantize.py --cache models/aethersight_gallery.pth
+    python benchmarks/bench_quantize.py --gallery 300000 --labels 30000
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from revelation.ml.search import build_label_index
+from revelation.ml.index import ExactIndex, RerankIndex, evaluate_recall
+from revelation.ml.quantize import quantize_embeddings, PRECISIONS
+
+
+def _synthetic_gallery(count, num_labels, dim):
+    """每个label围绕一个中心生成若干相近的嵌入"""
+    centers = F.normalize(torch.randn(num_labels, dim), dim=1)
+    label_of = torch.randint(0, num_labels, (count,))
+    embs = F.normalize(centers[label_of] + 0.3 * torch.randn(count, dim) / dim ** 0.5, dim=1)
+    return embs, [f"gear_{i}" for i in label_of.tolist()]
+
+
+def _latency_ms(index, queries, top_k, repeat):
+    index.search(queries, top_k)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        index.search(queries, top_k)
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cache", help="gallery缓存路径（aethersight_gallery.pth），不指定则使用合成数据")
+    parser.add_argument("--gallery", type=int, default=300000, help="合成gallery条目数")
+    parser.add_argument("--labels", type=int, default=30000, help="合成label数")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--rerank", type=int, default=50, help="fp32重排的候选label数，0为不重排")
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=1, help="延迟测试的查询批大小")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    if args.cache:
+        data = torch.load(args.cache, map_location="cpu")
+        embs, labels = data["embs"].float(), data["labels"]
+    else:
+        embs, labels = _synthetic_gallery(args.gallery, args.labels, args.dim)
+
+    label_names, label_ids = build_label_index(labels)
+    num_labels = len(label_names)
+    sample = torch.randperm(embs.shape[0])[:args.queries]
+    queries = F.normalize(embs[sample] + 0.3 * torch.randn_like(embs[sample]) / embs.shape[1] ** 0.5, dim=1)
+    latency_queries = queries[:args.batch]
+
+    exact = ExactIndex(embs, label_ids, num_labels)
+    print(f"gallery={embs.shape[0]} labels={num_labels} batch={args.batch} top_k={args.top_k}")
+
+    for precision in PRECISIONS:
+        values, scales = quantize_embeddings(embs, precision)
+        mb = values.numel() * values.element_size() / 2 ** 20
+        if scales is not None:
+            mb += scales.numel() * scales.element_size() / 2 ** 20
+
+        index = ExactIndex(values, label_ids, num_labels, scales=scales)
+        variants = [(precision, index)]
+        if args.rerank > 0 and precision != "fp32":
+            variants.append((f"{precision} rerank={args.rerank}",
+                             RerankIndex(index, embs, label_ids, num_labels, rerank=args.rerank)))
+
+        for name, variant in variants:
+            ms = _latency_ms(variant, latency_queries, args.top_k, args.repeat)
+            recall_1 = evaluate_recall(variant, exact, queries, k=1)
+            recall_k = evaluate_recall(variant, exact, queries, k=args.top_k)
+            print(f"{name:<18s} {ms:8.2f} ms  {mb:8.1f} MB  recall@1={recall_1:.4f}  "
+                  f"recall@{args.top_k}={recall_k:.4f}")
+
+
+if __name__ == "__main__":
+    main()
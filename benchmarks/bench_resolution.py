@@ -0,0 +1,86 @@
+"""
+推理分辨率基准测试：不同输入边长的前向延迟，以及与 INFERENCE_SIZE 的 Top-1 label一致率
+
+用法:
+    python benchmarks/bench_resolution.py --model-dir models --sizes 256,384,512
+    python benchmarks/bench_resolution.py --model-dir models --gallery-root gallery --samples 256
+
+一致率需要每个分辨率的gallery缓存（python -m revelation gallery build --size N）。
+"""
+
+import argparse
+import os
+import time
+
+import torch
+import torch.nn.functional as F
+
+from revelation.ml import loader
+from revelation.ml.index import ExactIndex
+from revelation.ml.model_quant import split_gallery_sample, embed_paths
+from revelation.ml.search import build_label_index
+
+
+@torch.no_grad()
+def _latency_ms(model, size, batch_size, repeat):
+    inputs = torch.randn(batch_size, 3, size, size)
+    model(inputs)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        model(inputs)
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def _top1_labels(model, paths, size):
+    """在对应分辨率的gallery缓存上检索，返回每张图片的 Top-1 label"""
+    cache_path = loader.get_gallery_cache_path(size)
+    if not os.path.exists(cache_path):
+        return None
+
+    data = torch.load(cache_path, map_location="cpu")
+    label_names, label_ids = build_label_index(data["labels"])
+    index = ExactIndex(F.normalize(data["embs"].float(), dim=1), label_ids, len(label_names))
+    _, idxs = index.search(embed_paths(model, paths, size), 1)
+    return [label_names[i] for i in idxs[:, 0].tolist()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", help="模型目录（默认读取 MODEL_DIR）")
+    parser.add_argument("--gallery-root", help="抽样图片的gallery根目录，不指定则只测延迟")
+    parser.add_argument("--sizes", default="256,320,384,448,512")
+    parser.add_argument("--samples", type=int, default=256, help="计算一致率的抽样图片数")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.model_dir:
+        loader.MODEL_DIR = args.model_dir
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    model = loader.load_eager_model(torch.device("cpu"))
+
+    paths = []
+    reference = None
+    if args.gallery_root:
+        _, paths = split_gallery_sample(args.gallery_root, 0, args.samples)
+        reference = _top1_labels(model, paths, loader.INFERENCE_SIZE)
+        if reference is None:
+            print(f"No gallery cache for INFERENCE_SIZE={loader.INFERENCE_SIZE}, skipping agreement")
+
+    base_ms = _latency_ms(model, loader.INFERENCE_SIZE, args.batch_size, args.repeat)
+    print(f"batch={args.batch_size}, speedup and agreement relative to INFERENCE_SIZE={loader.INFERENCE_SIZE}")
+    print(f"{'size':>6s} {'latency':>12s} {'speedup':>8s} {'top1 agree':>11s}")
+    for size in sizes:
+        ms = _latency_ms(model, size, args.batch_size, args.repeat)
+
+        agree = "-"
+        if reference is not None:
+            labels = _top1_labels(model, paths, size)
+            if labels is not None:
+                agree = f"{sum(a == b for a, b in zip(labels, reference)) / len(paths):.3f}"
+        print(f"{size:6d} {ms:9.1f} ms {base_ms / ms:7.2f}x {agree:>11s}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+同模装备扩展基准测试：逐次重建同模列表 + pydantic 序列化 vs 按同模组 CSR 数组查找 + 预序列化 JSON 片段
+
+每个响应为随机 top-10 label，分别测量结果扩展（附加同模装备）和扩展 + 序列化为 JSON 的耗时，并校验两者输出一致。
+
+用法:
+    python benchmarks/bench_same_model.py
+    python benchmarks/bench_same_model.py --csv data/gear_model_info.csv --responses 5000
+"""
+
+import argparse
+import random
+import time
+
+from revelation.api.schemas import PredictionResponse
+from revelation.data import gear_model
+from revelation.data.gear_model import load_gear_model_info
+from revelation.ml.predictor import format_results, render_results
+
+
+def _model_groups(table):
+    """模型路径 -> 物品ID列表（CSV中的每一次出现）"""
+    gear_ids = table.gear_ids()
+    return {
+        table.model_paths[model_id]: [gear_ids[row] for row in rows]
+        for model_id, rows in table.groups()
+    }
+
+
+def _legacy_same_model_gears(data, groups, gear_label):
+    """原先的实现：每次拆分label、查模型路径并重建字典列表"""
+    if '_' not in gear_label:
+        return []
+    gear_id = gear_label.rsplit('_', 1)[1]
+    gear_info = data.get(gear_id)
+    if not gear_info:
+        return []
+    same_model_gears = []
+    for gid in groups.get(gear_info['model_path'], []):
+        if gid != gear_id:
+            item = data.get(gid)
+            if item:
+                same_model_gears.append({'id': item['id'], 'name': item['name']})
+    return same_model_gears
+
+
+def _legacy_format(data, groups, final):
+    return {"results": [
+        {"rank": i, "label": label, "score": float(score),
+         "same_model_gears": _legacy_same_model_gears(data, groups, label)}
+        for i, (label, score) in enumerate(final, 1)
+    ]}
+
+
+def _timeit_us(fn, responses):
+    start = time.perf_counter()
+    for final in responses:
+        fn(final)
+    return (time.perf_counter() - start) / len(responses) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default="data/gear_model_info.csv", help="装备模型信息CSV")
+    parser.add_argument("--responses", type=int, default=2000, help="模拟的响应数")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    load_gear_model_info(args.csv)
+    print(f"load + precompute: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    data = gear_model.get_gear_model_info()
+    groups = _model_groups(gear_model._gear_table)
+    labels = [f"{info['name']}_{gear_id}" for gear_id, info in data.items()]
+
+    rng = random.Random(0)
+    responses = [
+        [(label, 1.0 - rank * 0.01) for rank, label in enumerate(rng.sample(labels, args.top_k))]
+        for _ in range(args.responses)
+    ]
+
+    def legacy_json(final):
+        return PredictionResponse.model_validate(_legacy_format(data, groups, final)).model_dump_json()
+
+    def precomputed_json(final):
+        return render_results(format_results(final))
+
+    mismatches = sum(legacy_json(final) != precomputed_json(final) for final in responses)
+    print(f"{len(responses)} responses of top-{args.top_k}, JSON mismatches: {mismatches}")
+
+    legacy_us = _timeit_us(lambda final: _legacy_format(data, groups, final), responses)
+    lookup_us = _timeit_us(format_results, responses)
+    print(f"enrich      rebuild {legacy_us:8.1f} us   lookup  {lookup_us:8.1f} us   ({legacy_us / lookup_us:.1f}x)")
+
+    legacy_us = _timeit_us(legacy_json, responses)
+    render_us = _timeit_us(precomputed_json, responses)
+    print(f"enrich+JSON pydantic {legacy_us:7.1f} us   fragments {render_us:6.1f} us   ({legacy_us / render_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+冷启动基准测试：启动后前若干个请求（预处理 + 前向 + 检索）的延迟，有无预热对比
+
+每次运行只测一种情况（预热的效果是进程级的），分别运行两次对比:
+    python benchmarks/bench_warmup.py --no-warmup
+    python benchmarks/bench_warmup.py
+    INFERENCE_THREADS=4 python benchmarks/bench_warmup.py --model-dir models
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from revelation.ml import loader
+from revelation.ml.executor import configure_threads
+from revelation.ml.index import ExactIndex
+from revelation.ml.loader import ModelSnapshot
+from revelation.ml.model import EmbeddingModel
+from revelation.ml.predictor import warm_up, search_queries
+from revelation.ml.preprocess import TensorInferenceTransform
+from revelation.ml.search import build_label_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", help="模型目录，不指定则使用随机初始化的模型")
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--requests", type=int, default=10, help="测量的请求数")
+    parser.add_argument("--batch", type=int, default=1, help="每个请求的图片数")
+    parser.add_argument("--gallery", type=int, default=50000, help="合成gallery条目数")
+    parser.add_argument("--labels", type=int, default=5000, help="合成label数")
+    args = parser.parse_args()
+
+    configure_threads()
+    device = torch.device("cpu")
+    if args.model_dir:
+        loader.MODEL_DIR = args.model_dir
+        model = loader.load_eager_model(device)
+    else:
+        model = EmbeddingModel(pretrained=False).eval()
+
+    transform = TensorInferenceTransform(loader.INFERENCE_SIZE)
+    gallery_embs = F.normalize(torch.randn(args.gallery, 512), dim=1)
+    labels = [f"gear_{i % args.labels}" for i in range(args.gallery)]
+    label_names, label_ids = build_label_index(labels)
+    index = ExactIndex(gallery_embs, label_ids, len(label_names))
+    snapshot = ModelSnapshot(1, model, transform, device, gallery_embs, labels, label_names, label_ids, index)
+
+    if not args.no_warmup:
+        start = time.perf_counter()
+        warm_up(snapshot)
+        print(f"warm-up: {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(1)
+    latencies = []
+    with torch.no_grad():
+        for _ in range(args.requests):
+            images = rng.integers(0, 256, (args.batch, 1080, 1920, 3), dtype=np.uint8)
+            start = time.perf_counter()
+            queries = torch.stack([transform(image, bgr=True) for image in images])
+            search_queries(queries, 10, snapshot)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    print(f"{'request':>8s} {'latency':>12s}")
+    for i, ms in enumerate(latencies, 1):
+        print(f"{i:8d} {ms:9.1f} ms")
+    print(f"first / median: {latencies[0] / sorted(latencies)[len(latencies) // 2]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,13 @@
 
 __version__ = "0.1.0"
 
-from .app import app
-
 __all__ = ["app", "__version__"]
 
+
+def __getattr__(name):
+    # 延迟导入：命令行的 gallery build / export 等子命令不需要加载 FastAPI 应用
+    if name == "app":
+        from .app import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
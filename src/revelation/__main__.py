@@ -1,7 +1,9 @@
 """Entry point for running the Revelation service."""
 
-from .app import main
+import sys
+
+from .cli import main
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
 
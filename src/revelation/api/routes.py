@@ -2,15 +2,58 @@
 API路由定义
 """
 
+import os
+import hmac
 import asyncio
-from fastapi import File, UploadFile, Form, HTTPException, Query
+from typing import List, Optional
+from fastapi import File, UploadFile, Form, HTTPException, Query, Header, Response
 
-from .schemas import HealthResponse, PredictionResponse, FeedbackResponse, AutocompleteResponse
-from ..ml.loader import get_model, get_gallery, load_model
-from ..ml.predictor import predict_image
+from .schemas import (
+    HealthResponse, PredictionResponse, BatchPredictionResponse, FeedbackResponse,
+    AutocompleteResponse, StatsResponse, ReloadResponse, ShardSearchRequest, ShardSearchResponse
+)
+from ..ml.loader import get_model, get_gallery, get_version, get_snapshot, is_reloading, load_model
+from ..ml.reload import trigger_reload, get_watcher
+from ..ml.predictor import (
+    preprocess_image, predict_images, format_results, render_results, get_fast_path_stats, warm_up,
+    get_loaded_snapshot, ImageDecodeError
+)
+from ..ml.batcher import get_batcher
+from ..ml.executor import configure_threads, run_inference, shutdown_inference_executor
+from ..ml.worker_pool import get_worker_pool, WorkerPoolBusy
+from ..ml.shard import search_shard, GALLERY_SHARD, SHARD_TOKEN
+from ..ml.cache import get_result_cache, content_key
 from ..data.storage import get_storage_backend
-from ..data.database import init_db, create_feedback_record
+from ..data.database import init_db
+from ..data.feedback_writer import get_feedback_writer, FeedbackQueueFull
 from ..data.gear_model import load_gear_model_info, search_gears_by_name, autocomplete_gear_names, get_same_model_gears
+from ..startup import phase, log_timings
+
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', None)
+PREDICT_BATCH_MAX_IMAGES = int(os.getenv('PREDICT_BATCH_MAX_IMAGES', 32))
+
+
+def _serving_snapshot(pool):
+    """
+    本次请求使用的快照和查缓存用的版本号
+
+    线程模式下预处理、前向和检索都使用返回的快照，版本号即实际使用的版本；
+    多进程模式下返回 (None, 推理进程池的版本)，实际版本由 WorkerPool.submit 返回。
+    """
+    if pool is not None:
+        return None, pool.version
+    snapshot = get_loaded_snapshot()
+    return snapshot, snapshot.version
+
+
+def _json_response(content):
+    """已序列化的 JSON 响应（跳过 response_model 的校验和序列化）"""
+    return Response(content=content, media_type="application/json")
+
+
+def _busy(e):
+    """推理进程全部排满（或反馈写入队列已满）时的 503 响应"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 
 def setup_routes(app):
@@ -19,13 +62,25 @@ def setup_routes(app):
     @app.get("/health", response_model=HealthResponse, tags=["Health"])
     async def health():
         """健康检查"""
+        pool = get_worker_pool()
+        if pool is not None:
+            return {
+                "status": "healthy",
+                "model_loaded": pool.ready_workers > 0,
+                "gallery_loaded": pool.ready_workers > 0,
+                "version": pool.version,
+                "reloading": pool.reloading
+            }
+        
         model = get_model()
         gallery_embs, _ = get_gallery()
         
         return {
             "status": "healthy",
             "model_loaded": model is not None,
-            "gallery_loaded": gallery_embs is not None
+            "gallery_loaded": gallery_embs is not None,
+            "version": get_version(),
+            "reloading": is_reloading()
         }
     
     @app.post("/predict", response_model=PredictionResponse, tags=["Prediction"])
@@ -38,19 +93,159 @@ def setup_routes(app):
         
         top_k = 10
         image_data = await image.read()
-        result = await asyncio.to_thread(predict_image, image_data, top_k)
         
-        if len(result["results"]) > top_k:
-            result["results"] = result["results"][:top_k]
+        pool = get_worker_pool()
+        snapshot, version = _serving_snapshot(pool)
+        
+        cache = get_result_cache()
+        cached = cache.get(content_key(image_data, version, top_k))
+        if cached is not None:
+            return _json_response(render_results(cached))
+        
+        try:
+            if pool is not None:
+                ranked, version = await pool.submit([image_data], top_k)
+                result = format_results(ranked[0])
+            else:
+                # 预处理与批次中的前向、检索使用同一个快照
+                query = await run_inference(preprocess_image, image_data, snapshot)
+                result = await get_batcher().submit((query, top_k, snapshot))
+        except WorkerPoolBusy as e:
+            raise _busy(e)
+        except ImageDecodeError:
+            raise HTTPException(status_code=500, detail="Failed to decode image")
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        
+        result = {"results": result["results"][:top_k]}
+        # 按实际使用的版本写入缓存（多进程模式下重新加载期间可能与查缓存时的版本不同）
+        cache.put(content_key(image_data, version, top_k), result)
+        
+        return _json_response(render_results(result))
+    
+    @app.post("/predict/batch", response_model=BatchPredictionResponse, tags=["Prediction"])
+    async def predict_batch(
+        images: List[UploadFile] = File(..., description="Image files to predict (e.g. gear-slot crops of one screenshot)")
+    ):
+        """批量预测接口 - 多张图片一次前向、一次相似度矩阵乘，每张图片固定返回top-10结果"""
+        if len(images) > PREDICT_BATCH_MAX_IMAGES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many images, at most {PREDICT_BATCH_MAX_IMAGES} per request"
+            )
+        
+        for image in images:
+            if not image.content_type or not image.content_type.startswith("image/"):
+                raise HTTPException(status_code=400, detail="File must be an image")
+        
+        top_k = 10
+        image_data = [await image.read() for image in images]
+        
+        # 只对未命中缓存的图片做前向
+        pool = get_worker_pool()
+        snapshot, version = _serving_snapshot(pool)
+        cache = get_result_cache()
+        predictions = [cache.get(content_key(data, version, top_k)) for data in image_data]
+        missing = [i for i, prediction in enumerate(predictions) if prediction is None]
         
-        return result
+        if missing:
+            try:
+                if pool is not None:
+                    ranked, version = await pool.submit([image_data[i] for i in missing], top_k)
+                    computed = [format_results(final) for final in ranked]
+                else:
+                    computed = await run_inference(
+                        predict_images, [image_data[i] for i in missing], top_k, snapshot
+                    )
+            except WorkerPoolBusy as e:
+                raise _busy(e)
+            except ImageDecodeError as e:
+                raise HTTPException(status_code=500, detail=f"Failed to decode image {missing[e.index]}")
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+            
+            for i, prediction in zip(missing, computed):
+                predictions[i] = prediction
+                cache.put(content_key(image_data[i], version, top_k), prediction)
+        
+        return _json_response('{"predictions":[' + ','.join(render_results(p) for p in predictions) + ']}')
+    
+    # 分片检索接口只在以 GALLERY_SHARD 启动且配置了 SHARD_TOKEN 的实例上提供
+    if GALLERY_SHARD and not SHARD_TOKEN:
+        print("[Shard] ⚠ GALLERY_SHARD is set but SHARD_TOKEN is not, POST /shard/search is disabled")
+    if GALLERY_SHARD and SHARD_TOKEN:
+        @app.post("/shard/search", response_model=ShardSearchResponse, tags=["Prediction"])
+        async def shard_search(
+            request: ShardSearchRequest,
+            x_shard_token: Optional[str] = Header(None, description="分片检索共享密钥（SHARD_TOKEN）")
+        ):
+            """分片检索接口 - 供分片检索协调器调用，用查询嵌入检索本实例的gallery分片"""
+            if not hmac.compare_digest((x_shard_token or "").encode(), SHARD_TOKEN.encode()):
+                raise HTTPException(status_code=403, detail="Invalid shard token")
+            
+            snapshot = get_snapshot()
+            if snapshot is None:
+                raise HTTPException(status_code=503, detail="Gallery not loaded in this process")
+            
+            if request.size and request.size != snapshot.transform.size:
+                if snapshot.fast_path is None or request.size != snapshot.fast_path.transform.size:
+                    raise HTTPException(status_code=400, detail=f"No gallery loaded at {request.size}px")
+                snapshot = snapshot.fast_path
+            
+            try:
+                scores, labels = await run_inference(search_shard, snapshot, request.embeddings, request.top_k)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            return {"scores": scores, "labels": labels}
+    
+    @app.get("/stats", response_model=StatsResponse, tags=["Health"])
+    async def stats():
+        """运行指标 - 推理调度队列深度、批大小分布、等待时间、结果缓存命中率、快速路径重新前向比例、推理进程池状态和反馈写入队列"""
+        pool = get_worker_pool()
+        return {
+            "batcher": get_batcher().stats(),
+            "result_cache": get_result_cache().stats(),
+            "fast_path": get_fast_path_stats(),
+            "workers": pool.stats() if pool is not None else None,
+            "feedback": get_feedback_writer().stats()
+        }
+    
+    # 重新加载开销大，只在配置了 ADMIN_TOKEN 时提供（未配置时可用 RELOAD_WATCH_INTERVAL 自动重新加载）
+    if not ADMIN_TOKEN:
+        print("[Reload] ADMIN_TOKEN is not set, POST /admin/reload is disabled")
+    else:
+        @app.post("/admin/reload", response_model=ReloadResponse, tags=["Admin"])
+        async def reload(
+            x_admin_token: Optional[str] = Header(None, description="管理员令牌（ADMIN_TOKEN）")
+        ):
+            """重新加载模型和gallery - 后台构建新快照后原子替换，进行中的预测继续使用旧快照"""
+            if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+                raise HTTPException(status_code=403, detail="Invalid admin token")
+            
+            try:
+                version = await trigger_reload()
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Failed to reload: {str(e)}")
+            
+            if version is None:
+                raise HTTPException(status_code=409, detail="Reload already in progress")
+            
+            return {
+                "status": "success",
+                "version": version
+            }
     
     @app.post("/feedback", response_model=FeedbackResponse, tags=["Feedback"])
     async def feedback(
         image: UploadFile = File(..., description="用户标记的图片区域"),
         label: str = Form(..., description="正确的装备label")
     ):
-        """反馈接口 - 接收用户标记的图片区域和正确的装备label"""
+        """反馈接口 - 接收用户标记的图片区域和正确的装备label（记录由后台批量写入数据库）"""
         if not image.content_type or not image.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
         
@@ -58,14 +253,23 @@ def setup_routes(app):
             raise HTTPException(status_code=400, detail="label cannot be empty")
         
         try:
+            writer = get_feedback_writer()
+            writer.ensure_capacity()
             image_data = await image.read()
             storage = get_storage_backend()
             image_path = await storage.save(image_data, image.filename or "image.jpg")
-            create_feedback_record(image_path=image_path, label=label.strip())
+            try:
+                await writer.submit(image_path=image_path, label=label.strip())
+            except Exception:
+                # 保存图片期间队列被占满或记录写入失败：删除已保存的图片，不留下没有记录的文件
+                await storage.delete(image_path)
+                raise
             
             return {
                 "status": "success"
             }
+        except FeedbackQueueFull as e:
+            raise _busy(e)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to save feedback: {str(e)}")
     
@@ -88,7 +292,7 @@ def setup_routes(app):
     ):
         """装备名称搜索接口 - 返回格式与预测接口相同，包含同模装备信息"""
         if not q or not q.strip():
-            return {"results": []}
+            return _json_response(render_results({"results": []}))
         
         search_results = search_gears_by_name(q.strip(), limit)
         
@@ -103,16 +307,17 @@ def setup_routes(app):
                 "same_model_gears": same_model_gears
             })
         
-        return {"results": results}
+        return _json_response(render_results({"results": results}))
     
     @app.on_event("startup")
     async def startup_event():
         """启动时加载模型和gallery"""
-        import os
-        
         try:
             init_db()
             print("[Startup] ✓ Database initialized")
+            writer = get_feedback_writer()
+            await writer.start()
+            print(f"[Startup] ✓ Feedback writer started (ack mode: {writer.ack_mode})")
         except Exception as e:
             print(f"[Startup] ⚠ Database initialization warning: {e}")
         
@@ -129,22 +334,59 @@ def setup_routes(app):
         except Exception as e:
             print(f"[Startup] ⚠ Gear model info loading warning: {e}")
         
-        model = get_model()
-        gallery_embs, _ = get_gallery()
-        
-        if model is None or gallery_embs is None:
-            print("[Startup] Loading model and gallery...")
-            await asyncio.to_thread(load_model)
+        pool = get_worker_pool()
+        if pool is not None:
+            # 多进程模式：前端进程不加载模型，推理进程各自加载、预热（gallery 通过 mmap 共享）
+            print(f"[Startup] Starting {pool.num_workers} inference worker processes...")
+            with phase("worker start"):
+                await pool.start()
+            print("[Startup] ✓ Inference workers ready")
+        else:
+            # 在第一次并行计算之前设置线程数（已在 app.main 中设置时不再生效）
+            configure_threads()
             
             model = get_model()
-            gallery_embs, gallery_labels = get_gallery()
+            gallery_embs, _ = get_gallery()
+            
+            if model is None or gallery_embs is None:
+                print("[Startup] Loading model and gallery...")
+                await asyncio.to_thread(load_model)
+                
+                model = get_model()
+                gallery_embs, gallery_labels = get_gallery()
+                
+                if model is None:
+                    raise RuntimeError("Failed to load model during startup")
+                if gallery_embs is None or gallery_labels is None:
+                    raise RuntimeError("Failed to load gallery during startup")
+                
+                print("[Startup] ✓ Model and gallery loaded successfully!")
             
-            if model is None:
-                raise RuntimeError("Failed to load model during startup")
-            if gallery_embs is None or gallery_labels is None:
-                raise RuntimeError("Failed to load gallery during startup")
+            # 在推理线程池中预热，与之后的请求使用相同的线程
+            await run_inference(warm_up)
+            print("[Startup] ✓ Model warmed up")
             
-            print("[Startup] ✓ Model and gallery loaded successfully!")
+            await get_batcher().start()
+            print("[Startup] ✓ Inference batcher started")
         
+        watcher = get_watcher()
+        if watcher is not None:
+            await watcher.start()
+            print(f"[Startup] ✓ Watching model files for changes every {watcher.interval}s")
+        
+        log_timings("[Startup]")
         print("Server ready!")
+    
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        """关闭时停止后台任务"""
+        watcher = get_watcher()
+        if watcher is not None:
+            await watcher.stop()
+        await get_batcher().stop()
+        await get_feedback_writer().stop()
+        shutdown_inference_executor()
+        pool = get_worker_pool()
+        if pool is not None:
+            await pool.stop()
 
@@ -3,13 +3,20 @@ Pydantic 模型定义
 """
 
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     gallery_loaded: bool
+    version: Optional[int] = None
+    reloading: bool = False
+
+
+class ReloadResponse(BaseModel):
+    status: str
+    version: Optional[int] = None
 
 
 class SameModelGear(BaseModel):
@@ -28,9 +35,96 @@ class PredictionResponse(BaseModel):
     results: List[PredictionResult]
 
 
+class BatchPredictionResponse(BaseModel):
+    predictions: List[PredictionResponse]
+
+
 class FeedbackResponse(BaseModel):
     status: str
 
 
 class AutocompleteResponse(BaseModel):
-    suggestions: List[str]
\ No newline at end of file
+    suggestions: List[str]
+
+
+class ShardSearchRequest(BaseModel):
+    embeddings: List[List[float]]
+    top_k: int = 10
+    size: Optional[int] = None
+
+
+class ShardSearchResponse(BaseModel):
+    scores: List[List[float]]
+    labels: List[List[str]]
+
+
+class LatencySummary(BaseModel):
+    avg: float
+    p50: float
+    p95: float
+    max: float
+
+
+class BatcherStats(BaseModel):
+    max_batch_size: int
+    max_wait_ms: float
+    queue_depth: int
+    total_requests: int
+    total_batches: int
+    batch_size_histogram: Dict[int, int]
+    wait_ms: LatencySummary
+    process_ms: LatencySummary
+
+
+class ResultCacheStats(BaseModel):
+    max_entries: int
+    ttl_s: float
+    size: int
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    expirations: int
+
+
+class FastPathStats(BaseModel):
+    enabled: bool
+    size: int
+    margin: float
+    queries: int
+    reembedded: int
+    reembed_rate: float
+
+
+class WorkerPoolStats(BaseModel):
+    workers: int
+    ready: int
+    max_pending: int
+    pending: List[int]
+    completed: int
+    rejected: int
+    restarts: int
+
+
+class FeedbackWriterStats(BaseModel):
+    ack_mode: str
+    queue_size: int
+    queue_depth: int
+    batch_size: int
+    max_wait_ms: float
+    enqueued: int
+    written: int
+    failed: int
+    rejected: int
+    total_batches: int
+    batch_size_histogram: Dict[int, int]
+    wait_ms: LatencySummary
+    flush_ms: LatencySummary
+
+
+class StatsResponse(BaseModel):
+    batcher: BatcherStats
+    result_cache: ResultCacheStats
+    fast_path: FastPathStats
+    workers: Optional[WorkerPoolStats] = None
+    feedback: FeedbackWriterStats
\ No newline at end of file
@@ -3,11 +3,20 @@ FastAPI 应用主文件
 """
 
 import os
+import time
+
+_imports_started = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .api.routes import setup_routes
 from .ml.loader import load_model, get_model, get_gallery
+from .ml.executor import configure_threads
+from .ml.worker_pool import get_worker_pool
+from .startup import record_phase
+
+record_phase("imports", time.perf_counter() - _imports_started)
 
 app = FastAPI(
     title="Revelation",
@@ -49,8 +58,20 @@ def main():
             reload=True,
             log_level="debug"
         )
+    elif get_worker_pool() is not None:
+        print(f"Starting web server on port {port} (SERVING_MODE=process)...")
+        print("Inference worker processes will load the model during application startup.")
+        print("=" * 50)
+        uvicorn.run(
+            app,
+            host="0.0.0.0", 
+            port=port,
+            reload=False,
+            log_level="info"
+        )
     else:
         print("\n[1/2] Loading model and gallery...")
+        configure_threads()
         try:
             load_model()
             print("[1/2] ✓ Model and gallery loaded successfully!")
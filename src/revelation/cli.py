@@ -0,0 +1,308 @@
+"""
+命令行入口
+
+    python -m revelation                          启动服务
+    python -m revelation gallery build [--incremental]  构建gallery缓存
+    python -m revelation export [--runtime onnx]         导出 TorchScript/ONNX 模型并检查一致性
+    python -m revelation quantize [--mode static]        int8 量化模型并报告检索一致性
+    python -m revelation gear snapshot [--csv PATH]      预先构建装备模型信息快照
+"""
+
+import argparse
+import os
+import sys
+
+
+def _gallery_build(args):
+    """构建（或增量更新）gallery缓存"""
+    from .ml import loader
+    from .ml.gallery import update_gallery
+    from .ml.gallery_store import file_checksum
+
+    if args.model_dir:
+        loader.MODEL_DIR = args.model_dir
+
+    gallery_root = args.gallery_root or loader.GALLERY_ROOT
+    if not gallery_root or not os.path.isdir(gallery_root):
+        print(f"Gallery root directory not found: {gallery_root}", file=sys.stderr)
+        return 1
+
+    model, transform, device = loader.load_network(args.size)
+
+    _, _, stats = update_gallery(
+        model,
+        gallery_root,
+        transform,
+        device,
+        cache_path=loader.get_gallery_cache_path(transform.size),
+        model_hash=file_checksum(loader.get_model_path()),
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        incremental=args.incremental
+    )
+
+    print("=" * 50)
+    print(f"Images:     {stats['total']}")
+    print(f"Reused:     {stats['reused']}")
+    print(f"Recomputed: {stats['recomputed']}")
+    print(f"Removed:    {stats['removed']}")
+    print("=" * 50)
+    return 0
+
+
+def _parity_inputs(count, size, gallery_root):
+    """一致性检查的输入：优先从gallery抽样真实图片，否则使用随机输入"""
+    import torch
+    from .ml.dataset import read_resized_rgb
+    from .ml.gallery import scan_gallery
+    from .ml.preprocess import normalize_batch
+
+    if gallery_root and os.path.isdir(gallery_root):
+        entries = scan_gallery(gallery_root)
+        if entries:
+            step = max(1, len(entries) // count)
+            paths = [os.path.join(gallery_root, entry[0]) for entry in entries[::step][:count]]
+            print(f"Parity inputs: {len(paths)} gallery images from {gallery_root}")
+            return normalize_batch(torch.stack([read_resized_rgb(path, size) for path in paths]))
+
+    print(f"Parity inputs: {count} random tensors")
+    torch.manual_seed(0)
+    return torch.randn(count, 3, size, size)
+
+
+def _missing_onnx_extra():
+    """onnx extra 未安装时输出提示并返回 True"""
+    from .ml.export import missing_onnx_modules, ONNX_INSTALL_HINT
+
+    missing = missing_onnx_modules()
+    if missing:
+        print(f"The onnx extra is not installed (missing: {', '.join(missing)}). {ONNX_INSTALL_HINT}",
+              file=sys.stderr)
+    return bool(missing)
+
+
+def _export(args):
+    """导出 TorchScript/ONNX 模型，检查与 eager 模型的一致性并比较延迟"""
+    import torch
+    from .ml import loader
+    from .ml.export import export_model, export_path, load_runtime, compare_embeddings, measure_latency
+    from .ml.gallery_store import file_checksum
+
+    if args.runtime in ("onnx", "all") and _missing_onnx_extra():
+        return 1
+
+    if args.model_dir:
+        loader.MODEL_DIR = args.model_dir
+    args.size = args.size or loader.INFERENCE_SIZE
+
+    runtimes = ["torchscript", "onnx"] if args.runtime == "all" else [args.runtime]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    # 导出面向 CPU 部署
+    device = torch.device("cpu")
+    model_path = loader.get_model_path()
+    eager = loader.load_eager_model(device)
+    meta = {"model_hash": file_checksum(model_path), "torch": torch.__version__}
+
+    models = {"eager": eager}
+    for runtime in runtimes:
+        path = export_path(model_path, runtime, args.size)
+        export_model(eager, runtime, path, meta, size=args.size)
+        print(f"Exported {runtime} model to {path}")
+        models[runtime] = load_runtime(runtime, model_path, meta["model_hash"], device, lambda: eager, size=args.size)
+
+    inputs = _parity_inputs(args.parity_samples, args.size, args.gallery_root or loader.GALLERY_ROOT)
+
+    passed = True
+    print("=" * 50)
+    for runtime in runtimes:
+        max_abs_diff, min_cosine = compare_embeddings(eager, models[runtime], inputs)
+        ok = max_abs_diff <= args.tolerance
+        passed = passed and ok
+        print(f"{runtime:<12s} max abs diff={max_abs_diff:.2e}  min cosine={min_cosine:.6f}  "
+              f"{'OK' if ok else 'FAIL'} (tolerance {args.tolerance:g})")
+
+    print("=" * 50)
+    print(f"{'batch':<12s}" + "".join(f"{name:>14s}" for name in models))
+    for batch_size in batch_sizes:
+        batch = torch.randn(batch_size, 3, args.size, args.size)
+        row = [measure_latency(model, batch, repeat=args.repeat) for model in models.values()]
+        print(f"{batch_size:<12d}" + "".join(f"{ms:11.1f} ms" for ms in row))
+    print("=" * 50)
+
+    return 0 if passed else 1
+
+
+def _quantize(args):
+    """int8 量化导出的 ONNX 模型，报告与 float32 模型的检索一致性并比较延迟"""
+    import torch
+    from .ml import loader
+    from .ml.export import ensure_export, OnnxEmbeddingModel, measure_latency
+    from .ml.gallery_store import file_checksum
+    from .ml.model_quant import (
+        ensure_quantized, split_gallery_sample, embed_paths, agreement_report, exclude_gallery_paths
+    )
+
+    if _missing_onnx_extra():
+        return 1
+
+    if args.model_dir:
+        loader.MODEL_DIR = args.model_dir
+    args.size = args.size or loader.INFERENCE_SIZE
+
+    gallery_root = args.gallery_root or loader.GALLERY_ROOT
+    if not gallery_root or not os.path.isdir(gallery_root):
+        print(f"Gallery root directory not found: {gallery_root}", file=sys.stderr)
+        return 1
+
+    device = torch.device("cpu")
+    model_path = loader.get_model_path()
+    model_hash = file_checksum(model_path)
+    eager = loader.load_eager_model(device)
+
+    onnx_path = ensure_export("onnx", model_path, model_hash, lambda: eager, size=args.size)
+    quantized_path = ensure_quantized(
+        onnx_path,
+        args.mode,
+        model_hash,
+        gallery_root,
+        size=args.size,
+        calibration_samples=args.calibration_samples,
+        force=True
+    )
+
+    models = {
+        "eager": eager,
+        "onnx fp32": OnnxEmbeddingModel(onnx_path),
+        f"onnx int8-{args.mode}": OnnxEmbeddingModel(quantized_path),
+    }
+    int8 = models[f"onnx int8-{args.mode}"]
+
+    # 留出集与校准集不重叠
+    _, holdout = split_gallery_sample(gallery_root, args.calibration_samples, args.holdout)
+    if not holdout:
+        holdout, _ = split_gallery_sample(gallery_root, args.holdout, 0)
+        print("Gallery too small for a disjoint held-out set, reusing calibration images")
+
+    expected = embed_paths(eager, holdout, args.size)
+    actual = embed_paths(int8, holdout, args.size)
+
+    print("=" * 50)
+    cache_path = loader.get_gallery_cache_path(args.size)
+    # 留出集图片本身在gallery中，检索前先去掉，否则每个查询都会以约 1.0 的相似度命中自身
+    gallery = None
+    if os.path.exists(cache_path):
+        gallery = exclude_gallery_paths(torch.load(cache_path, map_location="cpu"), gallery_root, holdout)
+        if gallery is None:
+            print(f"Gallery cache at {cache_path} has no file list, rebuild it with "
+                  f"`python -m revelation gallery build` for retrieval agreement")
+    else:
+        print(f"Gallery cache not found at {cache_path}, skipping retrieval agreement")
+
+    if gallery is not None:
+        embs, labels, excluded = gallery
+        report = agreement_report(expected, actual, embs, labels, k=10)
+        print(f"Held-out images:    {len(holdout)} (removed {excluded} from the gallery)")
+        print(f"Top-1 agreement:    {report['top1']:.4f}")
+        print(f"Top-10 agreement:   {report['topk']:.4f}")
+        print(f"Mean cosine:        {report['cosine']:.6f}")
+    else:
+        cosine = torch.nn.functional.cosine_similarity(expected, actual, dim=1).mean().item()
+        print(f"Mean cosine:        {cosine:.6f}")
+
+    print("=" * 50)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    print(f"{'batch':<8s}" + "".join(f"{name:>20s}" for name in models))
+    for batch_size in batch_sizes:
+        batch = torch.randn(batch_size, 3, args.size, args.size)
+        row = [measure_latency(model, batch, repeat=args.repeat) for model in models.values()]
+        print(f"{batch_size:<8d}" + "".join(f"{ms:17.1f} ms" for ms in row))
+    print("=" * 50)
+    return 0
+
+
+def _gear_snapshot(args):
+    """解析装备模型信息CSV并写入快照"""
+    import time
+    from .data.gear_model import GEAR_MODEL_SNAPSHOT, save_gear_snapshot
+    from .data.gear_store import GearTable
+
+    csv_path = args.csv or os.getenv('GEAR_MODEL_INFO_CSV', 'data/gear_model_info.csv')
+    if not os.path.exists(csv_path):
+        print(f"Gear model info CSV not found: {csv_path}", file=sys.stderr)
+        return 1
+    output = args.output or GEAR_MODEL_SNAPSHOT or os.path.splitext(csv_path)[0] + ".bin"
+
+    start = time.perf_counter()
+    table = GearTable.from_csv(csv_path)
+    save_gear_snapshot(table, csv_path, output)
+
+    print("=" * 50)
+    print(f"Gears:       {len(table)}")
+    print(f"Model paths: {len(table.model_paths)}")
+    print(f"Size:        {os.path.getsize(output) / 1024:.1f} KiB")
+    print(f"Snapshot:    {output} ({time.perf_counter() - start:.2f}s)")
+    print("=" * 50)
+    return 0
+
+
+def _serve(args):
+    from .app import main as serve
+    serve()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="revelation", description="Revelation service")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("serve", help="启动服务（默认）")
+
+    gallery = subparsers.add_parser("gallery", help="gallery缓存管理")
+    gallery_commands = gallery.add_subparsers(dest="gallery_command", required=True)
+
+    build = gallery_commands.add_parser("build", help="构建gallery缓存")
+    build.add_argument("--incremental", action="store_true",
+                       help="复用缓存中未变化图片的嵌入，只计算新增/修改的图片")
+    build.add_argument("--gallery-root", help="gallery图片根目录（默认读取 GALLERY_ROOT）")
+    build.add_argument("--model-dir", help="模型目录（默认读取 MODEL_DIR）")
+    build.add_argument("--size", type=int, help="输入分辨率（默认读取 INFERENCE_SIZE），每个分辨率一份缓存")
+    build.add_argument("--batch-size", type=int, default=128)
+    build.add_argument("--num-workers", type=int, default=8)
+    build.set_defaults(func=_gallery_build)
+
+    export = subparsers.add_parser("export", help="导出 TorchScript/ONNX 模型")
+    export.add_argument("--runtime", choices=["torchscript", "onnx", "all"], default="all")
+    export.add_argument("--model-dir", help="模型目录（默认读取 MODEL_DIR）")
+    export.add_argument("--gallery-root", help="一致性检查抽样图片的gallery目录（默认读取 GALLERY_ROOT）")
+    export.add_argument("--size", type=int, help="输入边长（默认读取 INFERENCE_SIZE）")
+    export.add_argument("--parity-samples", type=int, default=16, help="一致性检查的图片数")
+    export.add_argument("--tolerance", type=float, default=1e-3, help="嵌入逐元素最大允许误差")
+    export.add_argument("--batch-sizes", default="1,8,32", help="延迟对比的批大小，逗号分隔")
+    export.add_argument("--repeat", type=int, default=10)
+    export.set_defaults(func=_export)
+
+    quantize = subparsers.add_parser("quantize", help="int8 量化模型（onnxruntime）")
+    quantize.add_argument("--mode", choices=["static", "dynamic"], default="static",
+                          help="static 在gallery图片上校准激活范围，dynamic 只量化权重")
+    quantize.add_argument("--model-dir", help="模型目录（默认读取 MODEL_DIR）")
+    quantize.add_argument("--gallery-root", help="校准/留出图片的gallery目录（默认读取 GALLERY_ROOT）")
+    quantize.add_argument("--size", type=int, help="输入边长（默认读取 INFERENCE_SIZE）")
+    quantize.add_argument("--calibration-samples", type=int, default=128, help="校准图片数")
+    quantize.add_argument("--holdout", type=int, default=256, help="一致性报告的留出图片数")
+    quantize.add_argument("--batch-sizes", default="1,8", help="延迟对比的批大小，逗号分隔")
+    quantize.add_argument("--repeat", type=int, default=5)
+    quantize.set_defaults(func=_quantize)
+
+    gear = subparsers.add_parser("gear", help="装备模型信息管理")
+    gear_commands = gear.add_subparsers(dest="gear_command", required=True)
+
+    snapshot = gear_commands.add_parser("snapshot", help="构建装备模型信息快照（启动时 mmap 加载，不再解析CSV）")
+    snapshot.add_argument("--csv", help="装备模型信息CSV（默认读取 GEAR_MODEL_INFO_CSV）")
+    snapshot.add_argument("--output", help="快照路径（默认读取 GEAR_MODEL_SNAPSHOT，未设置时为CSV同名的 .bin）")
+    snapshot.set_defaults(func=_gear_snapshot)
+
+    args = parser.parse_args(argv)
+    if args.command in (None, "serve"):
+        return _serve(args)
+    return args.func(args)
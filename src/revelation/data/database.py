@@ -3,11 +3,13 @@
 """
 
 import os
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from typing import Iterator, Optional, List, Sequence, Tuple
+from sqlalchemy import create_engine, event, and_, or_, Column, Integer, String, DateTime, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 
 Base = declarative_base()
 
@@ -18,8 +20,8 @@ class FeedbackRecord(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     image_path = Column(String(512), nullable=False, comment="图片存储路径或URL")
-    label = Column(String(256), nullable=False, comment="正确的装备label")
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="创建时间")
+    label = Column(String(256), nullable=False, index=True, comment="正确的装备label")
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True, comment="创建时间")
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
     
     def to_dict(self):
@@ -34,12 +36,35 @@ class FeedbackRecord(Base):
 
 
 _db_path = os.getenv('FEEDBACK_DB_PATH', 'data/feedback.db')
+# SQLite 连接参数：WAL 下读写互不阻塞，synchronous=NORMAL 时只在检查点 fsync
+# （进程崩溃不丢数据，掉电可能丢失最近提交的事务；需要掉电持久时设为 FULL）
+FEEDBACK_DB_JOURNAL_MODE = os.getenv('FEEDBACK_DB_JOURNAL_MODE', 'WAL').upper()
+FEEDBACK_DB_SYNCHRONOUS = os.getenv('FEEDBACK_DB_SYNCHRONOUS', 'NORMAL').upper()
+FEEDBACK_DB_CACHE_MB = int(os.getenv('FEEDBACK_DB_CACHE_MB', 64))
+FEEDBACK_DB_BUSY_TIMEOUT_MS = int(os.getenv('FEEDBACK_DB_BUSY_TIMEOUT_MS', 5000))
+FEEDBACK_DB_POOL_SIZE = int(os.getenv('FEEDBACK_DB_POOL_SIZE', 5))
+FEEDBACK_DB_MAX_OVERFLOW = int(os.getenv('FEEDBACK_DB_MAX_OVERFLOW', 5))
+
 _engine = None
 _SessionLocal = None
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新建的 SQLite 连接设置日志模式、同步级别、页缓存和锁等待时间"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={FEEDBACK_DB_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={FEEDBACK_DB_SYNCHRONOUS}")
+        # 负数表示以 KiB 为单位
+        cursor.execute(f"PRAGMA cache_size=-{FEEDBACK_DB_CACHE_MB * 1024}")
+        cursor.execute(f"PRAGMA busy_timeout={FEEDBACK_DB_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
 def init_db():
-    """初始化数据库"""
+    """初始化数据库（重复调用时替换原有的连接池）"""
     global _engine, _SessionLocal
     
     db_path = _db_path
@@ -48,67 +73,128 @@ def init_db():
     elif not db_path.startswith('sqlite:///'):
         db_path = f"sqlite:///{db_path}"
     
+    if _engine is not None:
+        _engine.dispose()
+    
+    # 连接在请求之间复用，不再每次操作重新打开数据库文件和设置参数
     _engine = create_engine(
         db_path,
-        connect_args={"check_same_thread": False} if "sqlite" in db_path else {}
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=FEEDBACK_DB_POOL_SIZE,
+        max_overflow=FEEDBACK_DB_MAX_OVERFLOW
     )
-    _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    event.listen(_engine, "connect", _set_sqlite_pragmas)
+    # 提交后不过期对象，会话关闭后仍可读取记录的属性
+    _SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=_engine)
     Base.metadata.create_all(bind=_engine)
+    # create_all 不会给已存在的表补建索引
+    for index in FeedbackRecord.__table__.indexes:
+        index.create(bind=_engine, checkfirst=True)
 
 
-def get_db() -> Session:
-    """获取数据库会话"""
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    数据库会话上下文：正常退出时提交，异常时回滚，最后把连接归还连接池
+    
+    用法:
+        with session_scope() as db:
+            db.add(record)
+    """
     if _SessionLocal is None:
         init_db()
     
     db = _SessionLocal()
     try:
-        return db
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
-        pass
-
-
-def close_db(db: Session):
-    """关闭数据库会话"""
-    if db:
         db.close()
 
 
 def create_feedback_record(image_path: str, label: str) -> FeedbackRecord:
     """创建反馈记录"""
-    db = get_db()
-    try:
+    with session_scope() as db:
         record = FeedbackRecord(
             image_path=image_path,
             label=label
         )
         db.add(record)
-        db.commit()
-        db.refresh(record)
+        db.flush()
         return record
-    except Exception as e:
-        db.rollback()
-        raise
-    finally:
-        close_db(db)
 
 
-def get_feedback_records(skip: int = 0, limit: int = 100) -> List[FeedbackRecord]:
-    """获取反馈记录列表"""
-    db = get_db()
-    try:
-        records = db.query(FeedbackRecord).offset(skip).limit(limit).all()
-        return records
-    finally:
-        close_db(db)
+def create_feedback_records(records: Sequence[Tuple[str, str, datetime]]) -> int:
+    """
+    在一个事务中批量创建反馈记录
+    
+    Args:
+        records: [(图片存储路径, 装备label, 创建时间)]
+        
+    Returns:
+        写入的记录数
+    """
+    with session_scope() as db:
+        db.add_all([
+            FeedbackRecord(image_path=image_path, label=label, created_at=created_at, updated_at=created_at)
+            for image_path, label, created_at in records
+        ])
+    return len(records)
+
+
+def get_feedback_records(
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    label: Optional[str] = None,
+    since: Optional[datetime] = None
+) -> List[FeedbackRecord]:
+    """
+    分页获取反馈记录
+    
+    使用上一页最后一条记录的ID作为游标（keyset 分页），翻到任意深度的耗时都相同，
+    不像 offset 需要扫描并丢弃前面所有的行。
+    
+    Args:
+        limit: 每页记录数
+        after_id: 上一页最后一条记录的ID，None 为第一页
+        label: 只返回该装备label的记录
+        since: 只返回该时间（含）之后创建的记录
+        
+    Returns:
+        记录列表，按ID升序；指定 since 时按 (创建时间, ID) 升序，沿 created_at 索引读取。
+        少于 limit 条时表示已到最后一页
+    """
+    with session_scope() as db:
+        query = db.query(FeedbackRecord)
+        if label is not None:
+            query = query.filter(FeedbackRecord.label == label)
+        
+        if since is None:
+            if after_id is not None:
+                query = query.filter(FeedbackRecord.id > after_id)
+            return query.order_by(FeedbackRecord.id).limit(limit).all()
+        
+        if after_id is not None:
+            cursor = db.get(FeedbackRecord, after_id)
+            if cursor is not None:
+                # (created_at, id) > 游标，created_at >= 游标时间用于限定索引扫描范围
+                since = max(since, cursor.created_at)
+                query = query.filter(or_(
+                    FeedbackRecord.created_at > cursor.created_at,
+                    and_(FeedbackRecord.created_at == cursor.created_at, FeedbackRecord.id > after_id)
+                ))
+            else:
+                query = query.filter(FeedbackRecord.id > after_id)
+        query = query.filter(FeedbackRecord.created_at >= since)
+        return query.order_by(FeedbackRecord.created_at, FeedbackRecord.id).limit(limit).all()
 
 
 def get_feedback_record_by_id(record_id: int) -> Optional[FeedbackRecord]:
     """根据ID获取反馈记录"""
-    db = get_db()
-    try:
-        record = db.query(FeedbackRecord).filter(FeedbackRecord.id == record_id).first()
-        return record
-    finally:
-        close_db(db)
+    with session_scope() as db:
+        return db.get(FeedbackRecord, record_id)
 
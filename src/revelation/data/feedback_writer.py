@@ -0,0 +1,230 @@
+"""
+反馈记录后台写入模块
+
+/feedback 请求只把记录放入有界内存队列，由后台任务把一段时间内到达的记录
+合并为一个事务写入数据库（在线程中执行，不阻塞事件循环）。
+
+确认模式（FEEDBACK_ACK_MODE）:
+    durable: 请求等待所在批次提交后才返回，提交失败时请求失败（默认）
+    async:   记录入队即返回，写入失败只记录日志和计数；关闭时会写完队列中的记录
+"""
+
+import os
+import time
+import asyncio
+from collections import Counter, deque
+from datetime import datetime
+
+from .database import create_feedback_records
+from ..stats import latency_summary
+
+FEEDBACK_QUEUE_SIZE = int(os.getenv('FEEDBACK_QUEUE_SIZE', 1024))
+FEEDBACK_BATCH_SIZE = int(os.getenv('FEEDBACK_BATCH_SIZE', 64))
+FEEDBACK_FLUSH_MS = float(os.getenv('FEEDBACK_FLUSH_MS', 20))
+FEEDBACK_ACK_MODE = os.getenv('FEEDBACK_ACK_MODE', 'durable').lower()
+
+ACK_MODES = ('durable', 'async')
+
+_writer = None
+
+
+class FeedbackQueueFull(RuntimeError):
+    """反馈写入队列已满"""
+
+
+class FeedbackWriter:
+    """
+    反馈记录批量写入器
+
+    第一条记录入队后最多等待 flush_ms，或凑满 batch_size 即在一个事务中写入。
+    同一时间只有一个批次在写入，写入期间到达的记录进入下一批。
+    """
+
+    def __init__(self, write_fn=create_feedback_records, queue_size=1024, batch_size=64, flush_ms=20.0,
+                 ack_mode='durable', window=1024):
+        """
+        Args:
+            write_fn: 批量写入函数，接收 [(image_path, label, created_at)]，在一个事务中提交（在线程中执行）
+            queue_size: 队列容量，队列满时拒绝新记录
+            batch_size: 单个事务最多写入的记录数
+            flush_ms: 首条记录的最长等待时间（毫秒）
+            ack_mode: 'durable' 等待提交后返回，'async' 入队即返回
+            window: 耗时统计保留的最近样本数
+        """
+        if ack_mode not in ACK_MODES:
+            raise ValueError(f"Unknown feedback ack mode: {ack_mode} (expected one of {', '.join(ACK_MODES)})")
+
+        self.write_fn = write_fn
+        self.queue_size = max(1, int(queue_size))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_wait = max(0.0, float(flush_ms)) / 1000.0
+        self.ack_mode = ack_mode
+
+        self._queue = None
+        self._task = None
+        # 正在收集的批次和正在写入的任务，停止时需要写完
+        self._collecting = []
+        self._flushing = None
+
+        self._enqueued = 0
+        self._written = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_batches = 0
+        self._batch_sizes = Counter()
+        self._wait_ms = deque(maxlen=window)
+        self._flush_ms = deque(maxlen=window)
+
+    async def start(self):
+        """启动后台写入任务"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台写入任务，队列中剩余的记录写入后再返回"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+
+        pending, self._collecting = self._collecting, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size])
+
+    def ensure_capacity(self):
+        """
+        队列已满时直接拒绝（在保存图片之前调用，避免图片保存后才被拒绝）
+
+        Raises:
+            FeedbackQueueFull: 队列已满
+        """
+        if self._queue is not None and self._queue.full():
+            self._rejected += 1
+            raise FeedbackQueueFull(f"Feedback queue is full ({self.queue_size} pending records)")
+
+    async def submit(self, image_path: str, label: str):
+        """
+        提交一条反馈记录
+
+        durable 模式下等待记录所在批次提交；async 模式下入队后立即返回。
+
+        Args:
+            image_path: 图片存储路径或URL
+            label: 正确的装备label
+
+        Raises:
+            FeedbackQueueFull: 队列已满
+        """
+        if self._task is None:
+            await self.start()
+
+        future = asyncio.get_running_loop().create_future() if self.ack_mode == 'durable' else None
+        # 创建时间取请求到达时间，而不是批次提交时间
+        record = (image_path, label, datetime.utcnow())
+        try:
+            self._queue.put_nowait((record, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise FeedbackQueueFull(f"Feedback queue is full ({self.queue_size} pending records)")
+        self._enqueued += 1
+
+        if future is not None:
+            await future
+
+    async def _collect(self):
+        """收集一个批次（收集中途被取消时，已取出的记录留在 _collecting 中）"""
+        batch = self._collecting = [await self._queue.get()]
+        deadline = batch[0][2] + self.flush_wait
+
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        self._collecting = []
+        return batch
+
+    async def _flush(self, batch):
+        """在一个事务中写入一个批次，并通知等待的请求"""
+        dispatched = time.perf_counter()
+        self._total_batches += 1
+        self._batch_sizes[len(batch)] += 1
+        for _, _, enqueued in batch:
+            self._wait_ms.append((dispatched - enqueued) * 1000.0)
+
+        try:
+            await asyncio.to_thread(self.write_fn, [record for record, _, _ in batch])
+        except Exception as e:
+            self._failed += len(batch)
+            print(f"[Feedback] ⚠ Failed to write {len(batch)} feedback records: {e}")
+            for _, future, _ in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+        else:
+            self._written += len(batch)
+            for _, future, _ in batch:
+                if future is not None and not future.done():
+                    future.set_result(None)
+        finally:
+            self._flush_ms.append((time.perf_counter() - dispatched) * 1000.0)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # 写入中途被取消时不中断写入，由 stop 等待其完成
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    def stats(self):
+        """写入器运行指标"""
+        return {
+            "ack_mode": self.ack_mode,
+            "queue_size": self.queue_size,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_size,
+            "max_wait_ms": self.flush_wait * 1000.0,
+            "enqueued": self._enqueued,
+            "written": self._written,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "total_batches": self._total_batches,
+            "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            "wait_ms": latency_summary(self._wait_ms),
+            "flush_ms": latency_summary(self._flush_ms),
+        }
+
+
+def get_feedback_writer():
+    """获取全局反馈写入器"""
+    global _writer
+
+    if _writer is None:
+        _writer = FeedbackWriter(
+            queue_size=FEEDBACK_QUEUE_SIZE,
+            batch_size=FEEDBACK_BATCH_SIZE,
+            flush_ms=FEEDBACK_FLUSH_MS,
+            ack_mode=FEEDBACK_ACK_MODE
+        )
+
+    return _writer
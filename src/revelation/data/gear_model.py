@@ -3,56 +3,224 @@
 """
 
 import os
-import csv
-from typing import Dict, List, Optional
-from collections import defaultdict
+from json.encoder import encode_basestring
+from typing import Dict, List, Mapping, Optional, Sequence
 
+import numpy as np
 
-_gear_model_data: Optional[Dict[str, Dict]] = None
-_model_groups: Optional[Dict[str, List[str]]] = None
+from .gear_store import GearTable, read_snapshot_header
+from .name_index import NameIndex
+from .pinyin import PinyinIndex, transliterate
 
+# 装备模型信息快照路径，设置后从快照 mmap 加载（CSV更新后自动重建），不设置时每次解析CSV
+GEAR_MODEL_SNAPSHOT = os.getenv('GEAR_MODEL_SNAPSHOT', '')
+# 名称搜索的最大编辑距离：关键词不足 3 个字符时不做模糊匹配，3~5 个字符允许 1 处，更长允许 2 处；0 关闭模糊匹配
+GEAR_FUZZY_MAX_DISTANCE = int(os.getenv('GEAR_FUZZY_MAX_DISTANCE', '2'))
+# 按全拼和拼音首字母搜索（需要安装 pypinyin）
+GEAR_PINYIN_SEARCH = os.getenv('GEAR_PINYIN_SEARCH', 'true').lower() == 'true'
 
-def load_gear_model_info(csv_path: str = None):
+_gear_table: Optional[GearTable] = None
+_name_index: Optional[NameIndex] = None
+# 每个名称对应的装备行号（CSR）：第 n 个名称为 _name_rows[_name_offsets[n]:_name_offsets[n + 1]]，按行号排列
+_name_offsets: Optional[np.ndarray] = None
+_name_rows: Optional[np.ndarray] = None
+# 每行装备的名称下标（int32），同模装备的名称直接取 _name_index.names 中的字符串
+_row_names: Optional[np.ndarray] = None
+# 名称的全拼 / 首字母索引，下标与 _name_index 一致；未启用拼音搜索时为 None
+_pinyin_index: Optional[PinyinIndex] = None
+# 同模装备 JSON：按 _gear_table.group_rows 的顺序拼接每个成员的 {"id","name"} 片段（各带一个逗号）的 UTF-8 数据，
+# 第 k 个成员为 _same_model_blob[_same_model_offsets[k]:_same_model_offsets[k + 1]]
+_same_model_blob: Optional[bytes] = None
+_same_model_offsets: Optional[np.ndarray] = None
+
+
+def load_gear_model_info(csv_path: str = None, snapshot_path: str = None):
     """
     加载装备模型信息CSV文件
     
     Args:
         csv_path: CSV文件路径，如果为None则从环境变量或默认路径读取
+        snapshot_path: 快照路径，如果为None则读取 GEAR_MODEL_SNAPSHOT（为空时不使用快照）
     """
-    global _gear_model_data, _model_groups
+    global _gear_table, _name_index, _name_offsets, _name_rows, _row_names, _pinyin_index
+    global _same_model_blob, _same_model_offsets
     
     if csv_path is None:
         csv_path = os.getenv('GEAR_MODEL_INFO_CSV', 'data/gear_model_info.csv')
-    
-    if not os.path.exists(csv_path):
-        _gear_model_data = {}
-        _model_groups = defaultdict(list)
-        return
-    
-    _gear_model_data = {}
-    _model_groups = defaultdict(list)
+    if snapshot_path is None:
+        snapshot_path = GEAR_MODEL_SNAPSHOT
     
     try:
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                item_id = row.get('物品ID', '')
-                item_name = row.get('物品名称', '').strip('"')
-                model_path = row.get('模型路径', '')
-                
-                if not item_id or not item_name or not model_path:
-                    continue
-                
-                _gear_model_data[item_id] = {
-                    'id': item_id,
-                    'name': item_name,
-                    'model_path': model_path
-                }
-                
-                _model_groups[model_path].append(item_id)
+        table = _load_gear_table(csv_path, snapshot_path)
     except Exception as e:
-        _gear_model_data = {}
-        _model_groups = defaultdict(list)
+        table = GearTable.empty()
+    
+    _gear_table = table
+    _name_index, _name_offsets, _name_rows, _row_names = _build_name_index(table)
+    _pinyin_index = _build_pinyin_index(_name_index)
+    _same_model_blob, _same_model_offsets = _build_same_model_json(table)
+
+
+def _source_signature(csv_path: str):
+    """CSV的 [大小, 修改时间ns]"""
+    stat = os.stat(csv_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_gear_table(csv_path: str, snapshot_path: str) -> GearTable:
+    """
+    读取装备模型信息表：快照与CSV一致（或没有CSV）时直接 mmap 快照，否则解析CSV并按需重建快照
+    """
+    has_csv = os.path.exists(csv_path)
+    
+    if snapshot_path and os.path.exists(snapshot_path):
+        try:
+            header = read_snapshot_header(snapshot_path)
+            if header is not None and (not has_csv or header.get("source") == _source_signature(csv_path)):
+                return GearTable.load(snapshot_path)
+            print(f"[Gear] Snapshot {snapshot_path} is stale or invalid, rebuilding from {csv_path}")
+        except Exception as e:
+            print(f"[Gear] Failed to load snapshot {snapshot_path}: {e}")
+    
+    if not has_csv:
+        return GearTable.empty()
+    
+    table = GearTable.from_csv(csv_path)
+    if snapshot_path:
+        try:
+            save_gear_snapshot(table, csv_path, snapshot_path)
+        except OSError as e:
+            print(f"[Gear] Failed to write snapshot {snapshot_path}: {e}")
+    return table
+
+
+def save_gear_snapshot(table: GearTable, csv_path: str, snapshot_path: str):
+    """
+    将解析后的装备模型信息表写为快照（记录CSV签名，CSV变化后快照失效）
+    """
+    table.save(snapshot_path, {"source": _source_signature(csv_path)})
+
+
+def _build_same_model_json(table: GearTable):
+    """
+    预先序列化同模组成员的 JSON 片段
+    
+    片段按同模组（group_rows）的顺序拼接为一个 UTF-8 数据块，每个装备的同模装备 JSON 为所在组的数据段
+    去掉自身的片段，不为每个装备保存字符串。
+    
+    Returns:
+        数据块 (bytes), [len(group_rows) + 1] 的 int64 偏移数组
+    """
+    fragments = [
+        f'{{"id":{encode_basestring(gear_id)},"name":{encode_basestring(name)}}},'.encode('utf-8')
+        for gear_id, name in zip(table.gear_ids(), table.names)
+    ]
+    members = [fragments[row] for row in table.group_rows.tolist()]
+    offsets = np.zeros(len(members) + 1, dtype=np.int64)
+    np.cumsum([len(fragment) for fragment in members], out=offsets[1:])
+    return b''.join(members), offsets
+
+
+def _build_name_index(table: GearTable):
+    """
+    构建装备名称检索索引
+    
+    Returns:
+        名称索引，每个名称对应的装备行号（CSR：偏移数组, 行号数组），每行的名称下标
+    """
+    name_ids = {}
+    row_names = np.fromiter(
+        (name_ids.setdefault(name, len(name_ids)) for name in table.names),
+        dtype=np.int64, count=len(table)
+    )
+    rows = np.argsort(row_names, kind="stable").astype(np.int32)
+    offsets = np.zeros(len(name_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_names, minlength=len(name_ids)), out=offsets[1:])
+    
+    return NameIndex(list(name_ids)), offsets, rows, row_names.astype(np.int32)
+
+
+def _rows_of_name(name_id: int) -> List[int]:
+    """名称对应的装备行号"""
+    return _name_rows[_name_offsets[name_id]:_name_offsets[name_id + 1]].tolist()
+
+
+def _row_of_label(gear_label: str) -> Optional[int]:
+    """label（"装备名称_物品ID"）对应的行号"""
+    if '_' not in gear_label:
+        return None
+    return _gear_table.row_of(gear_label.rsplit('_', 1)[1])
+
+
+def _build_pinyin_index(name_index: NameIndex):
+    """
+    构建名称的全拼和首字母检索索引
+    
+    Returns:
+        拼音索引；未启用拼音搜索或未安装 pypinyin 时为 None
+    """
+    if not GEAR_PINYIN_SEARCH or not len(name_index):
+        return None
+    
+    syllables = transliterate(name_index.names)
+    if syllables is None:
+        print("[Gear] pypinyin not installed, pinyin search disabled. Install the project dependencies with: poetry install")
+        return None
+    
+    return PinyinIndex(syllables)
+
+
+def _max_distance(query_lower: str) -> int:
+    """关键词允许的最大编辑距离"""
+    if len(query_lower) < 3:
+        return 0
+    return min(GEAR_FUZZY_MAX_DISTANCE, 1 if len(query_lower) < 6 else 2)
+
+
+def _max_pinyin_distance(query_lower: str) -> int:
+    """全拼允许的最大编辑距离：每个字对应多个字母，不足 6 个字母时不做模糊匹配，最多 1 处"""
+    if len(query_lower) < 6:
+        return 0
+    return min(GEAR_FUZZY_MAX_DISTANCE, 1)
+
+
+def _related_names(query_lower: str, limit: int, exclude: Sequence[int]) -> List[int]:
+    """
+    精确匹配不足时补充的名称，依次为：全拼、首字母、名称模糊匹配、全拼模糊匹配
+    
+    Args:
+        query_lower: 小写后的关键词
+        limit: 需要补充的名称数
+        exclude: 已经返回的名称下标
+        
+    Returns:
+        名称下标列表
+    """
+    seen = set(exclude)
+    names = []
+    
+    def extend(name_ids):
+        for name_id in name_ids:
+            if len(names) >= limit:
+                break
+            if name_id not in seen:
+                seen.add(name_id)
+                names.append(name_id)
+    
+    # 拼音只包含 ASCII 字符
+    pinyin = _pinyin_index is not None and query_lower.isascii()
+    if pinyin:
+        extend(_pinyin_index.search(query_lower, limit, exclude=seen))
+    
+    distance = _max_distance(query_lower)
+    if distance and len(names) < limit:
+        extend(name_id for _, name_id in _name_index.search_fuzzy(query_lower, distance, limit - len(names), exclude=seen))
+    
+    distance = _max_pinyin_distance(query_lower)
+    if distance and pinyin and len(names) < limit:
+        extend(name_id for _, name_id in _pinyin_index.search_fuzzy(query_lower, distance, limit - len(names), exclude=seen))
+    
+    return names
 
 
 def get_gear_info(gear_id: str) -> Optional[Dict]:
@@ -65,13 +233,21 @@ def get_gear_info(gear_id: str) -> Optional[Dict]:
     Returns:
         装备信息字典，包含id, name, model_path
     """
-    if _gear_model_data is None:
+    if _gear_table is None:
         load_gear_model_info()
     
-    return _gear_model_data.get(gear_id)
+    row = _gear_table.row_of(gear_id)
+    if row is None:
+        return None
+    
+    return {
+        'id': gear_id,
+        'name': _gear_table.name(row),
+        'model_path': _gear_table.model_path(row)
+    }
 
 
-def get_same_model_gears(gear_label: str) -> List[Dict[str, str]]:
+def get_same_model_gears(gear_label: str) -> Sequence[Mapping[str, str]]:
     """
     获取同模型的其他装备
     
@@ -81,44 +257,56 @@ def get_same_model_gears(gear_label: str) -> List[Dict[str, str]]:
     Returns:
         同模型装备列表，每个元素包含id和name（不包括自身）
     """
-    if _gear_model_data is None or _model_groups is None:
+    if _same_model_blob is None:
         load_gear_model_info()
     
-    if not _gear_model_data:
-        return []
-    
-    if '_' not in gear_label:
-        return []
-    
-    gear_id = gear_label.rsplit('_', 1)[1]
+    row = _row_of_label(gear_label)
+    if row is None:
+        return ()
     
-    gear_info = get_gear_info(gear_id)
-    if not gear_info:
-        return []
-    
-    model_path = gear_info.get('model_path')
-    if not model_path:
-        return []
-    
-    same_model_gear_ids = _model_groups.get(model_path, [])
+    rows = _gear_table.siblings(row)
+    names = _name_index.names
+    return tuple(
+        {'id': gear_id, 'name': names[name_id]}
+        for gear_id, name_id in zip(_gear_table.gear_ids(rows), _row_names[rows].tolist())
+    )
+
+
+def get_same_model_gears_json(gear_label: str) -> str:
+    """
+    获取同模型的其他装备，序列化为 JSON 数组（与 get_same_model_gears 的结果一致）
     
-    same_model_gears = []
-    for gid in same_model_gear_ids:
-        if gid != gear_id:
-            gear_info_item = _gear_model_data.get(gid)
-            if gear_info_item:
-                same_model_gears.append({
-                    'id': gear_info_item['id'],
-                    'name': gear_info_item['name']
-                })
+    Args:
+        gear_label: 装备label（格式："装备名称_物品ID"）
+        
+    Returns:
+        JSON 字符串
+    """
+    if _same_model_blob is None:
+        load_gear_model_info()
     
-    return same_model_gears
+    row = _row_of_label(gear_label)
+    if row is None:
+        return '[]'
+    
+    # 所在组的数据段中去掉自身的每一次出现
+    first, last = _gear_table.group_bounds(row)
+    own = (np.flatnonzero(_gear_table.group_rows[first:last] == row) + first).tolist()
+    offsets = _same_model_offsets
+    pieces = []
+    for k in own + [last]:
+        pieces.append(_same_model_blob[offsets[first]:offsets[k]])
+        first = k + 1
+    # 去掉最后一个片段后的逗号
+    return '[' + b''.join(pieces)[:-1].decode('utf-8') + ']'
 
 
 def search_gears_by_name(query: str, limit: int = 10) -> List[Dict]:
     """
     根据装备名称搜索装备
     
+    先按名称子串精确匹配；不足 limit 条时依次补充拼音匹配和编辑距离以内的模糊匹配。
+    
     Args:
         query: 搜索关键词
         limit: 返回结果数量限制
@@ -126,42 +314,48 @@ def search_gears_by_name(query: str, limit: int = 10) -> List[Dict]:
     Returns:
         匹配的装备列表，每个元素包含id, name, label（格式："装备名称_物品ID"）
     """
-    if _gear_model_data is None:
+    if _gear_table is None:
         load_gear_model_info()
     
-    if not _gear_model_data or not query:
+    if not _gear_table or not query:
         return []
     
     query = query.strip()
     if not query:
         return []
     
-    results = []
     query_lower = query.lower()
     
-    for gear_id, gear_info in _gear_model_data.items():
-        gear_name = gear_info.get('name', '')
-        if query_lower in gear_name.lower():
-            label = f"{gear_name}_{gear_id}"
-            results.append({
-                'id': gear_id,
-                'name': gear_name,
-                'label': label
-            })
+    # 前 limit 条结果一定来自排序最靠前的 limit 个名称；同名装备按原顺序排列
+    exact = _name_index.search(query_lower, limit)
+    matches = []
+    for name_id in exact:
+        key = _name_index.key(name_id, query_lower)[:3]
+        matches.extend((key, row, name_id) for row in _rows_of_name(name_id))
+    matches.sort()
+    matches = [(row, name_id) for _, row, name_id in matches[:limit]]
     
-    # 按名称长度和匹配位置排序（精确匹配优先）
-    results.sort(key=lambda x: (
-        x['name'].lower().startswith(query_lower),
-        x['name'].lower().index(query_lower) if query_lower in x['name'].lower() else 999,
-        len(x['name'])
-    ))
+    # 精确匹配不足 limit 条时，匹配的名称都已在 exact 中
+    if len(matches) < limit:
+        for name_id in _related_names(query_lower, limit - len(matches), exact):
+            matches.extend((row, name_id) for row in _rows_of_name(name_id))
     
-    return results[:limit]
+    results = []
+    for row, name_id in matches[:limit]:
+        gear_id = _gear_table.gear_id(row)
+        gear_name = _name_index.names[name_id]
+        results.append({
+            'id': gear_id,
+            'name': gear_name,
+            'label': f"{gear_name}_{gear_id}"
+        })
+    
+    return results
 
 
 def autocomplete_gear_names(query: str, limit: int = 10) -> List[str]:
     """
-    装备名称自动补全
+    装备名称自动补全（匹配规则与 search_gears_by_name 相同）
     
     Args:
         query: 搜索关键词
@@ -170,43 +364,36 @@ def autocomplete_gear_names(query: str, limit: int = 10) -> List[str]:
     Returns:
         匹配的装备名称列表
     """
-    if _gear_model_data is None:
+    if _gear_table is None:
         load_gear_model_info()
     
-    if not _gear_model_data or not query:
+    if not _gear_table or not query:
         return []
     
     query = query.strip()
     if not query:
         return []
     
-    names = set()
     query_lower = query.lower()
-    
-    for gear_info in _gear_model_data.values():
-        gear_name = gear_info.get('name', '')
-        if query_lower in gear_name.lower():
-            names.add(gear_name)
-    
-    # 按名称长度和匹配位置排序
-    sorted_names = sorted(names, key=lambda x: (
-        x.lower().startswith(query_lower),
-        x.lower().index(query_lower) if query_lower in x.lower() else 999,
-        len(x)
-    ))
-    
-    return sorted_names[:limit]
+    names = _name_index.search(query_lower, limit)
+    if len(names) < limit:
+        names += _related_names(query_lower, limit - len(names), names)
+    return [_name_index.names[name_id] for name_id in names]
 
 
 def get_gear_model_info():
     """
-    获取装备模型信息数据（用于调试）
+    获取装备模型信息数据（用于调试，每次调用时从列式存储重新构建）
     
     Returns:
         装备模型信息字典
     """
-    if _gear_model_data is None:
+    if _gear_table is None:
         load_gear_model_info()
     
-    return _gear_model_data
+    model_paths = list(_gear_table.model_paths)
+    return {
+        gear_id: {'id': gear_id, 'name': name, 'model_path': model_paths[model_id]}
+        for gear_id, name, model_id in zip(_gear_table.gear_ids(), _gear_table.names, _gear_table.model_ids.tolist())
+    }
 
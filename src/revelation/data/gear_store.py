@@ -0,0 +1,335 @@
+"""
+装备模型信息的列式存储
+
+每个装备一行，按列保存：
+    ids        物品ID（int64 数组；存在非规范十进制ID时退化为字符串表）
+    names      装备名称（字符串表：一个 UTF-8 数据块 + 偏移数组）
+    model_ids  模型路径编号（int32 数组，模型路径去重后保存在字符串表中）
+    同模组     按模型路径分组的行号（CSR：group_offsets + group_rows，保持CSV中的出现顺序）
+
+可以保存为快照文件并通过 mmap 加载，多个 worker 进程共享同一份物理内存页，启动时不再解析CSV。
+文件布局与 gallery 缓存相同:
+    MAGIC (8 bytes) | 头部长度 (uint64, little-endian) | JSON 头部 | 按 64 字节对齐的数据段
+"""
+
+import os
+import csv
+import json
+import mmap
+import struct
+from collections.abc import Sequence
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"RVGEAR\x00\x01"
+VERSION = 1
+_ALIGN = 64
+
+
+class StringTable(Sequence):
+    """UTF-8 字符串表：所有字符串拼接为一个数据块，按偏移数组切分，访问时解码"""
+
+    def __init__(self, blob, offsets):
+        """
+        Args:
+            blob: 拼接后的 UTF-8 数据（bytes 或 mmap 上的 memoryview）
+            offsets: [n + 1] 的 int64 偏移数组
+        """
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        return str(self.blob[self.offsets[idx]:self.offsets[idx + 1]], "utf-8")
+
+    def take(self, indices: np.ndarray) -> List[str]:
+        """按下标数组取出多个字符串"""
+        starts = self.offsets[indices].tolist()
+        ends = self.offsets[indices + 1].tolist()
+        blob = self.blob
+        return [str(blob[start:end], "utf-8") for start, end in zip(starts, ends)]
+
+    def __iter__(self):
+        bounds = self.offsets.tolist()
+        blob = bytes(self.blob)
+        for start, end in zip(bounds, bounds[1:]):
+            yield blob[start:end].decode("utf-8")
+
+
+def _is_canonical_int(value):
+    return value.isascii() and value.isdigit() and str(int(value)) == value and int(value) < 2 ** 63
+
+
+class GearTable:
+    """
+    装备模型信息表
+
+    行的顺序和内容与按物品ID去重的字典一致：同一物品ID出现多次时保留首次出现的位置和最后一次的内容；
+    同模组保留CSV中的每一次出现（包括重复的ID和后来被覆盖的模型路径）。
+    """
+
+    def __init__(self, ids, names, model_ids, model_paths, group_offsets, group_rows):
+        """
+        Args:
+            ids: 物品ID，int64 数组或 StringTable
+            names: 装备名称 StringTable
+            model_ids: [n] int32，每行的模型路径编号
+            model_paths: 去重后的模型路径 StringTable
+            group_offsets: [模型路径数 + 1] int64
+            group_rows: 同模组成员的行号 int32，第 m 组为 group_rows[group_offsets[m]:group_offsets[m + 1]]
+        """
+        self.ids = ids
+        self.names = names
+        self.model_ids = model_ids
+        self.model_paths = model_paths
+        self.group_offsets = group_offsets
+        self.group_rows = group_rows
+
+        if isinstance(ids, StringTable):
+            self._row_of = {gear_id: row for row, gear_id in enumerate(ids)}
+            self._id_order = None
+        else:
+            # 整数ID按排序后的下标二分查找，不为每个ID建立字典项
+            self._row_of = None
+            self._id_order = np.argsort(ids, kind="stable")
+            self._sorted_ids = ids[self._id_order]
+
+    def __len__(self):
+        return len(self.model_ids)
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.zeros(0, dtype=np.int64),
+            StringTable.from_strings([]),
+            np.zeros(0, dtype=np.int32),
+            StringTable.from_strings([]),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(0, dtype=np.int32)
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        """
+        解析装备模型信息CSV（列：物品ID, 物品名称, 模型路径）
+        """
+        rows_of = {}
+        names = []
+        paths = []
+        occurrences = []
+        with open(csv_path, 'r', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                item_id = row.get('物品ID', '')
+                item_name = row.get('物品名称', '').strip('"')
+                model_path = row.get('模型路径', '')
+
+                if not item_id or not item_name or not model_path:
+                    continue
+
+                idx = rows_of.get(item_id)
+                if idx is None:
+                    idx = rows_of[item_id] = len(names)
+                    names.append(item_name)
+                    paths.append(model_path)
+                else:
+                    names[idx] = item_name
+                    paths[idx] = model_path
+                occurrences.append((model_path, idx))
+
+        path_ids = {}
+        for model_path in paths:
+            path_ids.setdefault(model_path, len(path_ids))
+        for model_path, _ in occurrences:
+            path_ids.setdefault(model_path, len(path_ids))
+
+        model_ids = np.array([path_ids[p] for p in paths], dtype=np.int32)
+        occurrence_paths = np.array([path_ids[p] for p, _ in occurrences], dtype=np.int64)
+        occurrence_rows = np.array([idx for _, idx in occurrences], dtype=np.int32)
+        order = np.argsort(occurrence_paths, kind="stable")
+        group_offsets = np.zeros(len(path_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(occurrence_paths, minlength=len(path_ids)), out=group_offsets[1:])
+
+        item_ids = list(rows_of)
+        if all(_is_canonical_int(item_id) for item_id in item_ids):
+            ids = np.array([int(item_id) for item_id in item_ids], dtype=np.int64)
+        else:
+            ids = StringTable.from_strings(item_ids)
+
+        return cls(
+            ids,
+            StringTable.from_strings(names),
+            model_ids,
+            StringTable.from_strings(list(path_ids)),
+            group_offsets,
+            occurrence_rows[order]
+        )
+
+    def gear_id(self, row: int) -> str:
+        if self._id_order is None:
+            return self.ids[row]
+        return str(int(self.ids[row]))
+
+    def name(self, row: int) -> str:
+        return self.names[row]
+
+    def model_path(self, row: int) -> str:
+        return self.model_paths[self.model_ids[row]]
+
+    def row_of(self, gear_id: str) -> Optional[int]:
+        """物品ID对应的行号，不存在时为 None"""
+        if self._id_order is None:
+            return self._row_of.get(gear_id)
+        if not _is_canonical_int(gear_id):
+            return None
+        value = int(gear_id)
+        pos = int(np.searchsorted(self._sorted_ids, value))
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == value:
+            return int(self._id_order[pos])
+        return None
+
+    def group_of(self, row: int) -> List[int]:
+        """与该行同一模型路径的所有行号（按CSV中的出现顺序，包括自身）"""
+        model_id = self.model_ids[row]
+        return self.group_rows[self.group_offsets[model_id]:self.group_offsets[model_id + 1]].tolist()
+
+    def group_bounds(self, row: int) -> Tuple[int, int]:
+        """该行所在同模组在 group_rows 中的范围 [start, end)"""
+        model_id = self.model_ids[row]
+        return int(self.group_offsets[model_id]), int(self.group_offsets[model_id + 1])
+
+    def siblings(self, row: int) -> np.ndarray:
+        """同一模型路径的其他行号（按CSV中的出现顺序，不包括自身的每一次出现）"""
+        start, end = self.group_bounds(row)
+        rows = self.group_rows[start:end]
+        return rows[rows != row]
+
+    def groups(self) -> Iterator[Tuple[int, List[int]]]:
+        """遍历同模组：(模型路径编号, 行号列表)"""
+        rows = self.group_rows.tolist()
+        bounds = self.group_offsets.tolist()
+        for model_id in range(len(bounds) - 1):
+            yield model_id, rows[bounds[model_id]:bounds[model_id + 1]]
+
+    def gear_ids(self, rows: Optional[np.ndarray] = None) -> List[str]:
+        """所有行（或 rows 中各行）的物品ID"""
+        if self._id_order is None:
+            return list(self.ids) if rows is None else self.ids.take(rows)
+        ids = self.ids if rows is None else self.ids[rows]
+        return [str(i) for i in ids.tolist()]
+
+    def nbytes(self) -> int:
+        """列数据占用的字节数"""
+        total = self.model_ids.nbytes + self.group_offsets.nbytes + self.group_rows.nbytes
+        for table in (self.names, self.model_paths):
+            total += len(table.blob) + table.offsets.nbytes
+        if isinstance(self.ids, StringTable):
+            total += len(self.ids.blob) + self.ids.offsets.nbytes
+        else:
+            total += self.ids.nbytes
+        return total
+
+    def _sections(self) -> Dict[str, np.ndarray]:
+        sections = {
+            "model_ids": self.model_ids,
+            "group_offsets": self.group_offsets,
+            "group_rows": self.group_rows,
+        }
+        for key, table in (("names", self.names), ("model_paths", self.model_paths), ("ids", self.ids)):
+            if isinstance(table, StringTable):
+                sections[f"{key}.blob"] = np.frombuffer(bytes(table.blob), dtype=np.uint8)
+                sections[f"{key}.offsets"] = table.offsets
+            else:
+                sections[key] = table
+        return sections
+
+    def save(self, path, meta=None):
+        """
+        原子地写入快照文件
+
+        Args:
+            path: 输出路径
+            meta: 写入头部的附加信息（如源CSV的签名）
+        """
+        entries = {}
+        payloads = []
+        offset = 0
+        for name, array in self._sections().items():
+            array = np.ascontiguousarray(array)
+            entries[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            payloads.append((offset, array.tobytes()))
+            offset += (array.nbytes + _ALIGN - 1) // _ALIGN * _ALIGN
+
+        header = dict(meta or {}, version=VERSION, count=len(self), sections=entries)
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        data_start = (len(MAGIC) + 8 + len(header_bytes) + _ALIGN - 1) // _ALIGN * _ALIGN
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            for section_offset, data in payloads:
+                f.seek(data_start + section_offset)
+                f.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """通过 mmap 加载快照文件（各数据段为 mmap 上的零拷贝只读视图）"""
+        header = read_snapshot_header(path)
+        if header is None or header.get("version") != VERSION:
+            raise ValueError(f"Not a gear snapshot file: {path}")
+
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        base = header["data_start"]
+        arrays = {}
+        for name, entry in header["sections"].items():
+            dtype = np.dtype(entry["dtype"])
+            count = int(np.prod(entry["shape"]))
+            if count == 0:
+                arrays[name] = np.zeros(entry["shape"], dtype=dtype)
+                continue
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=base + entry["offset"])
+
+        def table(key):
+            if key in arrays:
+                return arrays[key]
+            return StringTable(memoryview(arrays[f"{key}.blob"]), arrays[f"{key}.offsets"])
+
+        store = cls(
+            table("ids"),
+            table("names"),
+            arrays["model_ids"],
+            table("model_paths"),
+            arrays["group_offsets"],
+            arrays["group_rows"]
+        )
+        store.header = header
+        return store
+
+
+def read_snapshot_header(path):
+    """只读取快照头部，文件不是快照格式时返回 None"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length).decode("utf-8"))
+    header["data_start"] = (len(MAGIC) + 8 + length + _ALIGN - 1) // _ALIGN * _ALIGN
+    return header
@@ -0,0 +1,301 @@
+"""
+装备名称 n-gram 倒排索引
+
+按小写后名称的单字和二字片段（适用于中日韩名称，不依赖分词）建立倒排表，加载装备信息时构建一次。
+排序规则与原先的线性扫描一致：按 (是否以关键词开头, 关键词首次出现位置, 名称长度) 升序
+（以关键词开头的名称排在后面），相同时按名称在CSV中首次出现的顺序。
+
+模糊检索复用同一份倒排表：按与关键词共有的 n-gram 数估计编辑距离下界筛选候选，
+再用位并行（Myers）算法计算关键词与名称子串的最小编辑距离。
+"""
+
+import heapq
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# 片段编码为一个整数：单字为码位，二字为 (首字码位 + 1) << 21 | 次字码位
+_CODE_BITS = 21
+
+
+def _gram_code(gram: str) -> int:
+    if len(gram) == 1:
+        return ord(gram)
+    return (ord(gram[0]) + 1) << _CODE_BITS | ord(gram[1])
+
+
+class NameIndex:
+    """
+    名称子串检索索引
+
+    每个片段的倒排表按该片段的排序键预先排好，长度为 1 或 2 的关键词直接截取倒排表；
+    更长的关键词从最短的倒排表取候选，校验子串后再排序。
+    倒排表以 CSR 数组保存：片段编码（有序）、偏移和拼接后的名称下标，不为每个片段创建 Python 对象。
+    """
+
+    def __init__(self, names: Sequence[str]):
+        """
+        Args:
+            names: 去重后的名称列表（按CSV中首次出现的顺序）
+        """
+        self.names = list(names)
+        # 小写后不变的名称（如中文名称）直接引用原字符串
+        self._lower = [name if lower == name else lower for name, lower in zip(self.names, map(str.lower, self.names))]
+        self._lengths = [len(name) for name in self.names]
+
+        # 排序键编码为一个整数（比较元组慢得多）：(是否开头, 位置, 长度, 下标) 各占固定位宽
+        # （个别字符小写后会变长，位置按小写后的名称计算）
+        self._length_bits = max(map(len, self._lower + self.names), default=0).bit_length() + 1
+        self._id_bits = max(1, len(self.names).bit_length())
+        # 键的低位部分 (长度, 下标) 与关键词无关，预先算好
+        self._tails = [length << self._id_bits | name_id for name_id, length in enumerate(self._lengths)]
+        self._tail_bits = self._length_bits + self._id_bits
+
+        grams: List[int] = []
+        keys: List[int] = []
+        length_bits, tail_bits = self._length_bits, self._tail_bits
+        for name_id, lower in enumerate(self._lower):
+            # 从后往前赋值，留下的是每个片段首次出现的位置；
+            # 末尾的 lower[i:i + 2] 只有一个字符，与 lower[i] 相同
+            first = {}
+            for i in range(len(lower) - 1, -1, -1):
+                first[lower[i:i + 2]] = i
+                first[lower[i]] = i
+            tail = self._tails[name_id]
+            for gram, pos in first.items():
+                grams.append(_gram_code(gram))
+                keys.append(((pos == 0) << length_bits | pos) << tail_bits | tail)
+
+        # 按 (片段, 排序键) 排列，同一片段的名称下标连续且有序
+        grams = np.array(grams, dtype=np.int64)
+        keys = np.array(keys, dtype=np.int64)
+        order = np.lexsort((keys, grams))
+        self._grams, starts = np.unique(grams[order], return_index=True)
+        self._offsets = np.append(starts, len(order)).astype(np.int64)
+        self._posting_ids = (keys[order] & ((1 << self._id_bits) - 1)).astype(np.int32)
+
+        self._empty = np.zeros(0, dtype=np.int32)
+        # 模糊检索时按需转换的码位数组
+        self._encoded = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def key(self, name_id: int, query: str) -> Tuple[bool, int, int, int]:
+        """名称相对关键词的排序键 (是否以关键词开头, 首次出现位置, 名称长度, 名称下标)"""
+        pos = self._lower[name_id].find(query)
+        return pos == 0, pos, self._lengths[name_id], name_id
+
+    def search(self, query: str, limit: int) -> List[int]:
+        """
+        检索包含关键词的名称
+
+        Args:
+            query: 小写后的关键词
+            limit: 返回数量上限
+
+        Returns:
+            名称下标列表（按排序规则）
+        """
+        if not query or limit <= 0:
+            return []
+
+        if len(query) <= 2:
+            return self._postings(query)[:limit].tolist()
+
+        grams = {query[i:i + 2] for i in range(len(query) - 1)}
+        shortest = min((self._postings(gram) for gram in grams), key=len).tolist()
+
+        lower, tails = self._lower, self._tails
+        length_bits, tail_bits = self._length_bits, self._tail_bits
+        keys = [
+            ((pos == 0) << length_bits | pos) << tail_bits | tails[name_id]
+            for name_id in shortest
+            for pos in (lower[name_id].find(query),)
+            if pos >= 0
+        ]
+        keys = heapq.nsmallest(limit, keys) if len(keys) > limit * 4 else sorted(keys)[:limit]
+
+        id_mask = (1 << self._id_bits) - 1
+        return [key & id_mask for key in keys]
+
+    def _postings(self, gram: str) -> np.ndarray:
+        """包含该片段的名称下标（按排序键，CSR 数组上的视图）"""
+        code = _gram_code(gram)
+        i = int(np.searchsorted(self._grams, code))
+        if i == len(self._grams) or self._grams[i] != code:
+            return self._empty
+        return self._posting_ids[self._offsets[i]:self._offsets[i + 1]]
+
+    def search_fuzzy(self, query: str, max_distance: int, limit: int, exclude=()) -> List[Tuple[int, int]]:
+        """
+        模糊检索：名称中存在与关键词编辑距离不超过 max_distance 的子串（按单字筛选候选）
+
+        Returns:
+            [(编辑距离, 名称下标)]，按 (编辑距离, 名称长度, 名称下标) 排序
+        """
+        if self._encoded is None:
+            self._encoded = encode_texts(self._lower)
+        return fuzzy_search(self._lower, self._encoded, self._postings, query, max_distance, limit, 1, exclude)
+
+
+def encode_texts(texts: Sequence[str], padding: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将文本拼接为码位数组，文本之间以 0 分隔，末尾补 padding 个 0
+
+    Returns:
+        码位数组 (uint32), 每个文本的起始位置 (int64), 每个文本的长度 (int64)
+    """
+    joined = '\x00'.join(texts) + '\x00' * padding
+    codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+    lengths = np.array([len(text) for text in texts], dtype=np.int64)
+    starts = np.cumsum(lengths + 1) - lengths - 1
+    return codes, starts, lengths
+
+
+# 候选按块校验（第一块 _CHUNK 个），块内候选数不少于 _BATCH_MIN 时按列向量化计算编辑距离
+_CHUNK = 256
+_BATCH_MIN = 64
+
+
+def fuzzy_search(texts: Sequence[str], encoded, postings, query: str, max_distance: int, limit: int,
+                 gram: int = 1, exclude=()) -> List[Tuple[int, int]]:
+    """
+    模糊检索：texts 中存在与关键词编辑距离不超过 max_distance 的子串
+
+    每处编辑最多破坏 gram 个 n-gram，缺少 m 个关键词 n-gram 的文本编辑距离至少为 ceil(m / gram)；
+    候选按该下界从小到大、同一下界内按 (长度, 下标) 分块校验，已确定前 limit 个结果时提前结束。
+    至少共有一个 n-gram 的文本才会成为候选。
+
+    Args:
+        texts: 小写后的文本
+        encoded: encode_texts(texts) 的结果
+        postings: n-gram -> 包含该片段的文本下标数组（不重复）
+        query: 小写后的关键词
+        max_distance: 最大编辑距离
+        limit: 返回数量上限
+        gram: 候选筛选使用的片段长度
+        exclude: 不需要返回的文本下标（如已精确匹配的名称）
+
+    Returns:
+        [(编辑距离, 文本下标)]，按 (编辑距离, 文本长度, 文本下标) 排序
+    """
+    if not query or limit <= 0 or max_distance <= 0 or len(query) < gram:
+        return []
+
+    lengths = encoded[2]
+    grams = {query[i:i + gram] for i in range(len(query) - gram + 1)}
+    counts = np.bincount(np.concatenate([postings(g) for g in grams]), minlength=len(texts))
+    # 编辑距离下界
+    bounds = (len(grams) - counts + gram - 1) // gram
+    bounds[counts == 0] = max_distance + 1
+    if exclude:
+        bounds[np.fromiter(exclude, dtype=np.int64)] = max_distance + 1
+
+    peq: Dict[str, int] = {}
+    for i, ch in enumerate(query):
+        peq[ch] = peq.get(ch, 0) | 1 << i
+
+    found = []
+    for bound in range(max_distance + 1):
+        candidates = np.flatnonzero(bounds == bound)
+        candidates = candidates[np.argsort(lengths[candidates], kind='stable')]
+        start, size = 0, _CHUNK
+        while start < len(candidates):
+            chunk = candidates[start:start + size]
+            # 向量化计算的开销主要在每列固定的调用次数上，之后的块逐渐增大
+            start, size = start + size, size * 4
+            if len(chunk) >= _BATCH_MIN and len(query) < 64:
+                distances = _batch_distances(peq, len(query), encoded, chunk).tolist()
+            else:
+                distances = [_substring_distance(peq, len(query), texts[text_id]) for text_id in chunk.tolist()]
+            found.extend(
+                (distance, length, text_id)
+                for distance, length, text_id in zip(distances, lengths[chunk].tolist(), chunk.tolist())
+                if distance <= max_distance
+            )
+            # 未校验的候选排序键都不小于 (bound, 本块最后一个候选的长度, 下标)
+            last = (bound, int(lengths[chunk[-1]]), int(chunk[-1]))
+            if sum(1 for item in found if item <= last) >= limit:
+                found.sort()
+                return [(distance, text_id) for distance, _, text_id in found[:limit]]
+
+    found.sort()
+    return [(distance, text_id) for distance, _, text_id in found[:limit]]
+
+
+def _substring_distance(peq: Dict[str, int], length: int, text: str) -> int:
+    """
+    关键词与 text 任意子串的最小编辑距离（Myers 位并行算法）
+
+    Args:
+        peq: 关键词每个字符出现位置的位掩码
+        length: 关键词长度
+        text: 名称
+    """
+    mask = (1 << length) - 1
+    last = 1 << (length - 1)
+    pv, mv = mask, 0
+    score = best = length
+    for ch in text:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+            if score < best:
+                best = score
+                if best == 0:
+                    break
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return best
+
+
+def _batch_distances(peq: Dict[str, int], length: int, encoded, text_ids: np.ndarray) -> np.ndarray:
+    """
+    _substring_distance 的向量化版本：所有候选同时按列推进（关键词不超过 63 个字符）
+
+    Args:
+        peq: 关键词每个字符出现位置的位掩码
+        length: 关键词长度
+        encoded: encode_texts 的结果
+        text_ids: 候选文本下标
+    """
+    codes, starts, text_lengths = encoded
+    positions = starts[text_ids]
+    text_lengths = text_lengths[text_ids]
+
+    query_codes = np.array(sorted(ord(ch) for ch in peq), dtype=np.uint32)
+    query_masks = np.array([peq[chr(code)] for code in query_codes.tolist()], dtype=np.uint64)
+
+    mask = np.uint64((1 << length) - 1)
+    last = np.uint64(1 << (length - 1))
+    one = np.uint64(1)
+    pv = np.full(len(text_ids), mask, dtype=np.uint64)
+    mv = np.zeros(len(text_ids), dtype=np.uint64)
+    score = np.full(len(text_ids), length, dtype=np.int64)
+    best = score.copy()
+    for j in range(int(text_lengths.max(initial=0))):
+        active = j < text_lengths
+        chars = codes[np.minimum(positions + j, len(codes) - 1)]
+        slots = np.minimum(np.searchsorted(query_codes, chars), len(query_codes) - 1)
+        eq = np.where(query_codes[slots] == chars, query_masks[slots], np.uint64(0))
+
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        score = np.where(active, score + ((ph & last) != 0) - ((mh & last) != 0), score)
+        best = np.minimum(best, score)
+        ph = (ph << one) & mask
+        mh = (mh << one) & mask
+        pv = np.where(active, mh | (~(xv | ph) & mask), pv)
+        mv = np.where(active, ph & xv, mv)
+    return best
@@ -0,0 +1,224 @@
+"""
+装备名称拼音检索（可选依赖 pypinyin）
+
+名称先按 pypinyin 的词典分词再逐词转写，多音字按词组读音（与 lazy_pinyin 整句转写的结果一致）；
+相同的词只转写一次。非汉字字符原样保留，每个字符对应一个读音。
+
+全拼和首字母各建一张读音边界表（每个字的读音在转写文本中的起始位置，按其后 3 个字符排序）：
+关键词必须从某个字的读音开头开始匹配，避免 "baoji" 匹配到 "long(bao jing)" 这样跨读音的片段。
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .name_index import encode_texts, fuzzy_search
+
+
+def load_pypinyin():
+    """导入 pypinyin，未安装时返回 None"""
+    try:
+        import pypinyin
+        from pypinyin.seg.mmseg import seg  # noqa: F401
+    except ImportError:
+        return None
+    return pypinyin
+
+
+def transliterate(names: Sequence[str]) -> Optional[List[Tuple[str, ...]]]:
+    """
+    将名称逐字转写为拼音
+
+    Args:
+        names: 名称列表
+
+    Returns:
+        每个名称的读音元组（与名称的字符一一对应，非汉字为字符本身）；未安装 pypinyin 时返回 None
+    """
+    pypinyin = load_pypinyin()
+    if pypinyin is None:
+        return None
+    from pypinyin.seg.mmseg import seg
+
+    words: Dict[str, Tuple[str, ...]] = {}
+    results = []
+    for name in names:
+        syllables = []
+        for word in seg.cut(name.lower()):
+            converted = words.get(word)
+            if converted is None:
+                # 非汉字逐字符返回，每个元素与 word 中的一个字符对应
+                converted = words[word] = pypinyin.lazy_pinyin(word, errors=list)
+            syllables.extend(converted)
+        results.append(tuple(syllables))
+    return results
+
+
+_SEPARATOR = 0
+# 前缀键打包的字符数，每个码位占 21 位
+_PREFIX_CHARS = 3
+_CODE_BITS = 21
+
+
+def _pack(codes: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """positions 开始的前 _PREFIX_CHARS 个码位打包为一个整数（遇到分隔符后为 0）"""
+    packed = np.zeros(len(positions), dtype=np.int64)
+    alive = np.ones(len(positions), dtype=bool)
+    for j in range(_PREFIX_CHARS):
+        code = codes[positions + j].astype(np.int64)
+        alive &= code != _SEPARATOR
+        packed = packed << _CODE_BITS | np.where(alive, code, 0)
+    return packed
+
+
+class _BoundaryIndex:
+    """从读音边界开始的后缀，按前 3 个字符排序后二分查找，更长的关键词逐字符向量化校验"""
+
+    def __init__(self, encoded, token_starts: np.ndarray, token_counts: np.ndarray, lengths: np.ndarray):
+        """
+        Args:
+            encoded: 转写后的文本，encode_texts 的结果（末尾至少补 _PREFIX_CHARS 个 0）
+            token_starts: 所有读音在各自文本中的起始偏移（按文本顺序展开）
+            token_counts: 每个文本的读音数
+            lengths: 名称长度（排序用）
+        """
+        self._codes, text_starts, _ = encoded
+        text_ids = np.repeat(np.arange(len(text_starts), dtype=np.int64), token_counts)
+        token_index = np.arange(len(text_ids), dtype=np.int64) - np.repeat(np.cumsum(token_counts) - token_counts, token_counts)
+        positions = text_starts[text_ids] + token_starts
+
+        # 排序键：(匹配开始的字序号, 名称长度, 名称下标) 编码为一个整数
+        self._id_bits = max(1, len(text_starts).bit_length())
+        length_bits = int(lengths.max(initial=0)).bit_length() + 1
+        ranks = (token_index << length_bits | lengths[text_ids]) << self._id_bits | text_ids
+
+        prefixes = _pack(self._codes, positions)
+        order = np.lexsort((ranks, prefixes))
+        self._prefixes = prefixes[order]
+        self._positions = positions[order]
+        self._ranks = ranks[order]
+
+    def search(self, query: str, limit: int, exclude=()) -> List[int]:
+        """以关键词开头的后缀所属的文本下标（按排序键，不重复）"""
+        codes = [ord(ch) for ch in query]
+        head = codes[:_PREFIX_CHARS]
+        low = high = 0
+        for j in range(_PREFIX_CHARS):
+            code = head[j] if j < len(head) else None
+            low = low << _CODE_BITS | (code if code is not None else 0)
+            high = high << _CODE_BITS | (code if code is not None else (1 << _CODE_BITS) - 1)
+        lo = int(np.searchsorted(self._prefixes, low, side='left'))
+        hi = int(np.searchsorted(self._prefixes, high, side='right'))
+        if lo >= hi:
+            return []
+
+        ranks = self._ranks[lo:hi]
+        if len(codes) > _PREFIX_CHARS:
+            positions = self._positions[lo:hi]
+            matched = np.ones(len(positions), dtype=bool)
+            for j in range(_PREFIX_CHARS, len(codes)):
+                # 末尾补过 0，越界位置不会超出数组
+                matched &= self._codes[np.minimum(positions + j, len(self._codes) - 1)] == codes[j]
+            ranks = ranks[matched]
+
+        id_mask = (1 << self._id_bits) - 1
+        results = []
+        seen = set(exclude)
+        for rank in np.sort(ranks).tolist():
+            text_id = rank & id_mask
+            if text_id not in seen:
+                seen.add(text_id)
+                results.append(text_id)
+                if len(results) >= limit:
+                    break
+        return results
+
+
+class PinyinIndex:
+    """
+    名称的全拼和首字母检索索引
+
+    全拼可以跨字连续输入（"zhanshu"、"zhanshuhu"）；首字母为每个字一个字母（"zshs"）。
+    排序按 (匹配开始的字序号, 名称长度, 名称下标)，从名称开头匹配的排在前面。
+    """
+
+    def __init__(self, syllables: Sequence[Tuple[str, ...]]):
+        """
+        Args:
+            syllables: transliterate 的结果，下标与名称索引一致
+        """
+        self._full = [''.join(name) for name in syllables]
+        lengths = np.array([len(name) for name in syllables], dtype=np.int64)
+
+        # 每个读音在全拼中的起始偏移
+        syllable_lengths = np.array([len(syllable) for name in syllables for syllable in name], dtype=np.int64)
+        ends = np.cumsum(syllable_lengths)
+        name_ends = ends[np.cumsum(lengths) - 1] if len(syllable_lengths) else ends
+        name_offsets = np.concatenate([[0], name_ends[:-1]]) if len(name_ends) else name_ends
+        full_starts = ends - syllable_lengths - np.repeat(name_offsets, lengths)
+        self._encoded = encode_texts(self._full, _PREFIX_CHARS)
+        self._full_index = _BoundaryIndex(self._encoded, full_starts, lengths, lengths)
+
+        # 首字母每个字一个字符
+        initials = [''.join(syllable[:1] for syllable in name) for name in syllables]
+        initial_starts = np.arange(len(syllable_lengths), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        self._initials_index = _BoundaryIndex(encode_texts(initials, _PREFIX_CHARS), initial_starts, lengths, lengths)
+
+        self._bigrams = _bigram_postings(self._encoded)
+        self._empty = np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self._full)
+
+    def search(self, query: str, limit: int, exclude=()) -> List[int]:
+        """
+        全拼或首字母匹配的名称下标，全拼匹配在前
+
+        Args:
+            query: 小写后的关键词
+            limit: 返回数量上限
+            exclude: 不需要返回的名称下标
+        """
+        if not query or limit <= 0:
+            return []
+        names = self._full_index.search(query, limit, exclude)
+        if len(names) < limit:
+            names += self._initials_index.search(query, limit - len(names), set(exclude) | set(names))
+        return names
+
+    def search_fuzzy(self, query: str, max_distance: int, limit: int, exclude=()) -> List[Tuple[int, int]]:
+        """
+        全拼的模糊匹配（按二字片段筛选候选）
+
+        Returns:
+            [(编辑距离, 名称下标)]
+        """
+        return fuzzy_search(
+            self._full, self._encoded, lambda gram: self._bigrams.get(gram, self._empty),
+            query, max_distance, limit, 2, exclude
+        )
+
+
+def _bigram_postings(encoded) -> Dict[str, np.ndarray]:
+    """二字片段 -> 包含该片段的文本下标数组（不重复）"""
+    codes, _, lengths = encoded
+    count = max(1, len(lengths))
+    # 每个文本及其后的分隔符
+    text_ids = np.repeat(np.arange(count, dtype=np.int64), lengths + 1)
+    first = codes[:len(text_ids)].astype(np.int64)
+    second = codes[1:len(text_ids) + 1].astype(np.int64)
+    valid = (first != _SEPARATOR) & (second != _SEPARATOR)
+    grams = (first << _CODE_BITS | second)[valid]
+    text_ids = text_ids[valid]
+
+    # 按 (片段, 文本) 去重，同一片段的文本下标连续且有序
+    pairs = np.unique(grams * count + text_ids)
+    grams = pairs // count
+    text_ids = (pairs % count).astype(np.int32)
+    keys, bounds = np.unique(grams, return_index=True)
+    bounds = np.append(bounds, len(grams)).tolist()
+    mask = (1 << _CODE_BITS) - 1
+    return {
+        chr(key >> _CODE_BITS) + chr(key & mask): text_ids[bounds[i]:bounds[i + 1]]
+        for i, key in enumerate(keys.tolist())
+    }
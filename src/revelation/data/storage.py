@@ -4,6 +4,7 @@
 
 import os
 import uuid
+import asyncio
 from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Optional
@@ -63,7 +64,8 @@ class LocalFileStorage(StorageBackend):
         file_ext = Path(filename).suffix or ".jpg"
         unique_filename = f"{uuid.uuid4().hex}{file_ext}"
         file_path = self.today_dir / unique_filename
-        file_path.write_bytes(image_data)
+        # 文件写入在线程中执行，不阻塞事件循环
+        await asyncio.to_thread(file_path.write_bytes, image_data)
         return str(file_path.relative_to(self.base_dir))
     
     async def delete(self, path: str) -> bool:
@@ -0,0 +1,167 @@
+"""
+推理微批调度模块
+
+将并发到达的查询在短时间窗口内合并为一个批次，
+只做一次前向和一次相似度计算，再把结果分发回各个等待的请求。
+"""
+
+import os
+import time
+import asyncio
+from collections import Counter, deque
+
+from .executor import run_inference
+from ..stats import latency_summary
+
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 8))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', 5))
+
+_batcher = None
+
+
+class MicroBatcher:
+    """
+    请求合并调度器
+
+    第一个请求入队后最多等待 max_wait_ms，或凑满 max_batch_size 即执行。
+    同一时间只有一个批次在执行，执行期间到达的请求会进入下一批。
+    """
+
+    def __init__(self, process_fn, max_batch_size=8, max_wait_ms=5.0, window=1024):
+        """
+        Args:
+            process_fn: 批处理函数，接收输入列表，返回等长的结果列表（在推理线程池中执行）
+            max_batch_size: 单批最大请求数
+            max_wait_ms: 首个请求的最长等待时间（毫秒）
+            window: 耗时统计保留的最近样本数
+        """
+        self.process_fn = process_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = None
+        self._task = None
+
+        self._total_requests = 0
+        self._total_batches = 0
+        self._batch_sizes = Counter()
+        self._wait_ms = deque(maxlen=window)
+        self._process_ms = deque(maxlen=window)
+
+    async def start(self):
+        """启动后台调度任务"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台调度任务，未处理的请求以异常结束"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, item):
+        """
+        提交一个请求并等待其结果
+
+        Args:
+            item: 传给 process_fn 的单个输入
+
+        Returns:
+            process_fn 对应位置的输出
+        """
+        if self._task is None:
+            await self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        """收集一个批次"""
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+
+            # 等待方已取消的请求不再计算
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            dispatched = time.perf_counter()
+            self._total_requests += len(batch)
+            self._total_batches += 1
+            self._batch_sizes[len(batch)] += 1
+            for _, _, enqueued in batch:
+                self._wait_ms.append((dispatched - enqueued) * 1000.0)
+
+            items = [item for item, _, _ in batch]
+            try:
+                outputs = await run_inference(self.process_fn, items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future, _), output in zip(batch, outputs):
+                    if not future.done():
+                        future.set_result(output)
+            finally:
+                self._process_ms.append((time.perf_counter() - dispatched) * 1000.0)
+
+    def stats(self):
+        """调度器运行指标"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "total_requests": self._total_requests,
+            "total_batches": self._total_batches,
+            "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            "wait_ms": latency_summary(self._wait_ms),
+            "process_ms": latency_summary(self._process_ms),
+        }
+
+
+def get_batcher():
+    """获取全局推理调度器"""
+    global _batcher
+
+    if _batcher is None:
+        from .predictor import predict_batch
+        _batcher = MicroBatcher(
+            predict_batch,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS
+        )
+
+    return _batcher
@@ -0,0 +1,124 @@
+"""
+预测结果缓存模块
+
+以上传图片内容的哈希和当前模型/gallery快照版本为键缓存Top-K结果，
+重复提交的截图和装备栏位图片不再经过模型前向。
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 4096))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', 3600))
+
+_result_cache = None
+
+
+def content_key(image_data, version, top_k):
+    """
+    缓存键：图片内容哈希（blake2b-128）+ 快照版本 + top_k
+
+    快照版本变化后旧条目不会再被命中，重新加载后无需逐条判断是否过期。
+    """
+    digest = hashlib.blake2b(image_data, digest_size=16).digest()
+    return digest, version, top_k
+
+
+class ResultCache:
+    """
+    线程安全的 LRU + TTL 缓存
+
+    条目数超过 max_entries 时淘汰最久未使用的条目，超过 ttl 秒的条目在读取时丢弃。
+    缓存的值视为只读，调用方不应修改。
+    """
+
+    def __init__(self, max_entries=4096, ttl=3600.0):
+        """
+        Args:
+            max_entries: 最大条目数，0 为不缓存
+            ttl: 条目有效期（秒），0 为不过期
+        """
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = max(0.0, float(ttl))
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回 None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            value, stored_at = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        """写入缓存"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """清空缓存（重新加载后释放旧版本的条目）"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """缓存运行指标"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+def get_result_cache():
+    """获取全局预测结果缓存"""
+    global _result_cache
+
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            max_entries=RESULT_CACHE_SIZE,
+            ttl=RESULT_CACHE_TTL
+        )
+
+    return _result_cache
@@ -4,8 +4,16 @@
 
 import numpy as np
 import cv2
+from PIL import Image, ImageOps
 from torch.utils.data import Dataset
 
+from .preprocess import resize_uint8
+
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+
+# EXIF 方向标签
+_EXIF_ORIENTATION = 0x0112
+
 
 def imread_unicode(image_path):
     """读取支持中文路径的图片"""
@@ -14,14 +22,47 @@ def imread_unicode(image_path):
     return img
 
 
+def read_resized_rgb(image_path, size=512):
+    """
+    读取图片并一次缩放到 size x size 的 RGB uint8 张量
+
+    JPEG 使用 DCT 域的缩小解码（PIL draft），只解码出不小于 size x size 的最小分辨率；
+    其他格式用 cv2 解码，先缩放再交换颜色通道，只在缩放后的小图上做交换。
+
+    Args:
+        image_path: 图片路径
+        size: 目标边长
+
+    Returns:
+        torch.Tensor: [3, size, size] uint8 RGB
+    """
+    if image_path.lower().endswith(JPEG_EXTENSIONS):
+        with Image.open(image_path) as img:
+            img.draft("RGB", (size, size))
+            # cv2.imdecode 默认按 EXIF 方向旋转，这里保持一致
+            if img.getexif().get(_EXIF_ORIENTATION, 1) != 1:
+                img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            return resize_uint8(np.array(img), size).contiguous()
+
+    img = imread_unicode(image_path)
+    if img is None:
+        raise ValueError(f"Failed to decode image: {image_path}")
+
+    return resize_uint8(img, size).flip(0)
+
+
 class GalleryDataset(Dataset):
     """
     用于构建 gallery embedding 的 Dataset
+
+    返回缩放后的 uint8 图片 [3, size, size]，归一化在消费端按批次进行（见 normalize_batch）。
     """
-    def __init__(self, image_paths, labels, transform):
+    def __init__(self, image_paths, labels, size=512):
         self.image_paths = image_paths
         self.labels = labels
-        self.transform = transform
+        self.size = size
 
     def __len__(self):
         return len(self.image_paths)
@@ -29,10 +70,6 @@ class GalleryDataset(Dataset):
     def __getitem__(self, idx):
         img_path = self.image_paths[idx]
 
-        img = imread_unicode(img_path)
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-        img = self.transform(img)
+        img = read_resized_rgb(img_path, self.size)
 
         return img, self.labels[idx]
-
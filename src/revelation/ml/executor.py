@@ -0,0 +1,83 @@
+"""
+推理线程池与线程数配置
+
+预处理和模型前向在专用线程池中执行，不与存储上传等共用 asyncio 的默认线程池；
+线程池大小与 PyTorch / onnxruntime 的算子内线程数一起配置，避免 CPU 核心超额分配。
+"""
+
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 2))
+# 每次前向计算的算子内线程数；未配置（0）时把 CPU 核数平分给 INFERENCE_WORKERS 个并发的前向计算（至少 1）
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', 0))
+INFERENCE_THREADS_AUTO = INFERENCE_THREADS <= 0
+if INFERENCE_THREADS_AUTO:
+    INFERENCE_THREADS = max(1, (os.cpu_count() or 1) // max(1, INFERENCE_WORKERS))
+INFERENCE_INTEROP_THREADS = int(os.getenv('INFERENCE_INTEROP_THREADS', 0))
+
+_executor = None
+_threads_configured = False
+
+
+def configure_threads():
+    """
+    按 INFERENCE_THREADS / INFERENCE_INTEROP_THREADS 设置 PyTorch 线程数（算子间线程数 0 为 PyTorch 默认）
+
+    算子间线程数只能在第一次并行计算之前设置，应在加载模型之前调用；重复调用不再生效。
+    """
+    global _threads_configured
+
+    if _threads_configured:
+        return
+    _threads_configured = True
+
+    if INFERENCE_THREADS > 0:
+        torch.set_num_threads(INFERENCE_THREADS)
+    if INFERENCE_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(INFERENCE_INTEROP_THREADS)
+        except RuntimeError as e:
+            print(f"[Executor] ⚠ Could not set inter-op threads: {e}")
+
+    print(f"[Executor] torch threads: intra-op {torch.get_num_threads()}, "
+          f"inter-op {torch.get_num_interop_threads()}, inference workers {INFERENCE_WORKERS}")
+
+
+def _init_worker():
+    # 每个工作线程显式设置一次，不依赖线程创建时继承的 OpenMP 设置
+    if INFERENCE_THREADS > 0:
+        torch.set_num_threads(INFERENCE_THREADS)
+
+
+def get_inference_executor():
+    """获取全局推理线程池"""
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, INFERENCE_WORKERS),
+            thread_name_prefix="inference",
+            initializer=_init_worker
+        )
+
+    return _executor
+
+
+async def run_inference(fn, *args, **kwargs):
+    """在推理线程池中执行 fn(*args, **kwargs)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_inference_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_inference_executor():
+    """关闭推理线程池（等待进行中的任务完成）"""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
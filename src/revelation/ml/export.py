@@ -0,0 +1,207 @@
+"""
+模型导出与推理运行时模块
+
+将 EmbeddingModel 导出为冻结的 TorchScript 或 ONNX 图，加载时按 INFERENCE_RUNTIME 选择运行时。
+导出文件与模型文件放在同一目录（aethersight.ts / aethersight.onnx，非 512 分辨率带分辨率后缀），
+旁边的 .json 记录源模型校验和与输入分辨率，不一致时重新导出。
+"""
+
+import os
+import json
+import time
+import importlib.util
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from .gallery import sized_path
+
+INFERENCE_RUNTIME = os.getenv('INFERENCE_RUNTIME', 'eager').lower()
+
+RUNTIMES = ("eager", "torchscript", "onnx")
+
+# ONNX 导出、onnx 运行时和 int8 量化需要的可选依赖（pyproject.toml 中的 onnx extra）
+ONNX_MODULES = ("onnx", "onnxruntime")
+ONNX_INSTALL_HINT = "Install the onnx extra: poetry install --extras onnx (or pip install onnx onnxruntime)"
+
+_EXTENSIONS = {
+    "torchscript": ".ts",
+    "onnx": ".onnx",
+}
+
+
+def missing_onnx_modules():
+    """onnx extra 中未安装的模块"""
+    return [name for name in ONNX_MODULES if importlib.util.find_spec(name) is None]
+
+
+def export_path(model_path, runtime, size=512):
+    """导出文件路径（same padding 按分辨率固化，每个分辨率单独导出）"""
+    return sized_path(os.path.splitext(model_path)[0] + _EXTENSIONS[runtime], size)
+
+
+def read_export_meta(path):
+    """读取导出文件的元信息，导出文件或元信息不存在时返回 None"""
+    meta_path = f"{path}.json"
+    if not os.path.exists(path) or not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@torch.no_grad()
+def export_model(model, runtime, path, meta, size=512):
+    """
+    导出模型（先写临时文件再替换）
+
+    Args:
+        model: eager 模式的 EmbeddingModel
+        runtime: 'torchscript' 或 'onnx'
+        path: 输出路径
+        meta: 写入 .json 的元信息（模型校验和、分辨率等）
+        size: 输入边长，TF 风格的 same padding 按该分辨率固化到图中
+    """
+    model.eval()
+    device = next(model.parameters()).device
+    example = torch.randn(2, 3, size, size, device=device)
+
+    tmp_path = f"{path}.tmp"
+    if runtime == "torchscript":
+        traced = torch.jit.trace(model, example)
+        torch.jit.freeze(traced).save(tmp_path)
+    elif runtime == "onnx":
+        try:
+            import onnx  # noqa: F401  torch.onnx.export 需要
+        except ImportError:
+            raise ImportError(f"onnx not installed. {ONNX_INSTALL_HINT}")
+        torch.onnx.export(
+            model,
+            (example,),
+            tmp_path,
+            input_names=["input"],
+            output_names=["embedding"],
+            dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}},
+            opset_version=17,
+            dynamo=False
+        )
+    else:
+        raise ValueError(f"Unknown runtime for export: {runtime}. Use 'torchscript' or 'onnx'.")
+    os.replace(tmp_path, path)
+
+    with open(f"{path}.json", "w", encoding="utf-8") as f:
+        json.dump(dict(meta, runtime=runtime, size=size), f)
+
+
+class OnnxEmbeddingModel:
+    """
+    onnxruntime 推理会话的包装
+
+    接口与 EmbeddingModel 一致：输入 [B, C, H, W] tensor，输出 [B, D] tensor（CPU）。
+    """
+
+    def __init__(self, path, num_threads=0):
+        """
+        Args:
+            path: .onnx 文件路径
+            num_threads: 算子内线程数，0 为 onnxruntime 默认
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError(f"onnxruntime not installed. {ONNX_INSTALL_HINT}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def eval(self):
+        return self
+
+    def __call__(self, x):
+        inputs = np.ascontiguousarray(x.detach().cpu().float().numpy())
+        return torch.from_numpy(self.session.run(None, {self.input_name: inputs})[0])
+
+
+def ensure_export(runtime, model_path, model_hash, load_eager, size=512):
+    """
+    导出文件不存在或与当前模型文件/分辨率不一致时从 eager 模型导出
+
+    Args:
+        runtime: 'torchscript' 或 'onnx'
+        model_path: 模型文件路径
+        model_hash: 模型文件校验和
+        load_eager: 返回 eager 模型的函数，仅在需要导出时调用
+        size: 输入边长
+
+    Returns:
+        导出文件路径
+    """
+    path = export_path(model_path, runtime, size)
+    meta = {"model_hash": model_hash, "torch": torch.__version__}
+
+    if read_export_meta(path) != dict(meta, runtime=runtime, size=size):
+        print(f"[Export] {path} is missing or stale, exporting {runtime} model...")
+        export_model(load_eager(), runtime, path, meta, size=size)
+        print(f"[Export] ✓ Exported {runtime} model to {path}")
+
+    return path
+
+
+def load_runtime(runtime, model_path, model_hash, device, load_eager, size=512, num_threads=0):
+    """
+    加载导出的模型，必要时先导出（见 ensure_export）
+
+    Args:
+        runtime: 'torchscript' 或 'onnx'
+        model_path: 模型文件路径
+        model_hash: 模型文件校验和
+        device: 设备（onnx 只支持 CPU）
+        load_eager: 返回 eager 模型的函数，仅在需要导出时调用
+        size: 输入边长
+        num_threads: onnxruntime 算子内线程数，0 为默认
+
+    Returns:
+        可调用的模型
+    """
+    path = ensure_export(runtime, model_path, model_hash, load_eager, size=size)
+
+    if runtime == "torchscript":
+        model = torch.jit.load(path, map_location=device)
+        model.eval()
+        # 设备相关的图优化（conv-bn 融合、MKLDNN 布局等）的结果无法序列化，加载后再做
+        return torch.jit.optimize_for_inference(model)
+
+    return OnnxEmbeddingModel(path, num_threads=num_threads)
+
+
+@torch.no_grad()
+def compare_embeddings(reference, candidate, inputs):
+    """
+    比较两个模型的嵌入
+
+    Returns:
+        max_abs_diff: 嵌入逐元素最大绝对误差
+        min_cosine: 同一输入两个嵌入的最小余弦相似度
+    """
+    expected = F.normalize(reference(inputs).float().cpu(), dim=1)
+    actual = F.normalize(candidate(inputs).float().cpu(), dim=1)
+    max_abs_diff = (expected - actual).abs().max().item()
+    min_cosine = F.cosine_similarity(expected, actual, dim=1).min().item()
+    return max_abs_diff, min_cosine
+
+
+@torch.no_grad()
+def measure_latency(model, inputs, repeat=10, warmup=2):
+    """单个批次前向的平均耗时（毫秒）"""
+    for _ in range(warmup):
+        model(inputs)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        model(inputs)
+    return (time.perf_counter() - start) / repeat * 1000.0
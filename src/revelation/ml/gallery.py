@@ -3,49 +3,49 @@ Gallery 构建模块
 """
 
 import os
+import time
 import torch
 import torch.nn.functional as F
 from torch.utils.data import DataLoader
 from torch.amp import autocast
 
 from .dataset import GalleryDataset
+from .preprocess import normalize_batch
 
 
-@torch.no_grad()
-def build_gallery(
-    model,
-    gallery_root,
-    transform,
-    device,
-    batch_size=128,
-    cache_path=None,
-    num_workers=8
-):
+def save_gallery_cache(data, cache_path):
+    """原子地写入gallery缓存（先写临时文件再替换）"""
+    tmp_path = f"{cache_path}.tmp"
+    torch.save(data, tmp_path)
+    os.replace(tmp_path, cache_path)
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# 默认输入分辨率，该分辨率下的文件沿用不带分辨率后缀的文件名
+DEFAULT_SIZE = 512
+
+
+def sized_path(path, size):
     """
-    构建gallery embeddings
-    
-    Args:
-        model: 嵌入模型
-        gallery_root: gallery图片根目录
-        transform: 图像变换
-        device: 设备
-        batch_size: 批次大小
-        cache_path: 缓存路径
-        num_workers: DataLoader工作进程数
-    
-    Returns:
-        gallery_embs: gallery嵌入向量
-        gallery_labels: gallery标签列表
+    按输入分辨率区分的文件路径
+
+    例如 aethersight_gallery.pth 在 384 下为 aethersight_gallery.384.pth，512 下不变。
     """
-    if cache_path and os.path.exists(cache_path):
-        print(f"[Gallery] Loading cache from {cache_path}")
-        data = torch.load(cache_path, map_location="cpu")
-        return data["embs"], data["labels"]
+    if size == DEFAULT_SIZE:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.{size}{ext}"
 
-    model.eval()
 
-    image_paths = []
-    image_labels = []
+def scan_gallery(gallery_root):
+    """
+    扫描gallery目录（每个子目录为一个label）
+
+    Returns:
+        [(相对路径, label, 文件大小, 修改时间ns), ...]
+    """
+    entries = []
 
     class_names = sorted(
         d.name for d in os.scandir(gallery_root) if d.is_dir()
@@ -53,58 +53,263 @@ def build_gallery(
 
     for cls in class_names:
         cls_dir = os.path.join(gallery_root, cls)
-        for name in os.listdir(cls_dir):
-            if name.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
-                image_paths.append(os.path.join(cls_dir, name))
-                image_labels.append(cls)
+        for entry in os.scandir(cls_dir):
+            if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                stat = entry.stat()
+                entries.append((f"{cls}/{entry.name}", cls, stat.st_size, stat.st_mtime_ns))
+
+    return entries
 
-    print(f"[Gallery] Total images: {len(image_paths)}")
 
-    if len(image_paths) == 0:
-        return None, None
+def create_ingest_loader(image_paths, labels, size=512, batch_size=128, num_workers=8,
+                         prefetch_factor=2, pin_memory=False):
+    """
+    创建gallery图片读取管线
+
+    每个worker解码并缩放为 uint8，最多预取 prefetch_factor 个批次，避免解码远快于前向时占满内存。
 
+    Returns:
+        产出 ([B, 3, size, size] uint8, labels) 的 DataLoader
+    """
     dataset = GalleryDataset(
         image_paths=image_paths,
-        labels=image_labels,
-        transform=transform
+        labels=labels,
+        size=size
     )
 
-    loader = DataLoader(
+    return DataLoader(
         dataset,
         batch_size=batch_size,
         shuffle=False,
         num_workers=num_workers,
-        pin_memory=True,
-        persistent_workers=(num_workers > 0)
+        pin_memory=pin_memory,
+        prefetch_factor=prefetch_factor if num_workers > 0 else None
     )
 
-    gallery_embs_list = []
-    gallery_labels_out = []
 
-    for imgs, labels in loader:
-        imgs = imgs.to(device, non_blocking=True)
+@torch.no_grad()
+def embed_images(model, image_paths, labels, transform, device, batch_size=128, num_workers=8):
+    """
+    计算一组图片的归一化嵌入
+
+    Args:
+        transform: 推理变换（使用其 size 作为输入分辨率）
+
+    Returns:
+        [N, D] float32 CPU 张量
+    """
+    model.eval()
+
+    # 端到端耗时（读取、解码、缩放和前向），包括读取管线的启动
+    wall_start = time.perf_counter()
+    loader = create_ingest_loader(
+        image_paths,
+        labels,
+        size=getattr(transform, "size", 512),
+        batch_size=batch_size,
+        num_workers=num_workers,
+        pin_memory=(device.type == "cuda")
+    )
+
+    embs_list = []
+    ingest_time = 0.0
+    forward_time = 0.0
+
+    # 使用autocast加速（支持CUDA和MPS）
+    use_autocast = device.type in ("cuda", "mps")
+
+    batches = iter(loader)
+    while True:
+        # 等待读取管线的时间：前向期间worker已经预取好时接近 0
+        start = time.perf_counter()
+        batch = next(batches, None)
+        ingest_time += time.perf_counter() - start
+        if batch is None:
+            break
+
+        start = time.perf_counter()
+        imgs = normalize_batch(batch[0], device)
 
-        # 使用autocast加速（支持CUDA和MPS）
-        use_autocast = device.type in ("cuda", "mps")
         with autocast(device_type=device.type, enabled=use_autocast):
             emb = model(imgs)
 
-        emb = F.normalize(emb, dim=1)
+        emb = F.normalize(emb.float(), dim=1)
 
-        gallery_embs_list.append(emb.cpu())
-        gallery_labels_out.extend(labels)
+        embs_list.append(emb.cpu())
+        forward_time += time.perf_counter() - start
+
+    wall_time = time.perf_counter() - wall_start
+    count = len(image_paths)
+    print(
+        f"[Gallery] Embedded {count} images in {wall_time:.1f}s "
+        f"({count / max(wall_time, 1e-9):.1f} images/sec end to end, decode + resize + embed); "
+        f"forward only {forward_time:.1f}s ({count / max(forward_time, 1e-9):.1f} images/sec), "
+        f"waited {ingest_time:.1f}s on ingest"
+    )
 
-    gallery_embs = torch.cat(gallery_embs_list, dim=0)
+    return torch.cat(embs_list, dim=0)
+
+
+def update_gallery(
+    model,
+    gallery_root,
+    transform,
+    device,
+    cache_path=None,
+    model_hash=None,
+    batch_size=128,
+    num_workers=8,
+    incremental=True
+):
+    """
+    增量构建gallery embeddings
+
+    以 (相对路径, 文件大小, 修改时间, 模型校验和, 输入分辨率) 为键复用已有缓存中的嵌入，
+    只计算新增或修改过的图片，已删除的图片从结果中移除，最后原子地重写缓存。
+    缓存中记录构建时的输入分辨率（size）。
+
+    Args:
+        model: 嵌入模型
+        gallery_root: gallery图片根目录
+        transform: 图像变换（使用其 size 作为输入分辨率）
+        device: 设备
+        cache_path: 缓存路径（读取旧嵌入并写回）
+        model_hash: 模型文件校验和，与缓存中不一致时全部重新计算
+        batch_size: 批次大小
+        num_workers: DataLoader工作进程数
+        incremental: 为 False 时不复用缓存，全部重新计算
+
+    Returns:
+        gallery_embs: gallery嵌入向量
+        gallery_labels: gallery标签列表
+        stats: {"total", "reused", "recomputed", "removed"}
+    """
+    image_size = getattr(transform, "size", DEFAULT_SIZE)
+
+    entries = scan_gallery(gallery_root)
+    print(f"[Gallery] Total images: {len(entries)} (input size {image_size})")
+
+    previous = {}
+    if incremental and cache_path and os.path.exists(cache_path):
+        data = torch.load(cache_path, map_location="cpu")
+        files = data.get("files")
+        if files and data.get("model_hash") == model_hash and data.get("size", DEFAULT_SIZE) == image_size:
+            for i, key in enumerate(zip(files["paths"], files["sizes"], files["mtimes"])):
+                previous[key] = i
+            previous_embs = data["embs"]
+        elif files:
+            print("[Gallery] Model or input size changed since the cache was built, recomputing all images")
+        del data
+
+    reuse_rows = []
+    reuse_from = []
+    compute_rows = []
+    for row, (rel_path, _, size, mtime) in enumerate(entries):
+        src = previous.pop((rel_path, size, mtime), None)
+        if src is None:
+            compute_rows.append(row)
+        else:
+            reuse_rows.append(row)
+            reuse_from.append(src)
+
+    stats = {
+        "total": len(entries),
+        "reused": len(reuse_rows),
+        "recomputed": len(compute_rows),
+        # 剩下的条目中也有修改过的文件（路径仍在，大小或修改时间变了），只统计路径已不存在的
+        "removed": len({key[0] for key in previous} - {entry[0] for entry in entries}),
+    }
+    print(
+        f"[Gallery] Reused {stats['reused']}, recomputing {stats['recomputed']}, "
+        f"removed {stats['removed']}"
+    )
+
+    if len(entries) == 0:
+        return None, None, stats
+
+    computed = None
+    if compute_rows:
+        computed = embed_images(
+            model,
+            [os.path.join(gallery_root, entries[i][0]) for i in compute_rows],
+            [entries[i][1] for i in compute_rows],
+            transform,
+            device,
+            batch_size=batch_size,
+            num_workers=num_workers
+        )
+
+    dim = computed.shape[1] if computed is not None else previous_embs.shape[1]
+    gallery_embs = torch.empty((len(entries), dim), dtype=torch.float32)
+    if reuse_rows:
+        gallery_embs[torch.tensor(reuse_rows)] = previous_embs[torch.tensor(reuse_from)].float()
+    if computed is not None:
+        gallery_embs[torch.tensor(compute_rows)] = computed
+
+    gallery_labels = [label for _, label, _, _ in entries]
 
     if cache_path:
-        torch.save(
+        save_gallery_cache(
             {
                 "embs": gallery_embs,
-                "labels": gallery_labels_out,
+                "labels": gallery_labels,
+                "model_hash": model_hash,
+                "size": image_size,
+                "files": {
+                    "paths": [rel_path for rel_path, _, _, _ in entries],
+                    "sizes": [size for _, _, size, _ in entries],
+                    "mtimes": [mtime for _, _, _, mtime in entries],
+                },
             },
             cache_path
         )
         print(f"[Gallery] Cache saved to {cache_path}")
 
-    return gallery_embs, gallery_labels_out
+    return gallery_embs, gallery_labels, stats
 
+
+def build_gallery(
+    model,
+    gallery_root,
+    transform,
+    device,
+    batch_size=128,
+    cache_path=None,
+    num_workers=8,
+    incremental=False,
+    model_hash=None
+):
+    """
+    构建gallery embeddings
+    
+    Args:
+        model: 嵌入模型
+        gallery_root: gallery图片根目录
+        transform: 图像变换
+        device: 设备
+        batch_size: 批次大小
+        cache_path: 缓存路径
+        num_workers: DataLoader工作进程数
+        incremental: 缓存存在时是否增量更新（否则直接加载缓存）
+        model_hash: 模型文件校验和，用于增量更新
+    
+    Returns:
+        gallery_embs: gallery嵌入向量
+        gallery_labels: gallery标签列表
+    """
+    if cache_path and os.path.exists(cache_path) and not incremental:
+        print(f"[Gallery] Loading cache from {cache_path}")
+        data = torch.load(cache_path, map_location="cpu")
+        return data["embs"], data["labels"]
+
+    gallery_embs, gallery_labels, _ = update_gallery(
+        model,
+        gallery_root,
+        transform,
+        device,
+        cache_path=cache_path,
+        model_hash=model_hash,
+        batch_size=batch_size,
+        num_workers=num_workers
+    )
+    return gallery_embs, gallery_labels
@@ -0,0 +1,215 @@
+"""
+可内存映射的 gallery 缓存格式
+
+文件布局:
+    MAGIC (8 bytes) | 头部长度 (uint64, little-endian) | JSON 头部 | 按 64 字节对齐的数据段
+
+JSON 头部记录 dim/count/模型校验和/构建参数，以及每个数据段的偏移、dtype 和形状。
+数据段通过 mmap 直接映射为 tensor，多个 worker 进程共享同一份物理内存页。
+"""
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+from collections.abc import Sequence
+
+import torch
+
+MAGIC = b"RVGAL\x00\x01\x00"
+VERSION = 1
+_ALIGN = 64
+
+_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "int8": torch.int8,
+    "int64": torch.int64,
+}
+
+
+# 绝对路径 -> ([大小, 修改时间ns], sha256)
+_checksums = {}
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """
+    计算文件的 sha256
+
+    结果按文件的 (大小, 修改时间ns) 缓存在进程内和旁路文件 <path>.sha256 中，
+    文件未变化时直接返回缓存值，重启、重新加载和各推理进程都不再重新读取整个文件。
+    旁路文件无法写入（如只读挂载）时只使用进程内缓存。
+    """
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    key = os.path.abspath(path)
+
+    cached = _checksums.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    sidecar = f"{path}.sha256"
+    try:
+        with open(sidecar, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("signature") == signature:
+            _checksums[key] = (signature, data["sha256"])
+            return data["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    checksum = digest.hexdigest()
+    _checksums[key] = (signature, checksum)
+
+    tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"signature": signature, "sha256": checksum}, f)
+        os.replace(tmp_path, sidecar)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return checksum
+
+
+class LabelView(Sequence):
+    """按下标从label表中取label的只读序列，不为每个gallery条目创建字符串列表"""
+
+    def __init__(self, label_names, label_ids):
+        self.label_names = label_names
+        self.label_ids = label_ids
+
+    def __len__(self):
+        return len(self.label_ids)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.label_names[i] for i in self.label_ids[idx].tolist()]
+        return self.label_names[int(self.label_ids[idx])]
+
+
+def _dtype_name(dtype):
+    for name, value in _DTYPES.items():
+        if value == dtype:
+            return name
+    raise ValueError(f"Unsupported dtype for gallery store: {dtype}")
+
+
+def write_gallery_store(path, sections, label_names, meta):
+    """
+    原子地写入 gallery 缓存
+
+    Args:
+        path: 输出路径
+        sections: {名称: tensor}，如 embs / label_ids / coarse_values 等
+        label_names: 去重后的label列表
+        meta: 写入头部的附加信息（dim/count/model_hash/precision 等）
+    """
+    names_blob = b"".join(name.encode("utf-8") + b"\x00" for name in label_names)
+
+    payloads = []
+    entries = {}
+    offset = 0
+    for name, tensor in sections.items():
+        tensor = tensor.contiguous()
+        data = tensor.numpy().tobytes()
+        entries[name] = {
+            "offset": offset,
+            "dtype": _dtype_name(tensor.dtype),
+            "shape": list(tensor.shape),
+        }
+        payloads.append((offset, data))
+        offset += (len(data) + _ALIGN - 1) // _ALIGN * _ALIGN
+    entries["label_names"] = {"offset": offset, "size": len(names_blob), "count": len(label_names)}
+    payloads.append((offset, names_blob))
+
+    header = dict(meta, version=VERSION, sections=entries)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = (len(MAGIC) + 8 + len(header_bytes) + _ALIGN - 1) // _ALIGN * _ALIGN
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for section_offset, data in payloads:
+            f.seek(data_start + section_offset)
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_gallery_header(path):
+    """只读取头部，文件不是 gallery 缓存格式时返回 None"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length).decode("utf-8"))
+    header["data_start"] = (len(MAGIC) + 8 + length + _ALIGN - 1) // _ALIGN * _ALIGN
+    return header
+
+
+class GalleryStore:
+    """
+    内存映射的 gallery 缓存
+
+    Attributes:
+        header: JSON 头部
+        sections: {名称: tensor}，均为 mmap 上的零拷贝视图
+        label_names: 去重后的label列表
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_gallery_header(path)
+        if self.header is None:
+            raise ValueError(f"Not a gallery store file: {path}")
+        if self.header.get("version") != VERSION:
+            raise ValueError(f"Unsupported gallery store version: {self.header.get('version')}")
+
+        with open(path, "rb") as f:
+            # MAP_PRIVATE: 只读访问时各进程共享页缓存，tensor 仍然可写（写时复制）
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        base = self.header["data_start"]
+        self.sections = {}
+        for name, entry in self.header["sections"].items():
+            if name == "label_names":
+                continue
+            shape = entry["shape"]
+            numel = 1
+            for size in shape:
+                numel *= size
+            if numel == 0:
+                self.sections[name] = torch.empty(shape, dtype=_DTYPES[entry["dtype"]])
+                continue
+            self.sections[name] = torch.frombuffer(
+                self._mmap,
+                dtype=_DTYPES[entry["dtype"]],
+                count=numel,
+                offset=base + entry["offset"]
+            ).view(shape)
+
+        names = self.header["sections"]["label_names"]
+        start = base + names["offset"]
+        blob = self._mmap[start:start + names["size"]]
+        self.label_names = [name.decode("utf-8") for name in blob.split(b"\x00")[:names["count"]]]
+
+    def get(self, name):
+        """获取数据段，不存在时返回 None"""
+        return self.sections.get(name)
+
+    @property
+    def labels(self):
+        """每个gallery条目的label（延迟解码的序列）"""
+        return LabelView(self.label_names, self.sections["label_ids"])
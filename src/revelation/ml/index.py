@@ -0,0 +1,328 @@
+"""
+Gallery 检索索引模块 - 支持精确检索（矩阵乘）和IVF近似检索
+"""
+
+import os
+import math
+from abc import ABC, abstractmethod
+
+import torch
+import torch.nn.functional as F
+
+from .search import topk_per_label, fingerprint
+from .quantize import quantized_scores, dequantize_embeddings
+
+SEARCH_INDEX = os.getenv('SEARCH_INDEX', 'exact').lower()
+IVF_NLIST = int(os.getenv('IVF_NLIST', 0))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', 16))
+
+_CHUNK_SIZE = 65536
+
+
+class SearchIndex(ABC):
+    """检索索引抽象基类"""
+
+    name = None
+
+    def __init__(self, embs, label_ids, num_labels, scales=None):
+        """
+        Args:
+            embs: 归一化的gallery嵌入 [G, D]（float32 / fp16 / int8）
+            label_ids: 每个gallery条目的label下标 [G]
+            num_labels: label总数
+            scales: int8 嵌入的逐向量缩放系数 [G]
+        """
+        self.embs = embs
+        self.label_ids = label_ids
+        self.num_labels = num_labels
+        self.scales = scales
+
+    def scores(self, query_embs, rows=None):
+        """
+        计算查询与gallery（或其中部分条目）的相似度
+
+        Args:
+            query_embs: [B, D]
+            rows: gallery条目下标，为 None 时计算全部
+
+        Returns:
+            [B, G] 或 [B, len(rows)]
+        """
+        if rows is None:
+            return quantized_scores(query_embs, self.embs, self.scales)
+        scales = self.scales[rows] if self.scales is not None else None
+        return quantized_scores(query_embs, self.embs[rows], scales)
+
+    @abstractmethod
+    def search(self, query_embs, top_k):
+        """
+        按label检索Top-K
+
+        Args:
+            query_embs: 归一化的查询嵌入 [B, D]
+            top_k: 返回的label数量
+
+        Returns:
+            scores: [B, k] 降序相似度
+            idxs: [B, k] label下标
+        """
+        pass
+
+    def save(self, path):
+        """持久化索引结构（精确检索无需持久化）"""
+        pass
+
+
+class ExactIndex(SearchIndex):
+    """精确检索：与全部gallery做矩阵乘"""
+
+    name = "exact"
+
+    def search(self, query_embs, top_k):
+        sims = self.scores(query_embs)
+        return topk_per_label(sims, self.label_ids, self.num_labels, top_k)
+
+
+def spherical_kmeans(embs, k, iters=20, seed=0):
+    """球面k-means，返回归一化的聚类中心 [k, D]"""
+    generator = torch.Generator().manual_seed(seed)
+    centroids = embs[torch.randperm(embs.shape[0], generator=generator)[:k]].clone()
+
+    for _ in range(iters):
+        assign = torch.matmul(embs, centroids.T).argmax(dim=1)
+
+        sums = torch.zeros_like(centroids).index_add_(0, assign, embs)
+        counts = torch.bincount(assign, minlength=k)
+
+        # 空簇重新随机选点
+        empty = (counts == 0).nonzero(as_tuple=True)[0]
+        if len(empty) > 0:
+            picks = torch.randint(0, embs.shape[0], (len(empty),), generator=generator)
+            sums[empty] = embs[picks]
+
+        centroids = F.normalize(sums, dim=1)
+
+    return centroids
+
+
+def group_by(ids, n):
+    """
+    按下标分组
+
+    Args:
+        ids: 每个条目所属组的下标 [N]
+        n: 组数量
+
+    Returns:
+        order: 按组排序后的条目下标 [N]，第 g 组为 order[offsets[g]:offsets[g + 1]]
+        offsets: [n + 1]
+    """
+    order = torch.argsort(ids, stable=True)
+    offsets = torch.zeros(n + 1, dtype=torch.long)
+    offsets[1:] = torch.cumsum(torch.bincount(ids, minlength=n), dim=0)
+    return order, offsets
+
+
+def _search_groups(index, query_embs, groups, order, offsets, top_k):
+    """
+    只在指定分组的成员中检索，每个label取最高相似度后再取Top-K
+
+    扫描到的label不足 top_k 个的查询（例如 IVF 只探测到少数几个小簇）改为精确检索，
+    不返回未扫描到的label（相似度为 -inf）。
+
+    Args:
+        index: 提供 scores / label_ids / num_labels 的索引
+        query_embs: [B, D]
+        groups: 每个查询需要扫描的组下标 [B, n]
+        order/offsets: group_by 的结果
+        top_k: 返回的label数量
+    """
+    offsets = offsets.tolist()
+
+    per_label = query_embs.new_full((query_embs.shape[0], index.num_labels), float("-inf"))
+    for row, query in enumerate(query_embs):
+        members = torch.cat([order[offsets[g]:offsets[g + 1]] for g in groups[row].tolist()])
+        sims = index.scores(query.unsqueeze(0), members)[0]
+        per_label[row].scatter_reduce_(
+            0, index.label_ids[members], sims, reduce="amax", include_self=True
+        )
+
+    scores, idxs = per_label.topk(min(top_k, index.num_labels), dim=1)
+
+    short = (~torch.isfinite(scores)).any(dim=1).nonzero().flatten()
+    if short.numel():
+        exact_scores, exact_idxs = topk_per_label(
+            index.scores(query_embs[short]), index.label_ids, index.num_labels, top_k
+        )
+        scores[short] = exact_scores.to(scores.dtype)
+        idxs[short] = exact_idxs
+
+    return scores, idxs
+
+
+def _assign(embs, centroids):
+    """分块计算每个条目最近的聚类中心"""
+    return torch.cat([
+        torch.matmul(embs[i:i + _CHUNK_SIZE].float(), centroids.T).argmax(dim=1)
+        for i in range(0, embs.shape[0], _CHUNK_SIZE)
+    ])
+
+
+class IVFIndex(SearchIndex):
+    """
+    倒排文件（IVF）近似检索
+
+    用k-means将gallery划分为 nlist 个簇，查询时只扫描最近的 nprobe 个簇。
+    """
+
+    name = "ivf"
+
+    def __init__(self, embs, label_ids, num_labels, nlist=0, nprobe=16, scales=None,
+                 centroids=None, order=None, offsets=None):
+        """
+        Args:
+            nlist: 簇数量，0 表示按 4*sqrt(G) 自动选择
+            nprobe: 查询时扫描的簇数量
+            centroids/order/offsets: 已训练的索引结构（从缓存加载时传入）
+        """
+        super().__init__(embs, label_ids, num_labels, scales=scales)
+
+        if centroids is None:
+            count = embs.shape[0]
+            nlist = nlist or max(1, int(4 * math.sqrt(count)))
+            nlist = min(nlist, count)
+
+            train_size = min(count, nlist * 64)
+            sample = F.normalize(embs[torch.randperm(count)[:train_size]].float(), dim=1)
+            centroids = spherical_kmeans(sample, nlist)
+            order, offsets = group_by(_assign(embs, centroids), nlist)
+
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.nlist = centroids.shape[0]
+        self.nprobe = max(1, min(nprobe, self.nlist))
+
+    def search(self, query_embs, top_k):
+        probes = torch.matmul(query_embs, self.centroids.T).topk(self.nprobe, dim=1).indices
+        return _search_groups(self, query_embs, probes, self.order, self.offsets, top_k)
+
+    def save(self, path):
+        torch.save(
+            {
+                "fingerprint": fingerprint(self.embs),
+                "centroids": self.centroids,
+                "order": self.order,
+                "offsets": self.offsets,
+            },
+            path
+        )
+        print(f"[Index] IVF index saved to {path}")
+
+    @classmethod
+    def load(cls, path, embs, label_ids, num_labels, nprobe=16, scales=None):
+        """从缓存加载，与当前gallery不一致时返回 None"""
+        data = torch.load(path, map_location="cpu")
+        if tuple(data.get("fingerprint", ())) != fingerprint(embs):
+            return None
+        return cls(
+            embs, label_ids, num_labels, nprobe=nprobe, scales=scales,
+            centroids=data["centroids"], order=data["order"], offsets=data["offsets"]
+        )
+
+
+class RerankIndex(SearchIndex):
+    """
+    两阶段检索：粗检索 + 全精度重排
+
+    先用粗检索索引（原型、量化gallery或IVF）召回候选label，
+    再用这些候选label在完整 float32 gallery 中的全部成员重新打分。
+    """
+
+    def __init__(self, first_stage, embs, label_ids, num_labels, rerank=50):
+        """
+        Args:
+            first_stage: 粗检索索引
+            embs/label_ids: 完整 float32 gallery
+            rerank: 参与重排的候选label数量
+        """
+        super().__init__(embs, label_ids, num_labels)
+        self.first_stage = first_stage
+        self.rerank = rerank
+        self.name = f"{first_stage.name}+rerank"
+        self.order, self.offsets = group_by(label_ids, num_labels)
+
+    def search(self, query_embs, top_k):
+        _, candidates = self.first_stage.search(query_embs, max(top_k, self.rerank))
+        return _search_groups(self, query_embs, candidates, self.order, self.offsets, top_k)
+
+
+def evaluate_recall(index, reference, query_embs, k=10):
+    """
+    计算 recall@K：index 返回的Top-K label中有多少出现在精确检索的Top-K中
+
+    Args:
+        index: 待评估的索引
+        reference: 精确检索索引
+        query_embs: 查询嵌入 [B, D]
+        k: Top-K
+
+    Returns:
+        平均 recall@K
+    """
+    _, approx = index.search(query_embs, k)
+    _, exact = reference.search(query_embs, k)
+
+    hits = sum(
+        len(set(a) & set(e)) / len(e)
+        for a, e in zip(approx.tolist(), exact.tolist())
+    )
+    return hits / len(query_embs)
+
+
+def create_index(embs, label_ids, num_labels, kind=None, cache_path=None, scales=None):
+    """
+    根据配置创建检索索引
+
+    Args:
+        embs: 归一化的gallery嵌入 [G, D]（float32 / fp16 / int8）
+        label_ids: 每个gallery条目的label下标 [G]
+        num_labels: label总数
+        kind: 索引类型 'exact' 或 'ivf'，默认读取 SEARCH_INDEX 环境变量
+        cache_path: 索引缓存路径（仅近似索引使用）
+        scales: int8 嵌入的逐向量缩放系数 [G]
+
+    Returns:
+        SearchIndex 实例
+    """
+    kind = (kind or SEARCH_INDEX).lower()
+
+    if kind == "exact":
+        return ExactIndex(embs, label_ids, num_labels, scales=scales)
+
+    if kind == "ivf":
+        index = None
+        if cache_path and os.path.exists(cache_path):
+            print(f"[Index] Loading IVF index from {cache_path}...")
+            index = IVFIndex.load(
+                cache_path, embs, label_ids, num_labels, nprobe=IVF_NPROBE, scales=scales
+            )
+            if index is None:
+                print("[Index] IVF index is stale, rebuilding...")
+
+        if index is None:
+            print("[Index] Training IVF index...")
+            index = IVFIndex(
+                embs, label_ids, num_labels, nlist=IVF_NLIST, nprobe=IVF_NPROBE, scales=scales
+            )
+            if cache_path:
+                index.save(cache_path)
+
+        rows = torch.randperm(embs.shape[0])[:256]
+        sample = dequantize_embeddings(embs[rows], scales[rows] if scales is not None else None)
+        exact = ExactIndex(embs, label_ids, num_labels, scales=scales)
+        recall = evaluate_recall(index, exact, sample, k=10)
+        print(f"[Index] IVF nlist={index.nlist} nprobe={index.nprobe} recall@10={recall:.4f}")
+        return index
+
+    raise ValueError(f"Unknown SEARCH_INDEX: {kind}. Use 'exact' or 'ivf'.")
@@ -1,102 +1,623 @@
 """
 模型加载和管理模块
+
+模型和gallery作为一个整体快照（ModelSnapshot）加载，重新加载时在后台构建新快照后原子替换，
+正在进行的预测继续使用旧快照完成。
 """
 
 import os
+import threading
+import time
 import torch
 
 from .model import EmbeddingModel
-from .preprocess import InferenceTransform
-from .gallery import build_gallery
-
-model = None
-gallery_embs = None
-gallery_labels = None
-transform = None
-device = None
+from .preprocess import TensorInferenceTransform
+from .export import load_runtime, ensure_export, OnnxEmbeddingModel, INFERENCE_RUNTIME, RUNTIMES
+from .model_quant import ensure_quantized, MODEL_QUANTIZATION, QUANTIZATIONS
+from .gallery import build_gallery, sized_path, save_gallery_cache
+from .search import build_label_index
+from .index import create_index, evaluate_recall, ExactIndex, RerankIndex
+from .prototypes import load_or_build_prototypes, GALLERY_PROTOTYPES, PROTOTYPE_RERANK
+from .quantize import load_or_build_quantized, GALLERY_PRECISION, GALLERY_RERANK
+from .gallery_store import (
+    GalleryStore, LabelView, write_gallery_store, read_gallery_header, file_checksum
+)
+from .executor import INFERENCE_THREADS
+from .shard import (
+    ShardedIndex, parse_shard, select_shard, shard_path, create_sharded_index, GALLERY_SHARD, SHARD_BY
+)
+from ..startup import phase
 
 MODEL_DIR = os.getenv('MODEL_DIR', 'models')
 GALLERY_ROOT = os.getenv('GALLERY_ROOT', None)
+GALLERY_FORMAT = os.getenv('GALLERY_FORMAT', 'pth').lower()
+INFERENCE_SIZE = int(os.getenv('INFERENCE_SIZE', 512))
+FAST_PATH_SIZE = int(os.getenv('FAST_PATH_SIZE', 0))
+FAST_PATH_MARGIN = float(os.getenv('FAST_PATH_MARGIN', 0.05))
+
+
+class ModelSnapshot:
+    """
+    一次加载得到的模型、gallery和检索索引
+
+    快照创建后不再修改，重新加载时整体替换。
+    启用快速路径时 fast_path 为低分辨率的模型和gallery（同样是一个 ModelSnapshot）。
+    """
+
+    def __init__(self, version, model, transform, device, gallery_embs, gallery_labels,
+                 label_names, label_ids, search_index, fast_path=None):
+        self.version = version
+        self.loaded_at = time.time()
+        self.model = model
+        self.transform = transform
+        self.device = device
+        self.gallery_embs = gallery_embs
+        self.gallery_labels = gallery_labels
+        self.label_names = label_names
+        self.label_ids = label_ids
+        self.search_index = search_index
+        self.fast_path = fast_path
+
+
+_snapshot = None
+_version = 0
+_reload_lock = threading.Lock()
+
+
+def get_snapshot():
+    """获取当前生效的快照（未加载时为 None）"""
+    return _snapshot
 
 
 def get_model():
     """获取模型实例"""
-    return model
+    return _snapshot.model if _snapshot is not None else None
 
 
 def get_gallery():
     """获取gallery数据"""
-    return gallery_embs, gallery_labels
+    if _snapshot is None:
+        return None, None
+    return _snapshot.gallery_embs, _snapshot.gallery_labels
+
+
+def get_label_index():
+    """获取gallery的label索引（去重后的label列表和每个条目的label下标）"""
+    if _snapshot is None:
+        return None, None
+    return _snapshot.label_names, _snapshot.label_ids
+
+
+def get_search_index():
+    """获取gallery检索索引"""
+    return _snapshot.search_index if _snapshot is not None else None
 
 
 def get_transform():
     """获取transform"""
-    return transform
+    return _snapshot.transform if _snapshot is not None else None
 
 
 def get_device():
     """获取设备"""
-    return device
+    return _snapshot.device if _snapshot is not None else None
+
+
+def get_version():
+    """获取当前快照版本号（未加载时为 None）"""
+    return _snapshot.version if _snapshot is not None else None
+
+
+def is_reloading():
+    """是否正在重新加载"""
+    return _reload_lock.locked()
+
+
+def get_model_path():
+    """模型文件路径"""
+    return os.path.join(MODEL_DIR, "aethersight.pth")
+
+
+def get_gallery_cache_path(size=None):
+    """gallery缓存路径（每个输入分辨率一份，默认为 INFERENCE_SIZE）"""
+    return sized_path(os.path.join(MODEL_DIR, "aethersight_gallery.pth"), size or INFERENCE_SIZE)
+
+
+def get_gallery_store_path(size=None):
+    """mmap gallery缓存路径（配置 GALLERY_SHARD 时每个分片一份）"""
+    path = sized_path(os.path.join(MODEL_DIR, "aethersight_gallery.bin"), size or INFERENCE_SIZE)
+    return shard_path(path, get_shard())
+
+
+def get_coarse_cache_path(size=None):
+    """只包含粗检索gallery的缓存路径（不重排时使用，配置 GALLERY_SHARD 时每个分片一份）"""
+    path = sized_path(os.path.join(MODEL_DIR, "aethersight_gallery.coarse.pth"), size or INFERENCE_SIZE)
+    return shard_path(path, get_shard())
+
+
+def get_shard():
+    """本实例负责的gallery分片 (i, n)，未分片时为 None"""
+    return parse_shard(GALLERY_SHARD)
+
+
+def get_inference_sizes():
+    """需要加载的输入分辨率（主分辨率，以及启用快速路径时的低分辨率）"""
+    if FAST_PATH_SIZE > 0:
+        return [INFERENCE_SIZE, FAST_PATH_SIZE]
+    return [INFERENCE_SIZE]
+
 
+def get_watched_paths():
+    """变化后需要重新加载的文件"""
+    paths = [get_model_path()]
+    for size in get_inference_sizes():
+        paths.append(get_gallery_cache_path(size))
+        paths.append(get_gallery_store_path(size))
+        paths.append(get_coarse_cache_path(size))
+    return paths
 
-def load_model():
-    """加载模型和gallery"""
-    global model, transform, device, gallery_embs, gallery_labels
+
+def select_device(runtime=INFERENCE_RUNTIME):
+    """选择推理设备"""
+    # onnxruntime 只使用 CPU
+    if runtime == "onnx":
+        return torch.device("cpu")
 
     # 设备选择优先级: CUDA > MPS > CPU
     if torch.cuda.is_available():
-        device = torch.device("cuda")
-    elif torch.backends.mps.is_available():
-        device = torch.device("mps")
-    else:
-        device = torch.device("cpu")
+        return torch.device("cuda")
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
+
+
+def load_eager_model(device):
+    """从 aethersight.pth 加载 eager 模式的 EmbeddingModel"""
+    model_path = get_model_path()
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+
+    # 权重随后从 checkpoint 覆盖，不下载/加载 ImageNet 预训练权重
+    with phase("model build"):
+        model = EmbeddingModel(pretrained=False)
+
+    with phase("weight load"):
+        checkpoint = torch.load(model_path, map_location="cpu")
+        model.load_state_dict(checkpoint["model"])
+        del checkpoint
+        model.to(device)
+        model.eval()
+
+    return model
+
+
+def load_network(size=None):
+    """
+    只加载模型（不加载gallery），按 INFERENCE_RUNTIME 选择 eager / TorchScript / ONNX 运行时
+
+    Args:
+        size: 输入分辨率，默认为 INFERENCE_SIZE（导出的运行时每个分辨率单独导出）
+
+    Returns:
+        model, transform, device
+    """
+    if INFERENCE_RUNTIME not in RUNTIMES:
+        raise ValueError(f"Unknown INFERENCE_RUNTIME: {INFERENCE_RUNTIME}. Use one of {RUNTIMES}.")
+    if MODEL_QUANTIZATION not in QUANTIZATIONS:
+        raise ValueError(f"Unknown MODEL_QUANTIZATION: {MODEL_QUANTIZATION}. Use one of {QUANTIZATIONS}.")
+    if MODEL_QUANTIZATION != "none" and INFERENCE_RUNTIME != "onnx":
+        raise ValueError("MODEL_QUANTIZATION requires INFERENCE_RUNTIME=onnx")
+
+    device = select_device()
     print(f"Using device: {device}")
 
-    model_path = os.path.join(MODEL_DIR, "aethersight.pth")
+    transform = TensorInferenceTransform(size or INFERENCE_SIZE)
+
+    if INFERENCE_RUNTIME == "eager":
+        return load_eager_model(device), transform, device
+
+    model_path = get_model_path()
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model file not found: {model_path}")
 
-    checkpoint = torch.load(model_path, map_location="cpu")
-    model = EmbeddingModel().to(device)
-    model.load_state_dict(checkpoint["model"])
-    model.eval()
+    with phase("weight load"):
+        return _load_exported(model_path, device, transform), transform, device
 
-    transform = InferenceTransform()
 
-    gallery_cache_path = os.path.join(MODEL_DIR, "aethersight_gallery.pth")
-    
-    if os.path.exists(gallery_cache_path):
-        print(f"[Gallery] Loading cache from {gallery_cache_path}...")
-        data = torch.load(gallery_cache_path, map_location="cpu")
-        gallery_embs = data["embs"]
-        gallery_labels = data["labels"]
-        print(f"[Gallery] Loaded {len(gallery_labels)} gallery items from cache")
+def _load_exported(model_path, device, transform):
+    """加载导出/量化的模型，不存在或过期时先从 eager 模型导出"""
+    model_hash = file_checksum(model_path)
+
+    if MODEL_QUANTIZATION != "none":
+        onnx_path = ensure_export(
+            "onnx",
+            model_path,
+            model_hash,
+            lambda: load_eager_model(device),
+            size=transform.size
+        )
+        quantized = ensure_quantized(onnx_path, MODEL_QUANTIZATION, model_hash, GALLERY_ROOT, size=transform.size)
+        model = OnnxEmbeddingModel(quantized, num_threads=INFERENCE_THREADS)
+        print(f"[Loader] Serving with onnx runtime (int8 {MODEL_QUANTIZATION})")
+    else:
+        model = load_runtime(
+            INFERENCE_RUNTIME,
+            model_path,
+            model_hash,
+            device,
+            lambda: load_eager_model(device),
+            size=transform.size,
+            num_threads=INFERENCE_THREADS
+        )
+        print(f"[Loader] Serving with {INFERENCE_RUNTIME} runtime")
+
+    return model
+
+
+def load_model(blocking=True, prepare=None):
+    """
+    加载模型和gallery，并替换当前快照
+
+    Args:
+        blocking: 已有加载在进行中时是否等待；为 False 时直接返回 None
+        prepare: 替换前对新快照调用的函数（如预热），新快照生效前即完成
+
+    Returns:
+        新快照的版本号
+    """
+    global _snapshot, _version
+
+    if not _reload_lock.acquire(blocking=blocking):
+        return None
+
+    try:
+        model, transform, device = load_network()
+        with phase("gallery load"):
+            gallery = _load_gallery(model, transform, device)
+
+        fast_path = None
+        if FAST_PATH_SIZE > 0:
+            fast_path = _load_fast_path(_version + 1, model, device)
+
+        snapshot = ModelSnapshot(_version + 1, model, transform, device, *gallery, fast_path=fast_path)
+        if prepare is not None:
+            prepare(snapshot)
+
+        _version += 1
+        _snapshot = snapshot
+        print(f"[Loader] Snapshot version {_version} is active")
+        return _version
+    finally:
+        _reload_lock.release()
+
+
+def _load_fast_path(version, model, device):
+    """
+    加载快速路径：低分辨率的模型和gallery
+
+    eager 模型与分辨率无关，直接复用；导出的运行时按低分辨率单独加载。
+    """
+    print(f"[Loader] Loading {FAST_PATH_SIZE}px fast path (re-embed at {INFERENCE_SIZE}px "
+          f"when top-1/top-2 margin < {FAST_PATH_MARGIN})...")
+
+    if INFERENCE_RUNTIME == "eager":
+        fast_model, fast_transform = model, TensorInferenceTransform(FAST_PATH_SIZE)
     else:
-        if not GALLERY_ROOT:
-            raise ValueError(
-                f"Gallery cache not found at {gallery_cache_path} and "
-                "GALLERY_ROOT environment variable is not set. "
-                "Either provide the cache file or set GALLERY_ROOT to build it."
+        fast_model, fast_transform, _ = load_network(FAST_PATH_SIZE)
+
+    with phase("gallery load"):
+        gallery = _load_gallery(fast_model, fast_transform, device)
+    return ModelSnapshot(version, fast_model, fast_transform, device, *gallery)
+
+
+def _load_gallery(model, transform, device):
+    """
+    加载gallery并创建检索索引（使用 transform.size 分辨率的gallery缓存）
+
+    配置 GALLERY_SHARD 时只保留本分片的label；配置 SHARD_PROCESSES / SHARD_URLS 时
+    检索索引为分片检索协调器，label_names 为协调器的label表（包含远程分片返回的label）。
+
+    Returns:
+        gallery_embs, gallery_labels, label_names, label_ids, search_index
+    """
+    size = transform.size
+    model_path = get_model_path()
+    shard = get_shard()
+    gallery_cache_path = get_gallery_cache_path(size)
+    gallery_store_path = get_gallery_store_path(size)
+    # 原型、量化、IVF 等派生缓存按分片单独保存，不写回共享的gallery缓存
+    derived_cache_path = shard_path(gallery_cache_path, shard)
+
+    rerank = PROTOTYPE_RERANK if GALLERY_PROTOTYPES > 0 else 0
+    if GALLERY_PRECISION != "fp32":
+        rerank = max(rerank, GALLERY_RERANK)
+    # 不重排时只用到粗检索gallery（原型/量化后的值和缩放系数）：只保存和读取这部分，不读取完整 float32 gallery
+    coarse_only = rerank == 0 and (GALLERY_PROTOTYPES > 0 or GALLERY_PRECISION != "fp32")
+
+    coarse_meta = {
+        "size": size,
+        "precision": GALLERY_PRECISION,
+        "prototypes": GALLERY_PROTOTYPES,
+    }
+    if shard is not None:
+        coarse_meta["shard"] = f"{shard[0]}/{shard[1]}:{SHARD_BY}"
+
+    store = None
+    coarse = None
+    full_embs = None
+    if GALLERY_FORMAT == "mmap":
+        store_meta = dict(coarse_meta, model_hash=file_checksum(model_path), coarse_only=coarse_only)
+        store = _open_gallery_store(gallery_store_path, store_meta, gallery_cache_path)
+    elif coarse_only:
+        coarse_cache_path = get_coarse_cache_path(size)
+        coarse = _load_coarse_cache(coarse_cache_path, coarse_meta, gallery_cache_path)
+
+    if store is None and coarse is None:
+        gallery_embs, gallery_labels, data = _load_gallery_cache(
+            gallery_cache_path, model, transform, device
+        )
+        if shard is not None:
+            gallery_embs, gallery_labels = select_shard(gallery_embs, gallery_labels, shard)
+            # 派生缓存单独保存在分片文件中
+            data = torch.load(derived_cache_path, map_location="cpu") if os.path.exists(derived_cache_path) else {}
+
+        gallery_label_names, gallery_label_ids = build_label_index(gallery_labels)
+        print(f"[Gallery] Indexed {len(gallery_label_names)} labels")
+
+        coarse_values, coarse_scales, coarse_label_ids = _prepare_coarse_gallery(
+            derived_cache_path,
+            gallery_embs,
+            gallery_label_ids,
+            gallery_label_names,
+            data,
+            # 量化结果只保存在粗检索缓存中，不写入完整gallery缓存
+            cache_quantized=not coarse_only
+        )
+        del data
+        full_embs, full_label_ids = gallery_embs, gallery_label_ids
+
+        if GALLERY_FORMAT == "mmap":
+            sections = {} if coarse_only else {"embs": gallery_embs, "label_ids": gallery_label_ids}
+            if coarse_values is not gallery_embs:
+                sections["coarse_values"] = coarse_values
+                sections["coarse_label_ids"] = coarse_label_ids
+                if coarse_scales is not None:
+                    sections["coarse_scales"] = coarse_scales
+            write_gallery_store(
+                gallery_store_path,
+                sections,
+                gallery_label_names,
+                dict(
+                    store_meta,
+                    dim=gallery_embs.shape[1],
+                    count=gallery_embs.shape[0],
+                    source=_file_signature(gallery_cache_path)
+                )
             )
-        
-        if not os.path.exists(GALLERY_ROOT):
-            raise FileNotFoundError(
-                f"Gallery cache not found and GALLERY_ROOT directory does not exist: {GALLERY_ROOT}"
+            print(f"[Gallery] Gallery store saved to {gallery_store_path}")
+            store = GalleryStore(gallery_store_path)
+        elif coarse_only:
+            save_gallery_cache(
+                {
+                    "meta": dict(coarse_meta, source=_file_signature(gallery_cache_path)),
+                    "label_names": gallery_label_names,
+                    "values": coarse_values,
+                    "scales": coarse_scales,
+                    "label_ids": coarse_label_ids,
+                },
+                coarse_cache_path
             )
-        
-        print(f"[Gallery] Cache not found, building gallery from {GALLERY_ROOT}...")
-        gallery_embs, gallery_labels = build_gallery(
-            model,
-            GALLERY_ROOT,
-            transform,
-            device,
-            batch_size=128,
-            num_workers=8,
-            cache_path=gallery_cache_path
+            print(f"[Gallery] Coarse gallery saved to {coarse_cache_path}")
+
+    if store is not None:
+        # 全部替换为 mmap 上的零拷贝视图，释放上面构建时的私有副本
+        gallery_embs = store.get("embs")
+        gallery_label_names = store.label_names
+        coarse_values = store.get("coarse_values")
+        coarse_label_ids = store.get("coarse_label_ids")
+        coarse_scales = store.get("coarse_scales")
+        if gallery_embs is None:
+            # 只保存了粗检索gallery
+            gallery_embs, gallery_label_ids = coarse_values, coarse_label_ids
+        else:
+            gallery_label_ids = store.get("label_ids")
+            if coarse_values is None:
+                coarse_values, coarse_label_ids = gallery_embs, gallery_label_ids
+            if full_embs is None:
+                full_embs, full_label_ids = gallery_embs, gallery_label_ids
+        gallery_labels = LabelView(gallery_label_names, gallery_label_ids)
+        print(f"[Gallery] Mapped {len(gallery_labels)} gallery items from {gallery_store_path}")
+    elif coarse is not None:
+        gallery_label_names = coarse["label_names"]
+        coarse_values, coarse_scales, coarse_label_ids = coarse["values"], coarse["scales"], coarse["label_ids"]
+        gallery_embs, gallery_label_ids = coarse_values, coarse_label_ids
+        gallery_labels = LabelView(gallery_label_names, gallery_label_ids)
+        print(f"[Gallery] Loaded {len(gallery_labels)} coarse gallery items from {coarse_cache_path}")
+
+    num_labels = len(gallery_label_names)
+
+    index_cache_path = shard_path(sized_path(os.path.join(MODEL_DIR, "aethersight_gallery.ivf.pth"), size), shard)
+    search_index = create_index(
+        coarse_values,
+        coarse_label_ids,
+        num_labels,
+        cache_path=index_cache_path,
+        scales=coarse_scales
+    )
+
+    if rerank > 0:
+        search_index = RerankIndex(
+            search_index,
+            gallery_embs,
+            gallery_label_ids,
+            num_labels,
+            rerank=rerank
+        )
+    else:
+        # 不重排时只保留粗检索使用的gallery，释放完整 float32 gallery
+        if coarse_label_ids is not gallery_label_ids:
+            gallery_labels = LabelView(gallery_label_names, coarse_label_ids)
+        gallery_embs = coarse_values
+        gallery_label_ids = coarse_label_ids
+
+    # 只读取了粗检索gallery时没有完整 float32 gallery 可以对比，召回率在构建缓存时已经输出过
+    if full_embs is not None and (GALLERY_PROTOTYPES > 0 or GALLERY_PRECISION != "fp32"):
+        full_index = ExactIndex(full_embs, full_label_ids, num_labels)
+        sample = full_index.embs[torch.randperm(full_index.embs.shape[0])[:256]]
+        recall = evaluate_recall(search_index, full_index, sample, k=10)
+        print(f"[Gallery] recall@10 vs full float32 gallery: {recall:.4f}")
+        del full_index
+    del full_embs
+
+    search_index = create_sharded_index(
+        search_index,
+        coarse_values,
+        coarse_label_ids,
+        gallery_label_names,
+        coarse_scales,
+        size,
+        index_cache_path=index_cache_path,
+        rerank_gallery=(gallery_embs, gallery_label_ids) if rerank > 0 else None,
+        rerank=rerank
+    )
+    if isinstance(search_index, ShardedIndex):
+        gallery_label_names = search_index.label_names
+
+    print(f"[Gallery] Search index: {search_index.name} ({GALLERY_PRECISION}, {size}px)")
+
+    return gallery_embs, gallery_labels, gallery_label_names, gallery_label_ids, search_index
+
+
+def _file_signature(path):
+    """文件的 [大小, 修改时间ns]，不存在时为 None"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _open_gallery_store(path, meta, gallery_cache_path):
+    """
+    打开 mmap gallery 缓存
+
+    不存在、与当前模型/配置不一致，或 .pth 缓存在其生成后被更新（如增量构建）时返回 None
+    """
+    if not os.path.exists(path):
+        return None
+
+    header = read_gallery_header(path)
+    stale = header is None or any(header.get(key) != value for key, value in meta.items())
+    if not stale and os.path.exists(gallery_cache_path):
+        stale = header.get("source") != _file_signature(gallery_cache_path)
+    if stale:
+        print(f"[Gallery] Gallery store {path} is stale, rebuilding...")
+        return None
+
+    return GalleryStore(path)
+
+
+def _load_gallery_cache(gallery_cache_path, model, transform, device):
+    """
+    读取 torch.save 格式的gallery缓存，不存在或与输入分辨率不一致时从 GALLERY_ROOT 构建
+
+    Returns:
+        gallery_embs, gallery_labels, 缓存内容（构建时为 None）
+    """
+    if os.path.exists(gallery_cache_path):
+        print(f"[Gallery] Loading cache from {gallery_cache_path}...")
+        data = torch.load(gallery_cache_path, map_location="cpu")
+        # 没有记录分辨率的旧缓存按 512 构建
+        cache_size = data.get("size", 512)
+        if cache_size == transform.size:
+            print(f"[Gallery] Loaded {len(data['labels'])} gallery items from cache")
+            return data["embs"], data["labels"], data
+        print(f"[Gallery] Cache was built at {cache_size}px, need {transform.size}px")
+        del data
+
+    if not GALLERY_ROOT:
+        raise ValueError(
+            f"Gallery cache not found at {gallery_cache_path} and "
+            "GALLERY_ROOT environment variable is not set. "
+            "Either provide the cache file or set GALLERY_ROOT to build it."
+        )
+
+    if not os.path.exists(GALLERY_ROOT):
+        raise FileNotFoundError(
+            f"Gallery cache not found and GALLERY_ROOT directory does not exist: {GALLERY_ROOT}"
+        )
+
+    print(f"[Gallery] Building {transform.size}px gallery from {GALLERY_ROOT}...")
+    embs, labels = build_gallery(
+        model,
+        GALLERY_ROOT,
+        transform,
+        device,
+        batch_size=128,
+        num_workers=8,
+        cache_path=gallery_cache_path,
+        # 分辨率不一致的旧缓存不会被直接加载，其嵌入也不会被复用
+        incremental=True,
+        model_hash=file_checksum(get_model_path())
+    )
+
+    if embs is None or labels is None:
+        raise RuntimeError("Failed to build gallery embeddings")
+
+    print(f"[Gallery] Built and saved {len(labels)} gallery items")
+    return embs, labels, None
+
+
+def _load_coarse_cache(path, meta, gallery_cache_path):
+    """
+    读取只包含粗检索gallery的缓存
+
+    不存在、与当前配置不一致，或 .pth 缓存在其生成后被更新时返回 None
+
+    Returns:
+        {"label_names", "values", "scales", "label_ids"}
+    """
+    if not os.path.exists(path):
+        return None
+
+    data = torch.load(path, map_location="cpu")
+    cached_meta = dict(data.get("meta", {}))
+    source = cached_meta.pop("source", None)
+    stale = cached_meta != meta
+    if not stale and os.path.exists(gallery_cache_path):
+        stale = source != _file_signature(gallery_cache_path)
+    if stale:
+        print(f"[Gallery] Coarse gallery cache {path} is stale, rebuilding...")
+        return None
+
+    return data
+
+
+def _prepare_coarse_gallery(gallery_cache_path, embs, label_ids, label_names, data, cache_quantized=True):
+    """
+    准备粗检索使用的gallery：按配置压缩为原型、量化
+
+    Args:
+        cache_quantized: 是否把量化结果写入gallery缓存
+
+    Returns:
+        values, scales, label_ids
+    """
+    coarse_embs, coarse_label_ids = embs, label_ids
+    if GALLERY_PROTOTYPES > 0:
+        coarse_embs, coarse_label_ids = load_or_build_prototypes(
+            gallery_cache_path,
+            embs,
+            label_ids,
+            label_names,
+            GALLERY_PROTOTYPES,
+            data=data
         )
-        
-        if gallery_embs is None or gallery_labels is None:
-            raise RuntimeError("Failed to build gallery embeddings")
-        
-        print(f"[Gallery] Built and saved {len(gallery_labels)} gallery items")
 
+    values, scales = load_or_build_quantized(
+        gallery_cache_path if cache_quantized else None,
+        coarse_embs,
+        GALLERY_PRECISION,
+        data=data if cache_quantized else None
+    )
+
+    return values, scales, coarse_label_ids
@@ -5,7 +5,6 @@
 
 import torch.nn as nn
 import torch.nn.functional as F
-import timm
 
 
 class EmbeddingModel(nn.Module):
@@ -13,16 +12,20 @@ class EmbeddingModel(nn.Module):
     基于 EfficientNet 的嵌入模型
     用于生成归一化的特征向量
     """
-    def __init__(self, model_name="tf_efficientnetv2_m", emb_dim=512):
+    def __init__(self, model_name="tf_efficientnetv2_m", emb_dim=512, pretrained=True):
         """
         Args:
             model_name: timm 模型名称
             emb_dim: 嵌入维度
+            pretrained: 是否加载 ImageNet 预训练权重（从 checkpoint 加载时不需要）
         """
+        # timm 会连带导入 torchvision 等，只在构建 eager 模型时导入
+        import timm
+
         super().__init__()
         self.backbone = timm.create_model(
             model_name,
-            pretrained=True,
+            pretrained=pretrained,
             num_classes=0  # 去掉分类头
         )
         self.head = nn.Sequential(
@@ -0,0 +1,232 @@
+"""
+嵌入模型 int8 量化模块
+
+基于导出的 ONNX 图，用 onnxruntime 做训练后量化：
+    static  - 在 GALLERY_ROOT 抽样图片上校准激活范围，权重逐通道 int8（QDQ 格式）
+    dynamic - 只量化权重，激活范围在推理时计算，不需要校准数据
+量化后的模型保存为 aethersight.int8-<mode>.onnx，旁边的 .json 记录源模型校验和与校准参数。
+"""
+
+import os
+import json
+import random
+
+import torch
+import torch.nn.functional as F
+
+from .dataset import read_resized_rgb
+from .export import ONNX_INSTALL_HINT
+from .gallery import scan_gallery
+from .preprocess import normalize_batch
+from .search import build_label_index
+from .index import ExactIndex
+
+MODEL_QUANTIZATION = os.getenv('MODEL_QUANTIZATION', 'none').lower()
+QUANT_CALIBRATION_SAMPLES = int(os.getenv('QUANT_CALIBRATION_SAMPLES', 128))
+
+QUANTIZATIONS = ("none", "dynamic", "static")
+
+
+def quantized_path(onnx_path, mode):
+    """量化模型路径"""
+    return f"{os.path.splitext(onnx_path)[0]}.int8-{mode}.onnx"
+
+
+def split_gallery_sample(gallery_root, calibration, holdout, seed=0):
+    """
+    从gallery中不重复地抽取校准集和留出集
+
+    Returns:
+        calibration_paths, holdout_paths
+    """
+    paths = [os.path.join(gallery_root, entry[0]) for entry in scan_gallery(gallery_root)]
+    random.Random(seed).shuffle(paths)
+    return paths[:calibration], paths[calibration:calibration + holdout]
+
+
+def load_images(paths, size=512):
+    """读取并归一化一组图片 [N, C, H, W]"""
+    return normalize_batch(torch.stack([read_resized_rgb(path, size) for path in paths]))
+
+
+class GalleryCalibrationReader:
+    """
+    onnxruntime 的校准数据读取器（实现 CalibrationDataReader 接口），按批读取gallery图片
+    """
+
+    def __init__(self, input_name, paths, size=512, batch_size=8):
+        self.input_name = input_name
+        self.paths = paths
+        self.size = size
+        self.batch_size = batch_size
+        self._start = 0
+
+    def get_next(self):
+        if self._start >= len(self.paths):
+            return None
+        batch = self.paths[self._start:self._start + self.batch_size]
+        self._start += self.batch_size
+        return {self.input_name: load_images(batch, self.size).numpy()}
+
+    def rewind(self):
+        self._start = 0
+
+
+def quantize_model(onnx_path, output_path, mode, meta, calibration_paths=None, size=512):
+    """
+    量化导出的 ONNX 模型（先写临时文件再替换）
+
+    Args:
+        onnx_path: float32 ONNX 模型路径
+        output_path: 输出路径
+        mode: 'static' 或 'dynamic'
+        meta: 写入 .json 的元信息
+        calibration_paths: static 模式的校准图片路径
+        size: 输入边长
+    """
+    try:
+        from onnxruntime.quantization import (
+            quantize_static, quantize_dynamic, QuantFormat, QuantType
+        )
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+    except ImportError:
+        raise ImportError(f"onnxruntime not installed. {ONNX_INSTALL_HINT}")
+
+    # 先做形状推断和图优化（BN 折叠等），量化节点才能覆盖完整的图
+    prepared_path = f"{output_path}.prep.onnx"
+    tmp_path = f"{output_path}.tmp"
+    quant_pre_process(onnx_path, prepared_path)
+
+    try:
+        if mode == "static":
+            if not calibration_paths:
+                raise ValueError("Static quantization needs calibration images (set GALLERY_ROOT)")
+            print(f"[Quantize] Calibrating on {len(calibration_paths)} gallery images...")
+            quantize_static(
+                prepared_path,
+                tmp_path,
+                GalleryCalibrationReader("input", calibration_paths, size=size),
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                # 定期合并激活范围，校准时不保留全部中间输出
+                extra_options={"CalibMaxIntermediateOutputs": 4}
+            )
+        elif mode == "dynamic":
+            quantize_dynamic(prepared_path, tmp_path, weight_type=QuantType.QUInt8)
+        else:
+            raise ValueError(f"Unknown MODEL_QUANTIZATION: {mode}. Use one of {QUANTIZATIONS}.")
+        os.replace(tmp_path, output_path)
+    finally:
+        for path in (prepared_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    with open(f"{output_path}.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def ensure_quantized(onnx_path, mode, model_hash, gallery_root, size=512,
+                     calibration_samples=QUANT_CALIBRATION_SAMPLES, force=False):
+    """
+    量化模型不存在或与当前模型文件/配置不一致时重新量化
+
+    Args:
+        force: 为 True 时总是重新量化
+
+    Returns:
+        量化模型路径
+    """
+    path = quantized_path(onnx_path, mode)
+    meta = {
+        "model_hash": model_hash,
+        "size": size,
+        "quantization": mode,
+        "calibration_samples": calibration_samples if mode == "static" else 0,
+    }
+
+    current = None
+    if os.path.exists(path) and os.path.exists(f"{path}.json"):
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            current = json.load(f)
+
+    if force or current != meta:
+        print(f"[Quantize] Quantizing {path} ({mode})...")
+        calibration_paths = None
+        if mode == "static":
+            if not gallery_root or not os.path.isdir(gallery_root):
+                raise ValueError(
+                    "Static int8 quantization needs calibration images from GALLERY_ROOT, "
+                    f"but the directory does not exist: {gallery_root}"
+                )
+            calibration_paths, _ = split_gallery_sample(gallery_root, calibration_samples, 0)
+        quantize_model(onnx_path, path, mode, meta, calibration_paths, size=size)
+        print(f"[Quantize] ✓ Quantized model saved to {path}")
+
+    return path
+
+
+@torch.no_grad()
+def embed_paths(model, paths, size=512, batch_size=16):
+    """分批计算一组图片的归一化嵌入"""
+    embs = []
+    for start in range(0, len(paths), batch_size):
+        images = load_images(paths[start:start + batch_size], size)
+        embs.append(F.normalize(model(images).float().cpu(), dim=1))
+    return torch.cat(embs)
+
+
+def exclude_gallery_paths(data, gallery_root, paths):
+    """
+    从gallery缓存中去掉指定图片的嵌入，留出集图片作为查询时不会检索到自身
+
+    Args:
+        data: gallery缓存（需要 files 中的相对路径）
+        gallery_root: gallery根目录
+        paths: 要去掉的图片路径
+
+    Returns:
+        (gallery_embs, gallery_labels, 去掉的条数)；缓存中没有文件列表时返回 None
+    """
+    files = data.get("files")
+    if not files:
+        return None
+
+    excluded = {os.path.normpath(os.path.relpath(path, gallery_root)) for path in paths}
+    keep = [i for i, rel_path in enumerate(files["paths"]) if os.path.normpath(rel_path) not in excluded]
+    embs = data["embs"][torch.tensor(keep, dtype=torch.long)]
+    labels = [data["labels"][i] for i in keep]
+    return embs, labels, len(files["paths"]) - len(keep)
+
+
+def agreement_report(expected, actual, gallery_embs, gallery_labels, k=10):
+    """
+    比较量化模型与 float32 模型在gallery检索上的一致性
+
+    Args:
+        expected: float32 模型在留出集上的嵌入 [N, D]
+        actual: 量化模型在留出集上的嵌入 [N, D]
+        gallery_embs/gallery_labels: 检索用的gallery（不应包含留出集图片，见 exclude_gallery_paths）
+        k: Top-K
+
+    Returns:
+        {"top1": Top-1 label一致的比例, "topk": Top-K label集合的平均重合率, "cosine": 嵌入平均余弦相似度}
+    """
+    label_names, label_ids = build_label_index(gallery_labels)
+    index = ExactIndex(gallery_embs.float(), label_ids, len(label_names))
+
+    _, expected_idxs = index.search(expected, k)
+    _, actual_idxs = index.search(actual, k)
+
+    top1 = (expected_idxs[:, 0] == actual_idxs[:, 0]).float().mean().item()
+    overlap = [
+        len(set(e) & set(a)) / len(e)
+        for e, a in zip(expected_idxs.tolist(), actual_idxs.tolist())
+    ]
+
+    return {
+        "top1": top1,
+        "topk": sum(overlap) / len(overlap),
+        "cosine": F.cosine_similarity(expected, actual, dim=1).mean().item(),
+    }
@@ -2,6 +2,12 @@
 预测模块
 """
 
+import os
+import math
+import time
+import threading
+from json.encoder import encode_basestring
+
 import torch
 import torch.nn.functional as F
 import cv2
@@ -9,71 +15,387 @@ import numpy as np
 from fastapi import HTTPException
 
 from .dataset import imread_unicode
-from .loader import get_model, get_gallery, get_transform, get_device
-from ..data.gear_model import get_same_model_gears
+from .loader import get_snapshot, FAST_PATH_SIZE, FAST_PATH_MARGIN
+from .cache import get_result_cache, content_key
+from .batcher import BATCH_MAX_SIZE
+from ..data.gear_model import get_same_model_gears, get_same_model_gears_json
+from ..startup import phase
 
+# 预热的批大小，默认为单张请求和微批调度的最大批
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.getenv('WARMUP_BATCH_SIZES', f"1,{BATCH_MAX_SIZE}").split(",") if size.strip()
+]
+WARMUP_ROUNDS = int(os.getenv('WARMUP_ROUNDS', 2))
 
-def predict_image(image_data, top_k=5):
+_fast_path_lock = threading.Lock()
+_fast_path_queries = 0
+_fast_path_reembedded = 0
+
+
+class ImageDecodeError(ValueError):
+    """批量预测中某张图片无法解码"""
+
+    def __init__(self, index):
+        self.index = index
+        super().__init__(f"Failed to decode image {index}")
+
+
+def decode_image(image_data, rgb=True):
     """
-    对图片进行预测
-    
+    解码图片为numpy数组
+
     Args:
         image_data: 图片数据（bytes或文件路径）
-        top_k: 返回Top-K结果
-    
+        rgb: 是否转换为RGB；为 False 时直接返回 cv2 解码得到的 BGR 数组，不额外复制
+
     Returns:
-        预测结果字典
+        numpy array (H, W, C)
     """
-    model = get_model()
-    gallery_embs, gallery_labels = get_gallery()
-    transform = get_transform()
-    device = get_device()
+    if isinstance(image_data, bytes):
+        nparr = np.frombuffer(image_data, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    else:
+        img = imread_unicode(image_data)
+
+    if img is None:
+        raise ValueError("Failed to decode image")
+
+    if not rgb:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def preprocess_image(image_data, snapshot=None):
+    """
+    解码并变换图片，得到单张查询张量
+
+    Args:
+        image_data: 图片数据（bytes或文件路径）
+        snapshot: 使用的模型快照，默认为当前快照
+
+    Returns:
+        torch.Tensor: [C, H, W]；启用快速路径时为 (完整分辨率, 低分辨率) 两个张量
+    """
+    snapshot = snapshot or get_loaded_snapshot()
+    img = decode_image(image_data, rgb=False)
+
+    # 通道交换与缩放、归一化一起在变换中完成
+    query = snapshot.transform(img, bgr=True)
+    if snapshot.fast_path is None:
+        return query
+    return query, snapshot.fast_path.transform(img, bgr=True)
+
+
+def preprocess_images(images, snapshot=None):
+    """
+    解码并变换一批图片，直接写入预分配的批次张量（不再逐张创建后 stack）
+
+    Args:
+        images: 图片数据列表（bytes或文件路径）
+        snapshot: 使用的模型快照，默认为当前快照
+
+    Returns:
+        torch.Tensor: [N, C, H, W]；启用快速路径时为 (完整分辨率, 低分辨率) 两个批次张量
+    """
+    snapshot = snapshot or get_loaded_snapshot()
+    transforms = [snapshot.transform]
+    if snapshot.fast_path is not None:
+        transforms.append(snapshot.fast_path.transform)
+
+    batches = [
+        torch.empty((len(images), 3, transform.size, transform.size), dtype=torch.float32)
+        for transform in transforms
+    ]
+    for i, image_data in enumerate(images):
+        try:
+            img = decode_image(image_data, rgb=False)
+        except ValueError:
+            raise ImageDecodeError(i)
+        for transform, batch in zip(transforms, batches):
+            transform(img, bgr=True, out=batch[i])
+
+    return batches[0] if len(batches) == 1 else tuple(batches)
+
+
+@torch.no_grad()
+def embed_queries(queries, snapshot=None):
+    """
+    对一批查询张量做一次前向
+
+    Args:
+        queries: [B, C, H, W]
+        snapshot: 使用的模型快照，默认为当前快照
+
+    Returns:
+        归一化的嵌入向量 [B, D]（CPU）
+    """
+    snapshot = snapshot or get_loaded_snapshot()
+
+    query_emb = snapshot.model(queries.to(snapshot.device)).cpu()
+    return F.normalize(query_emb, dim=1)
+
+
+def rank_labels(query_embs, top_k, snapshot=None):
+    """
+    在gallery中检索，每个label只保留最高相似度
+
+    Args:
+        query_embs: 查询嵌入 [B, D]
+        top_k: 每个查询返回的label数量
+        snapshot: 使用的模型快照，默认为当前快照
+
+    Returns:
+        每个查询的 [(label, score), ...] 列表
+    """
+    snapshot = snapshot or get_loaded_snapshot()
+
+    label_names = snapshot.label_names
+    scores, idxs = snapshot.search_index.search(query_embs, top_k)
+
+    return [
+        [(label_names[i], s) for i, s in zip(row_idxs, row_scores)]
+        for row_idxs, row_scores in zip(idxs.tolist(), scores.tolist())
+    ]
+
+
+def search_queries(queries, top_k, snapshot):
+    """
+    对预处理后的查询批次做前向和检索
+
+    启用快速路径时先在低分辨率上前向和检索，只对 Top-1 与 Top-2 相似度差小于
+    FAST_PATH_MARGIN 的查询用完整分辨率重新前向和检索。
+
+    Args:
+        queries: [B, C, H, W]，或 (完整分辨率 [B, ...], 低分辨率 [B, ...])
+        top_k: 每个查询返回的label数量
+        snapshot: 使用的模型快照
+
+    Returns:
+        每个查询的 [(label, score), ...] 列表
+    """
+    global _fast_path_queries, _fast_path_reembedded
+
+    if not isinstance(queries, tuple):
+        return rank_labels(embed_queries(queries, snapshot), top_k, snapshot)
+
+    full, low = queries
+    fast = snapshot.fast_path
+    if fast is None:
+        return rank_labels(embed_queries(full, snapshot), top_k, snapshot)
+
+    ranked = rank_labels(embed_queries(low, fast), max(top_k, 2), fast)
+    uncertain = [
+        i for i, final in enumerate(ranked)
+        if len(final) > 1 and final[0][1] - final[1][1] < FAST_PATH_MARGIN
+    ]
+
+    if uncertain:
+        reembedded = rank_labels(embed_queries(full[uncertain], snapshot), top_k, snapshot)
+        for i, final in zip(uncertain, reembedded):
+            ranked[i] = final
+
+    with _fast_path_lock:
+        _fast_path_queries += len(ranked)
+        _fast_path_reembedded += len(uncertain)
+
+    return [final[:top_k] for final in ranked]
+
+
+def get_fast_path_stats():
+    """快速路径运行指标"""
+    with _fast_path_lock:
+        return {
+            "enabled": FAST_PATH_SIZE > 0,
+            "size": FAST_PATH_SIZE,
+            "margin": FAST_PATH_MARGIN,
+            "queries": _fast_path_queries,
+            "reembedded": _fast_path_reembedded,
+            "reembed_rate": _fast_path_reembedded / _fast_path_queries if _fast_path_queries else 0.0,
+        }
 
-    if model is None:
+
+@torch.no_grad()
+def warm_up(snapshot=None, batch_sizes=None, rounds=None):
+    """
+    按典型批大小跑几轮预处理、前向和检索（包括快速路径）
+
+    首批请求不再承担算子选择、内存分配器扩容等一次性开销。
+
+    Args:
+        snapshot: 要预热的快照，默认为当前快照（重新加载时在替换前预热新快照）
+        batch_sizes: 批大小列表，默认为 WARMUP_BATCH_SIZES
+        rounds: 每个批大小的轮数，默认为 WARMUP_ROUNDS，0 跳过预热
+    """
+    snapshot = snapshot or get_loaded_snapshot()
+    batch_sizes = batch_sizes or WARMUP_BATCH_SIZES
+    rounds = WARMUP_ROUNDS if rounds is None else rounds
+    if rounds <= 0:
+        return
+
+    rng = np.random.default_rng(0)
+    with phase("warm-up"):
+        for snap in (snapshot, snapshot.fast_path):
+            if snap is None:
+                continue
+            size = snap.transform.size
+            for batch_size in batch_sizes:
+                images = rng.integers(0, 256, (batch_size, size, size, 3), dtype=np.uint8)
+                latencies = []
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    queries = torch.stack([snap.transform(image, bgr=True) for image in images])
+                    rank_labels(embed_queries(queries, snap), 10, snap)
+                    latencies.append((time.perf_counter() - start) * 1000.0)
+                print(f"[Warmup] {size}px batch {batch_size}: first {latencies[0]:.1f} ms, "
+                      f"last {latencies[-1]:.1f} ms")
+
+
+def format_results(final):
+    """
+    将 [(label, score), ...] 转换为响应结构，附带同模装备信息
+    """
+    results = []
+    for i, (label, score) in enumerate(final, 1):
+        same_model_gears = get_same_model_gears(label)
+        results.append({
+            "rank": i,
+            "label": label,
+            "score": float(score),
+            "same_model_gears": same_model_gears
+        })
+
+    return {"results": results}
+
+
+def render_results(result):
+    """
+    将 format_results 的结果序列化为 JSON 字符串
+
+    同模装备直接拼接加载时预先序列化的片段，不再逐个校验和序列化；结果与按 PredictionResponse 序列化一致。
+    """
+    rows = []
+    for row in result["results"]:
+        score = float(row["score"])
+        rows.append(
+            f'{{"rank":{int(row["rank"])},"label":{encode_basestring(row["label"])},'
+            f'"score":{repr(score) if math.isfinite(score) else "null"},'
+            f'"same_model_gears":{get_same_model_gears_json(row["label"])}}}'
+        )
+    return '{"results":[' + ','.join(rows) + ']}'
+
+
+def get_loaded_snapshot():
+    """获取当前快照，未加载时抛出 HTTPException"""
+    snapshot = get_snapshot()
+
+    if snapshot is None or snapshot.model is None:
         raise HTTPException(status_code=500, detail="Model not loaded")
 
-    if gallery_embs is None or gallery_labels is None:
+    if snapshot.gallery_embs is None or snapshot.gallery_labels is None:
         raise HTTPException(status_code=500, detail="Gallery not loaded")
 
-    try:
-        if isinstance(image_data, bytes):
-            nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return snapshot
+
+
+def predict_tensors(queries, top_k=5, snapshot=None):
+    """
+    对已预处理的查询张量做批量预测（一次前向 + 一次相似度矩阵乘）
+
+    Args:
+        queries: preprocess_image 输出的列表，或 preprocess_images 输出的批次
+        top_k: 返回Top-K结果
+        snapshot: 使用的模型快照，默认为当前快照（须与预处理时的快照一致）
+
+    Returns:
+        预测结果字典列表，与输入一一对应
+    """
+    # 整个批次使用同一个快照，重新加载不会影响进行中的预测
+    snapshot = snapshot or get_loaded_snapshot()
+
+    if isinstance(queries, list):
+        if isinstance(queries[0], tuple):
+            queries = tuple(torch.stack(group) for group in zip(*queries))
         else:
-            img = imread_unicode(image_data)
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-        query = transform(img).unsqueeze(0).to(device)
-        query_emb = model(query).cpu()
-        query_emb = F.normalize(query_emb, dim=1)
-
-        sims = torch.matmul(query_emb, gallery_embs.T)[0]
-
-        all_idxs = torch.argsort(sims, descending=True)
-        
-        seen = {}
-        for idx in all_idxs.tolist():
-            label = gallery_labels[idx]
-            if label not in seen:
-                seen[label] = sims[idx].item()
-                if len(seen) >= top_k:
-                    break
-
-        final = sorted(seen.items(), key=lambda x: x[1], reverse=True)[:top_k]
-
-        results = []
-        for i, (label, score) in enumerate(final, 1):
-            same_model_gears = get_same_model_gears(label)
-            results.append({
-                "rank": i,
-                "label": label,
-                "score": float(score),
-                "same_model_gears": same_model_gears
-            })
-
-        return {"results": results}
+            queries = torch.stack(queries)
+
+    return [format_results(final) for final in search_queries(queries, top_k, snapshot)]
+
+
+def predict_batch(items):
+    """
+    微批调度器的处理函数
+
+    重新加载前后预处理的请求可能落在同一批次，按预处理时的快照分组，每组用自己的快照前向和检索。
+
+    Args:
+        items: [(query, top_k, snapshot), ...]，query 为 preprocess_image 用 snapshot 预处理的输出
+
+    Returns:
+        预测结果字典列表，与输入一一对应
+    """
+    groups = {}
+    for i, (_, _, snapshot) in enumerate(items):
+        groups.setdefault(id(snapshot), []).append(i)
+
+    outputs = [None] * len(items)
+    for rows in groups.values():
+        snapshot = items[rows[0]][2]
+        max_k = max(items[i][1] for i in rows)
+        for i, output in zip(rows, predict_tensors([items[i][0] for i in rows], max_k, snapshot)):
+            output["results"] = output["results"][:items[i][1]]
+            outputs[i] = output
+
+    return outputs
+
+
+def predict_images(images, top_k=5, snapshot=None):
+    """
+    对一组图片（如同一张截图切出的多个装备栏位）做一次批量预测
+
+    Args:
+        images: 图片数据列表（bytes或文件路径）
+        top_k: 每张图片返回Top-K结果
+        snapshot: 使用的模型快照，默认为当前快照
+
+    Returns:
+        预测结果字典列表，与输入一一对应
+    """
+    snapshot = snapshot or get_loaded_snapshot()
 
+    queries = preprocess_images(images, snapshot)
+    return [format_results(final) for final in search_queries(queries, top_k, snapshot)]
+
+
+def predict_image(image_data, top_k=5):
+    """
+    对图片进行预测
+
+    Args:
+        image_data: 图片数据（bytes或文件路径）
+        top_k: 返回Top-K结果
+
+    Returns:
+        预测结果字典（命中缓存时与其他调用共享，不应修改）
+    """
+    snapshot = get_loaded_snapshot()
+
+    cache = get_result_cache()
+    cache_key = None
+    if isinstance(image_data, bytes):
+        cache_key = content_key(image_data, snapshot.version, top_k)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        # 缓存键、预处理和检索使用同一个快照，重新加载期间结果不会存到另一个版本的键下
+        query = preprocess_image(image_data, snapshot)
+        result = predict_tensors([query], top_k, snapshot)[0]
+        if cache_key is not None:
+            cache.put(cache_key, result)
+        return result
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-
@@ -3,10 +3,16 @@
 """
 
 import torch
-import torchvision.transforms as transforms
-from PIL import Image
+import torch.nn.functional as F
 import numpy as np
 
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# 归一化写成 x * scale - offset，uint8 输入只需一次乘法和一次减法
+_SCALE = tuple(1.0 / (255.0 * std) for std in IMAGENET_STD)
+_OFFSET = tuple(mean / std for mean, std in zip(IMAGENET_MEAN, IMAGENET_STD))
+
 
 class InferenceTransform:
     """
@@ -14,13 +20,16 @@ class InferenceTransform:
     替代 A2ClothingTransform(train=False)
     """
     def __init__(self, size=512):
+        # 服务的请求路径使用 TensorInferenceTransform，不需要导入 torchvision
+        import torchvision.transforms as transforms
+
         self.size = size
         self.transform = transforms.Compose([
             transforms.Resize((size, size)),
             transforms.ToTensor(),
             transforms.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225]
+                mean=list(IMAGENET_MEAN),
+                std=list(IMAGENET_STD)
             )
         ])
     
@@ -32,6 +41,8 @@ class InferenceTransform:
         Returns:
             torch.Tensor: [C, H, W] 归一化后的tensor
         """
+        from PIL import Image
+
         if isinstance(image, np.ndarray):
             pil_image = Image.fromarray(image)
         else:
@@ -39,3 +50,88 @@ class InferenceTransform:
         
         return self.transform(pil_image)
 
+
+def resize_uint8(image, size=512):
+    """
+    一次缩放到 size x size，保持 uint8
+
+    使用 torch 的 uint8 抗锯齿双线性插值，与 torchvision 对 PIL 图像的 Resize 结果一致
+    （误差不超过 1 个灰度级），且不需要先转换为 PIL 或 float。
+
+    Args:
+        image: numpy array 或 tensor (H, W, C) uint8
+        size: 目标边长
+
+    Returns:
+        torch.Tensor: [C, size, size] uint8
+    """
+    if isinstance(image, np.ndarray):
+        image = torch.from_numpy(image)
+
+    # HWC -> CHW 只是视图，不复制
+    image = image.permute(2, 0, 1)
+    if image.shape[1] == size and image.shape[2] == size:
+        return image
+
+    return F.interpolate(
+        image.unsqueeze(0),
+        size=(size, size),
+        mode="bilinear",
+        antialias=True,
+        align_corners=False
+    )[0]
+
+
+class TensorInferenceTransform:
+    """
+    张量化的推理变换，输出与 InferenceTransform 一致（误差不超过 1 个灰度级）
+
+    不经过 PIL，也不产生中间的 float 张量：缩放结果保持 uint8，
+    颜色通道交换和归一化在写入输出缓冲区时一次完成。
+    """
+    def __init__(self, size=512):
+        self.size = size
+
+    def __call__(self, image, bgr=False, out=None):
+        """
+        Args:
+            image: numpy array (H, W, C) uint8
+            bgr: 输入是否为 cv2 解码得到的 BGR 顺序（在归一化时交换通道，不单独转换）
+            out: 预分配的输出缓冲区 [C, size, size] float32，为 None 时新建
+
+        Returns:
+            torch.Tensor: [C, H, W] 归一化后的tensor
+        """
+        resized = resize_uint8(image, self.size)
+        if out is None:
+            out = torch.empty((3, self.size, self.size), dtype=torch.float32)
+
+        channels = (2, 1, 0) if bgr else (0, 1, 2)
+        for dst, src in enumerate(channels):
+            # (x / 255 - mean) / std = x * scale - offset
+            torch.mul(resized[src], _SCALE[dst], out=out[dst])
+            out[dst].sub_(_OFFSET[dst])
+
+        return out
+
+
+def normalize_batch(images, device=None, dtype=torch.float32):
+    """
+    在消费端对整批 uint8 图片做归一化
+
+    先把 uint8 传到设备上再转换为浮点，主机到设备只传输 1/4 的数据量。
+
+    Args:
+        images: [B, C, H, W] uint8 RGB
+        device: 目标设备，为 None 时在原设备上计算
+        dtype: 输出类型
+
+    Returns:
+        [B, C, H, W] 归一化后的tensor
+    """
+    if device is not None:
+        images = images.to(device, non_blocking=True)
+
+    scale = torch.tensor(_SCALE, device=images.device, dtype=dtype).view(1, -1, 1, 1)
+    offset = torch.tensor(_OFFSET, device=images.device, dtype=dtype).view(1, -1, 1, 1)
+    return images.to(dtype).mul_(scale).sub_(offset)
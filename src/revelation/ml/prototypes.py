@@ -0,0 +1,85 @@
+"""
+Gallery 原型压缩模块
+
+将每个label的全部嵌入聚类为少量原型，用原型代替全量gallery检索。
+"""
+
+import os
+
+import torch
+
+from .index import spherical_kmeans, group_by, fingerprint
+from .gallery import save_gallery_cache
+
+GALLERY_PROTOTYPES = int(os.getenv('GALLERY_PROTOTYPES', 0))
+PROTOTYPE_RERANK = int(os.getenv('PROTOTYPE_RERANK', 0))
+
+
+def compact_gallery(embs, label_ids, num_labels, k_per_class):
+    """
+    按label聚类压缩gallery
+
+    Args:
+        embs: 归一化的gallery嵌入 [G, D]
+        label_ids: 每个gallery条目的label下标 [G]
+        num_labels: label总数
+        k_per_class: 每个label最多保留的原型数
+
+    Returns:
+        proto_embs: 原型嵌入 [P, D]
+        proto_label_ids: 每个原型的label下标 [P]
+    """
+    order, offsets = group_by(label_ids, num_labels)
+    offsets = offsets.tolist()
+
+    proto_embs = []
+    proto_label_ids = []
+    for label_id in range(num_labels):
+        members = embs[order[offsets[label_id]:offsets[label_id + 1]]].float()
+        if len(members) > k_per_class:
+            members = spherical_kmeans(members, k_per_class, iters=10)
+        proto_embs.append(members)
+        proto_label_ids.extend([label_id] * len(members))
+
+    return torch.cat(proto_embs).to(embs.dtype), torch.tensor(proto_label_ids, dtype=torch.long)
+
+
+def load_or_build_prototypes(cache_path, embs, label_ids, label_names, k_per_class, data=None):
+    """
+    从gallery缓存读取原型，缺失或过期时重新压缩并写回缓存
+
+    Args:
+        cache_path: gallery缓存路径
+        embs/label_ids/label_names: 完整gallery及其label索引
+        k_per_class: 每个label最多保留的原型数
+        data: 已加载的gallery缓存内容，为 None 时从 cache_path 读取
+
+    Returns:
+        proto_embs, proto_label_ids
+    """
+    if data is None and os.path.exists(cache_path):
+        data = torch.load(cache_path, map_location="cpu")
+    cached = data.get("prototypes") if data else None
+
+    if (cached and cached["k"] == k_per_class
+            and tuple(cached["fingerprint"]) == fingerprint(embs)
+            and cached["label_names"] == label_names):
+        print(f"[Prototypes] Loaded {len(cached['label_ids'])} prototypes from cache")
+        return cached["embs"], cached["label_ids"]
+
+    print(f"[Prototypes] Compacting gallery to at most {k_per_class} prototypes per label...")
+    proto_embs, proto_label_ids = compact_gallery(embs, label_ids, len(label_names), k_per_class)
+    print(f"[Prototypes] {embs.shape[0]} gallery items -> {proto_embs.shape[0]} prototypes")
+
+    if data is not None:
+        data["prototypes"] = {
+            "k": k_per_class,
+            "fingerprint": fingerprint(embs),
+            "label_names": label_names,
+            "embs": proto_embs,
+            "label_ids": proto_label_ids,
+        }
+        save_gallery_cache(data, cache_path)
+        print(f"[Prototypes] Prototypes saved to {cache_path}")
+
+    return proto_embs, proto_label_ids
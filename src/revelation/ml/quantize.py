@@ -0,0 +1,121 @@
+"""
+Gallery 嵌入量化模块 - 支持 fp16 和逐向量缩放的 int8 存储与检索
+"""
+
+import os
+
+import torch
+
+from .search import fingerprint
+from .gallery import save_gallery_cache
+
+GALLERY_PRECISION = os.getenv('GALLERY_PRECISION', 'fp32').lower()
+GALLERY_RERANK = int(os.getenv('GALLERY_RERANK', 0))
+
+PRECISIONS = ("fp32", "fp16", "int8")
+
+# 分块反量化的行数，控制临时 float32 缓冲区大小（8192 x 512 x 4B = 16MB）
+_CHUNK_SIZE = 8192
+
+
+def quantize_embeddings(embs, precision):
+    """
+    量化gallery嵌入
+
+    Args:
+        embs: 嵌入向量 [G, D]（float32）
+        precision: 'fp32'、'fp16' 或 'int8'
+
+    Returns:
+        values: 量化后的嵌入 [G, D]
+        scales: int8 时为逐向量缩放系数 [G]（float32），否则为 None
+    """
+    if precision == "fp32":
+        return embs.float(), None
+    if precision == "fp16":
+        return embs.half(), None
+    if precision == "int8":
+        embs = embs.float()
+        scales = embs.abs().amax(dim=1).clamp_min(1e-12) / 127.0
+        values = torch.round(embs / scales.unsqueeze(1)).clamp_(-127, 127).to(torch.int8)
+        return values, scales
+
+    raise ValueError(f"Unknown GALLERY_PRECISION: {precision}. Use one of {PRECISIONS}.")
+
+
+def dequantize_embeddings(values, scales=None):
+    """将量化嵌入还原为 float32"""
+    embs = values.float()
+    if scales is not None:
+        embs = embs * scales.unsqueeze(1)
+    return embs
+
+
+def quantized_scores(query_embs, values, scales=None):
+    """
+    直接在量化表示上计算相似度
+
+    float32 gallery 直接矩阵乘；fp16/int8 按块转换为 float32 后做矩阵乘，
+    int8 的逐向量缩放在矩阵乘之后乘到相似度上，不需要还原整个gallery。
+
+    Args:
+        query_embs: 查询嵌入 [B, D]（float32）
+        values: gallery嵌入 [G, D]
+        scales: int8 的逐向量缩放系数 [G]
+
+    Returns:
+        相似度矩阵 [B, G]（float32）
+    """
+    if values.dtype == query_embs.dtype and scales is None:
+        return torch.matmul(query_embs, values.T)
+
+    count = values.shape[0]
+    sims = query_embs.new_empty((query_embs.shape[0], count))
+    for start in range(0, count, _CHUNK_SIZE):
+        end = min(start + _CHUNK_SIZE, count)
+        torch.matmul(query_embs, values[start:end].float().T, out=sims[:, start:end])
+        if scales is not None:
+            sims[:, start:end] *= scales[start:end]
+
+    return sims
+
+
+def load_or_build_quantized(cache_path, embs, precision, data=None):
+    """
+    从gallery缓存读取量化嵌入，缺失或过期时重新量化并写回缓存
+
+    Args:
+        cache_path: gallery缓存路径，为 None 时不读写缓存
+        embs: 待量化的 float32 嵌入 [G, D]
+        precision: 'fp32'、'fp16' 或 'int8'
+        data: 已加载的gallery缓存内容，为 None 时从 cache_path 读取
+
+    Returns:
+        values, scales
+    """
+    if precision == "fp32":
+        return quantize_embeddings(embs, precision)
+
+    if data is None and cache_path and os.path.exists(cache_path):
+        data = torch.load(cache_path, map_location="cpu")
+    cached = data.get("quantized") if data else None
+
+    if (cached and cached["precision"] == precision
+            and tuple(cached["fingerprint"]) == fingerprint(embs)):
+        print(f"[Quantize] Loaded {precision} gallery from cache")
+        return cached["values"], cached["scales"]
+
+    values, scales = quantize_embeddings(embs, precision)
+    print(f"[Quantize] Quantized {values.shape[0]} gallery items to {precision}")
+
+    if data is not None:
+        data["quantized"] = {
+            "precision": precision,
+            "fingerprint": fingerprint(embs),
+            "values": values,
+            "scales": scales,
+        }
+        save_gallery_cache(data, cache_path)
+        print(f"[Quantize] Quantized gallery saved to {cache_path}")
+
+    return values, scales
@@ -0,0 +1,129 @@
+"""
+热重载模块
+
+管理员接口或文件变化触发后，在后台线程中构建新快照并原子替换（见 loader.load_model），
+替换期间服务继续使用旧快照处理请求。
+"""
+
+import os
+import asyncio
+
+from . import loader
+from .cache import get_result_cache
+from .predictor import warm_up
+from .worker_pool import get_worker_pool
+from ..startup import log_timings
+
+RELOAD_WATCH_INTERVAL = float(os.getenv('RELOAD_WATCH_INTERVAL', 0))
+
+_watcher = None
+
+
+async def trigger_reload():
+    """
+    在后台重新加载模型和gallery
+
+    Returns:
+        新快照的版本号；已有重新加载在进行中时返回 None
+    """
+    pool = get_worker_pool()
+    if loader.is_reloading() or (pool is not None and pool.reloading):
+        return None
+
+    print("[Reload] Reloading model and gallery...")
+    if pool is not None:
+        # 多进程模式下模型在推理进程中，逐个进程重新加载
+        version = await pool.reload()
+    else:
+        # 新快照在生效前预热，重新加载后的首批请求同样不受冷启动影响
+        version = await asyncio.to_thread(loader.load_model, False, warm_up)
+    if version is not None:
+        # 缓存键包含版本号，旧版本的结果不会再被命中，这里只是释放内存
+        get_result_cache().clear()
+        log_timings("[Reload]")
+        print(f"[Reload] ✓ Reloaded, active version {version}")
+    return version
+
+
+def _signatures(paths):
+    """文件的 (大小, 修改时间ns)，不存在时为 None"""
+    signatures = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signatures.append(None)
+        else:
+            signatures.append((stat.st_size, stat.st_mtime_ns))
+    return signatures
+
+
+class FileWatcher:
+    """
+    轮询模型和gallery缓存文件，发生变化后触发重新加载
+
+    文件需在两次轮询之间保持不变才会触发，避免读到写了一半的文件。
+    """
+
+    def __init__(self, interval):
+        """
+        Args:
+            interval: 轮询间隔（秒）
+        """
+        self.interval = interval
+        self._task = None
+
+    async def start(self):
+        """启动后台轮询任务"""
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台轮询任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loaded = _signatures(loader.get_watched_paths())
+        pending = None
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            current = _signatures(loader.get_watched_paths())
+            if current == loaded:
+                pending = None
+                continue
+            if current != pending:
+                pending = current
+                continue
+
+            # 重新加载本身可能重写缓存文件（如 mmap 缓存），以加载完成后的状态为准
+            try:
+                if await trigger_reload() is not None:
+                    loaded = _signatures(loader.get_watched_paths())
+                    pending = None
+            except Exception as e:
+                print(f"[Reload] ✗ Reload failed, keeping current snapshot: {e}")
+                loaded = current
+                pending = None
+
+
+def get_watcher():
+    """获取文件变化监视器，RELOAD_WATCH_INTERVAL 为 0 时返回 None"""
+    global _watcher
+
+    if RELOAD_WATCH_INTERVAL <= 0:
+        return None
+
+    if _watcher is None:
+        _watcher = FileWatcher(RELOAD_WATCH_INTERVAL)
+
+    return _watcher
@@ -0,0 +1,84 @@
+"""
+相似度检索与按label聚合模块
+"""
+
+import torch
+
+
+def build_label_index(labels):
+    """
+    将gallery标签列表编码为整数索引（在gallery加载时构建一次）
+
+    Args:
+        labels: gallery标签列表，与嵌入向量一一对应
+
+    Returns:
+        label_names: 去重后的label列表（按首次出现顺序）
+        label_ids: 每个gallery条目对应的label下标 [G]（int64）
+    """
+    label_to_id = {}
+    ids = []
+    for label in labels:
+        idx = label_to_id.get(label)
+        if idx is None:
+            idx = label_to_id[label] = len(label_to_id)
+        ids.append(idx)
+
+    return list(label_to_id), torch.tensor(ids, dtype=torch.long)
+
+
+def fingerprint(embs):
+    """gallery嵌入的指纹（条目数 + 抽样求和），用于判断索引缓存是否过期"""
+    step = max(1, embs.shape[0] // 4096)
+    return embs.shape[0], round(float(embs[::step].double().sum()), 6)
+
+
+def topk_per_label(sims, label_ids, num_labels, k):
+    """
+    每个label取最高相似度，再取Top-K（scatter_reduce 分段最大值 + topk）
+
+    Args:
+        sims: 相似度矩阵 [B, G]
+        label_ids: 每个gallery条目的label下标 [G]
+        num_labels: label总数
+        k: 返回的label数量
+
+    Returns:
+        scores: [B, k'] 降序相似度，k' = min(k, num_labels)
+        idxs: [B, k'] 对应的label下标
+    """
+    batch_size = sims.shape[0]
+    per_label = sims.new_full((batch_size, num_labels), float("-inf"))
+    per_label.scatter_reduce_(
+        1,
+        label_ids.unsqueeze(0).expand(batch_size, -1),
+        sims,
+        reduce="amax",
+        include_self=True
+    )
+    return per_label.topk(min(k, num_labels), dim=1)
+
+
+def topk_per_label_loop(sims, labels, k):
+    """
+    逐条排序去重的参考实现（原 predict_image 中的循环，用于基准对比）
+
+    Args:
+        sims: 单个查询的相似度 [G]
+        labels: gallery标签列表
+        k: 返回的label数量
+
+    Returns:
+        [(label, score), ...]
+    """
+    all_idxs = torch.argsort(sims, descending=True)
+
+    seen = {}
+    for idx in all_idxs.tolist():
+        label = labels[idx]
+        if label not in seen:
+            seen[label] = sims[idx].item()
+            if len(seen) >= k:
+                break
+
+    return sorted(seen.items(), key=lambda x: x[1], reverse=True)[:k]
@@ -0,0 +1,426 @@
+"""
+Gallery 分片检索模块
+
+gallery按label划分为若干分片（按label哈希或按label排序后的区间），同一个label的全部条目只在一个分片中，
+因此各分片返回的按label Top-K 合并后取 Top-K 即为全局结果（与不分片的检索一致）。
+
+分片检索器:
+    LocalShard   - 当前进程内的检索索引
+    ProcessShard - 子进程持有一个分片（单机多进程，用于替代多节点部署或测试）
+    HttpShard    - 另一个以 GALLERY_SHARD 启动的 Revelation 实例（POST /shard/search）
+ShardedIndex 并发地把查询嵌入发给所有分片，再合并结果，接口与 SearchIndex 相同。
+"""
+
+import os
+import json
+import zlib
+import weakref
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from .index import create_index, RerankIndex, SEARCH_INDEX
+from .search import build_label_index
+
+GALLERY_SHARD = os.getenv('GALLERY_SHARD', '')
+SHARD_BY = os.getenv('SHARD_BY', 'hash').lower()
+SHARD_PROCESSES = int(os.getenv('SHARD_PROCESSES', 0))
+SHARD_URLS = [url.strip().rstrip("/") for url in os.getenv('SHARD_URLS', '').split(",") if url.strip()]
+SHARD_TIMEOUT = float(os.getenv('SHARD_TIMEOUT', 5))
+# /shard/search 的共享密钥：分片实例要求请求携带，协调器随请求发送（X-Shard-Token）
+SHARD_TOKEN = os.getenv('SHARD_TOKEN', '')
+# /shard/search 单个请求的查询数和 top_k 上限
+SHARD_MAX_QUERIES = int(os.getenv('SHARD_MAX_QUERIES', 256))
+SHARD_MAX_TOP_K = int(os.getenv('SHARD_MAX_TOP_K', 50))
+
+SHARD_METHODS = ("hash", "range")
+
+
+def parse_shard(spec=GALLERY_SHARD):
+    """
+    解析 "i/n" 形式的分片配置
+
+    Returns:
+        (i, n)；未配置时为 None
+    """
+    if not spec:
+        return None
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid GALLERY_SHARD: {spec!r}. Use 'index/count', e.g. '0/4'.")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid GALLERY_SHARD: {spec!r}. Shard index must be in [0, count).")
+    return index, count
+
+
+def shard_path(path, shard):
+    """分片专用的缓存路径（如 aethersight_gallery.shard0-4.bin），未分片时不变"""
+    if shard is None:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.shard{shard[0]}-{shard[1]}{ext}"
+
+
+def assign_shards(label_names, count, method=SHARD_BY):
+    """
+    计算每个label所属的分片
+
+    hash 按 label 的 crc32 取模（与进程、gallery内容无关，新增label不会移动已有label）；
+    range 按 label 排序后切成 count 个连续区间（各分片label数均衡）。
+
+    Returns:
+        [num_labels] 的分片下标（int64）
+    """
+    if method == "hash":
+        return torch.tensor([zlib.crc32(name.encode("utf-8")) % count for name in label_names], dtype=torch.long)
+
+    if method == "range":
+        order = sorted(range(len(label_names)), key=lambda i: label_names[i])
+        shards = torch.empty(len(label_names), dtype=torch.long)
+        for position, i in enumerate(order):
+            shards[i] = position * count // max(1, len(label_names))
+        return shards
+
+    raise ValueError(f"Unknown SHARD_BY: {method}. Use one of {SHARD_METHODS}.")
+
+
+def select_shard(embs, labels, shard, method=SHARD_BY):
+    """
+    只保留属于分片 shard=(i, n) 的gallery条目
+
+    Returns:
+        embs, labels
+    """
+    index, count = shard
+    label_names, label_ids = build_label_index(labels)
+    keep = (assign_shards(label_names, count, method)[label_ids] == index).nonzero(as_tuple=True)[0]
+    print(f"[Shard] Keeping {len(keep)}/{len(label_ids)} gallery items for shard {index}/{count} ({method})")
+    return embs[keep], [labels[i] for i in keep.tolist()]
+
+
+class LocalShard:
+    """当前进程内的检索索引"""
+
+    def __init__(self, index, label_names):
+        self.index = index
+        self.label_names = label_names
+        self.name = "local"
+
+    def search(self, query_embs, top_k):
+        """
+        Returns:
+            scores: [B, k] 降序相似度
+            labels: 每个查询的 k 个label名
+        """
+        scores, idxs = self.index.search(query_embs, top_k)
+        return scores, [[self.label_names[i] for i in row] for row in idxs.tolist()]
+
+
+def _shard_process_main(conn, values, label_ids, label_names, scales, kind, cache_path, rerank_gallery, rerank):
+    """分片子进程：按与主进程相同的配置创建检索索引，接收查询嵌入，返回分片内按label的 Top-K"""
+    index = create_index(values, label_ids, len(label_names), kind=kind, cache_path=cache_path, scales=scales)
+    if rerank > 0:
+        embs, full_label_ids = rerank_gallery
+        index = RerankIndex(index, embs, full_label_ids, len(label_names), rerank=rerank)
+    shard = LocalShard(index, label_names)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            # 父进程退出
+            break
+        if request is None:
+            break
+        query_embs, top_k = request
+        try:
+            conn.send(("ok", shard.search(query_embs, top_k)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+def _stop_process(process, conn):
+    try:
+        conn.send(None)
+    except (OSError, ValueError):
+        pass
+    process.join(5)
+    if process.is_alive():
+        process.terminate()
+
+
+class ProcessShard:
+    """
+    子进程持有的分片
+
+    分片数据在创建子进程时通过共享内存传递（torch.multiprocessing），不经过序列化复制。
+    子进程内的检索索引与主进程一致（SEARCH_INDEX、重排）。快照被替换且不再被引用时子进程自动退出。
+    """
+
+    def __init__(self, values, label_ids, label_names, scales=None, name="process", kind=SEARCH_INDEX,
+                 cache_path=None, rerank_gallery=None, rerank=0):
+        """
+        Args:
+            values/label_ids/label_names/scales: 分片的粗检索gallery（label_ids 为分片内的label下标）
+            name: 分片名称
+            kind: 检索索引类型（见 create_index）
+            cache_path: 近似索引的缓存路径
+            rerank_gallery: 重排使用的分片内完整 float32 gallery (embs, label_ids)
+            rerank: 参与重排的候选label数量，0 不重排
+        """
+        import torch.multiprocessing as tmp
+
+        ctx = tmp.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._lock = threading.Lock()
+        self.name = name
+        self.process = ctx.Process(
+            target=_shard_process_main,
+            args=(child_conn, values.share_memory_(), label_ids.share_memory_(), label_names,
+                  scales.share_memory_() if scales is not None else None, kind, cache_path,
+                  tuple(t.share_memory_() for t in rerank_gallery) if rerank > 0 else None, rerank),
+            name=f"revelation-{name}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        weakref.finalize(self, _stop_process, self.process, self._conn)
+
+    def search(self, query_embs, top_k):
+        with self._lock:
+            self._conn.send((query_embs, top_k))
+            status, result = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Shard {self.name} failed: {result}")
+        return result
+
+
+class HttpShard:
+    """另一个 Revelation 实例上的分片（POST /shard/search）"""
+
+    def __init__(self, url, size, timeout=SHARD_TIMEOUT, token=SHARD_TOKEN):
+        """
+        Args:
+            url: 实例的根地址，如 http://10.0.0.2:5000
+            size: 查询嵌入对应的输入分辨率（对端据此选择主gallery或快速路径gallery）
+            timeout: 请求超时（秒）
+            token: 对端的 SHARD_TOKEN
+        """
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.token = token
+        self.name = url
+
+    def search(self, query_embs, top_k):
+        body = json.dumps({
+            "embeddings": query_embs.tolist(),
+            "top_k": top_k,
+            "size": self.size,
+        }).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["X-Shard-Token"] = self.token
+        request = urllib.request.Request(
+            f"{self.url}/shard/search",
+            data=body,
+            headers=headers,
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                result = json.loads(response.read().decode("utf-8"))
+        except Exception as e:
+            raise RuntimeError(f"Shard {self.url} failed: {e}")
+        return torch.tensor(result["scores"], dtype=torch.float32).reshape(len(query_embs), -1), result["labels"]
+
+
+def merge_results(results, top_k):
+    """
+    合并各分片的按label Top-K
+
+    Args:
+        results: [(scores [B, k_s], labels [B][k_s]), ...]
+        top_k: 返回的label数量
+
+    Returns:
+        scores: [B, k] 降序相似度
+        labels: 每个查询的 k 个label名
+    """
+    scores = torch.cat([shard_scores for shard_scores, _ in results], dim=1)
+    labels = [sum(rows, []) for rows in zip(*(shard_labels for _, shard_labels in results))]
+
+    k = min(top_k, scores.shape[1])
+    top_scores, positions = scores.topk(k, dim=1)
+    top_labels = [[row[p] for p in row_positions] for row, row_positions in zip(labels, positions.tolist())]
+    return top_scores, top_labels
+
+
+class ShardedIndex:
+    """
+    分片检索协调器，接口与 SearchIndex 相同
+
+    远程分片返回的label不一定在本地gallery中，label表（label_names）随检索结果追加，
+    返回的下标指向这张表；快照的 label_names 使用同一个列表。
+    """
+
+    def __init__(self, shards, label_names):
+        """
+        Args:
+            shards: 分片检索器列表（LocalShard / ProcessShard / HttpShard）
+            label_names: 本地gallery的label列表（复制后作为初始label表）
+        """
+        self.shards = shards
+        self.label_names = list(label_names)
+        self._label_to_id = {name: i for i, name in enumerate(self.label_names)}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="shard-search")
+        self.name = "sharded[" + ",".join(shard.name for shard in shards) + "]"
+
+    def _label_id(self, name):
+        idx = self._label_to_id.get(name)
+        if idx is None:
+            with self._lock:
+                idx = self._label_to_id.get(name)
+                if idx is None:
+                    # 先追加到列表再登记下标，读取方拿到下标时列表中一定已有该label
+                    self.label_names.append(name)
+                    idx = self._label_to_id[name] = len(self.label_names) - 1
+        return idx
+
+    def search(self, query_embs, top_k, remote=True):
+        """
+        Args:
+            remote: 为 False 时只检索本进程/本机的分片（用于响应其他实例的 /shard/search）
+        """
+        shards = [shard for shard in self.shards if remote or not isinstance(shard, HttpShard)]
+        if len(shards) == 1:
+            results = [shards[0].search(query_embs, top_k)]
+        else:
+            results = list(self._pool.map(lambda shard: shard.search(query_embs, top_k), shards))
+
+        scores, labels = merge_results(results, top_k)
+        idxs = torch.tensor([[self._label_id(name) for name in row] for row in labels], dtype=torch.long)
+        return scores, idxs.reshape(scores.shape)
+
+
+def search_shard(snapshot, embeddings, top_k):
+    """
+    只在本实例的分片上检索（响应其他实例的 /shard/search，不再向远程分片扇出）
+
+    Args:
+        snapshot: 与查询嵌入分辨率一致的快照
+        embeddings: 归一化的查询嵌入 [B][D]
+        top_k: 返回的label数量
+
+    Returns:
+        scores: [B][k] 降序相似度
+        labels: 每个查询的 k 个label名
+    """
+    if not 1 <= top_k <= SHARD_MAX_TOP_K:
+        raise ValueError(f"top_k must be between 1 and {SHARD_MAX_TOP_K}")
+    if not 1 <= len(embeddings) <= SHARD_MAX_QUERIES:
+        raise ValueError(f"Between 1 and {SHARD_MAX_QUERIES} embeddings per request")
+    query_embs = torch.tensor(embeddings, dtype=torch.float32)
+    dim = snapshot.gallery_embs.shape[1]
+    if query_embs.dim() != 2 or query_embs.shape[1] != dim:
+        raise ValueError(f"Embeddings must have shape [B, {dim}]")
+
+    search_index = snapshot.search_index
+    if isinstance(search_index, ShardedIndex):
+        scores, idxs = search_index.search(query_embs, top_k, remote=False)
+    else:
+        scores, idxs = search_index.search(query_embs, top_k)
+    return scores.tolist(), [[snapshot.label_names[i] for i in row] for row in idxs.tolist()]
+
+
+def split_process_shards(values, label_ids, label_names, scales, count, method=SHARD_BY,
+                         kind=SEARCH_INDEX, cache_path=None, rerank_gallery=None, rerank=0):
+    """
+    按label把gallery拆成 count 个子进程分片（没有分到label的分片不创建）
+
+    Args:
+        values/label_ids/label_names/scales: 粗检索gallery
+        count: 子进程数
+        method: 分片方式
+        kind: 子进程内的检索索引类型
+        cache_path: 近似索引的缓存路径，每个子进程分片单独保存（如 aethersight_gallery.ivf.process0-4.pth）
+        rerank_gallery: 重排使用的完整 float32 gallery (embs, label_ids)，按同样的label拆分
+        rerank: 参与重排的候选label数量，0 不重排
+
+    Returns:
+        [ProcessShard, ...]
+    """
+    label_shards = assign_shards(label_names, count, method)
+    shard_of = label_shards[label_ids]
+    full_shard_of = label_shards[rerank_gallery[1]] if rerank > 0 else None
+    shards = []
+    for i in range(count):
+        rows = (shard_of == i).nonzero(as_tuple=True)[0]
+        if len(rows) == 0:
+            continue
+        local_ids = label_ids[rows]
+        used = torch.unique(local_ids)
+        remap = torch.full((len(label_names),), -1, dtype=torch.long)
+        remap[used] = torch.arange(len(used))
+
+        shard_rerank = None
+        if rerank > 0:
+            full_rows = (full_shard_of == i).nonzero(as_tuple=True)[0]
+            shard_rerank = (rerank_gallery[0][full_rows].contiguous(), remap[rerank_gallery[1][full_rows]])
+
+        shard_cache_path = None
+        if cache_path:
+            base, ext = os.path.splitext(cache_path)
+            shard_cache_path = f"{base}.process{i}-{count}{ext}"
+
+        shards.append(ProcessShard(
+            values[rows].contiguous(),
+            remap[local_ids],
+            [label_names[j] for j in used.tolist()],
+            scales[rows].contiguous() if scales is not None else None,
+            name=f"shard-{i}",
+            kind=kind,
+            cache_path=shard_cache_path,
+            rerank_gallery=shard_rerank,
+            rerank=rerank
+        ))
+    return shards
+
+
+def create_sharded_index(search_index, values, label_ids, label_names, scales, size,
+                         index_cache_path=None, rerank_gallery=None, rerank=0):
+    """
+    按 SHARD_PROCESSES / SHARD_URLS 配置创建分片检索协调器，未配置时原样返回 search_index
+
+    Args:
+        search_index: 本地gallery的检索索引
+        values/label_ids/label_names/scales: 本地粗检索gallery（拆分到子进程时使用）
+        size: 输入分辨率
+        index_cache_path: 本地近似索引的缓存路径（子进程分片在其旁边单独保存）
+        rerank_gallery: 重排使用的完整 float32 gallery (embs, label_ids)
+        rerank: 参与重排的候选label数量，0 不重排
+
+    Returns:
+        SearchIndex 或 ShardedIndex
+    """
+    if SHARD_PROCESSES <= 1 and not SHARD_URLS:
+        return search_index
+
+    if SHARD_PROCESSES > 1:
+        # 本地gallery再按label拆到多个子进程，子进程内使用与 search_index 相同的索引和重排
+        shards = split_process_shards(
+            values, label_ids, label_names, scales, SHARD_PROCESSES,
+            cache_path=index_cache_path, rerank_gallery=rerank_gallery, rerank=rerank
+        )
+        print(f"[Shard] Split local gallery across {len(shards)} search processes")
+    else:
+        shards = [LocalShard(search_index, label_names)]
+
+    shards += [HttpShard(url, size) for url in SHARD_URLS]
+    if SHARD_URLS:
+        print(f"[Shard] Fanning out to {len(SHARD_URLS)} remote shards: {', '.join(SHARD_URLS)}")
+
+    return ShardedIndex(shards, label_names)
@@ -0,0 +1,535 @@
+"""
+多进程推理工作池
+
+SERVING_MODE=process 时 FastAPI 前端进程不加载模型，/predict 和 /predict/batch 的解码、预处理、
+前向和检索交给 WORKER_PROCESSES 个推理进程完成：
+    - 每个进程绑定一组 CPU 核心，PyTorch / onnxruntime 算子内线程数等于绑定的核心数
+    - gallery 使用 mmap 缓存格式（见 gallery_store），各进程共享同一份物理内存页
+    - 每个进程从自己的任务队列中一次取出多个排队请求，合并为一个批次前向
+    - 所有进程排队的图片数都达到 WORKER_MAX_PENDING 时直接拒绝新请求（503），不无限排队
+前端只负责收发请求，结果在前端补充同模装备信息。
+"""
+
+import os
+import time
+import queue
+import signal
+import asyncio
+import itertools
+import threading
+import multiprocessing as mp
+
+SERVING_MODE = os.getenv('SERVING_MODE', 'thread').lower()
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', 2))
+WORKER_PIN_CORES = os.getenv('WORKER_PIN_CORES', 'true').lower() == 'true'
+WORKER_MAX_PENDING = int(os.getenv('WORKER_MAX_PENDING', 32))
+# 检查推理进程是否意外退出的间隔（秒），与结果队列是否空闲无关
+WORKER_CHECK_INTERVAL = float(os.getenv('WORKER_CHECK_INTERVAL', 0.5))
+# 单个推理进程重新加载的最长等待时间（秒），超时视为失败并重启该进程
+WORKER_RELOAD_TIMEOUT = float(os.getenv('WORKER_RELOAD_TIMEOUT', 600))
+
+SERVING_MODES = ("thread", "process")
+
+_pool = None
+
+
+class WorkerPoolBusy(RuntimeError):
+    """所有推理进程都已排满（或没有就绪的推理进程）"""
+
+
+def assign_cores(num_workers):
+    """
+    把当前进程可用的核心平均分给各推理进程
+
+    Returns:
+        每个进程的核心列表；平台不支持绑核时为 None
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * num_workers
+
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < num_workers:
+        # 核心数少于进程数时轮流共用
+        return [[cores[i % len(cores)]] for i in range(num_workers)]
+
+    per_worker = len(cores) // num_workers
+    return [cores[i * per_worker:(i + 1) * per_worker] for i in range(num_workers)]
+
+
+def _run_jobs(batch):
+    """
+    对一组 predict 任务做一次前向和检索
+
+    Returns:
+        [(job_id, outcome), ...]，outcome 为 ("ok", 每张图片的 [(label, score), ...])、
+        ("decode", 无法解码的图片下标) 或 ("error", 错误信息)
+    """
+    import torch
+    from . import loader
+    from .predictor import preprocess_images, search_queries, ImageDecodeError
+
+    snapshot = loader.get_snapshot()
+    outcomes = {}
+    queries = []
+    owners = []
+
+    for _, job_id, images, top_k in batch:
+        try:
+            queries.append(preprocess_images(images, snapshot))
+            owners.append((job_id, len(images), top_k))
+        except ImageDecodeError as e:
+            outcomes[job_id] = ("decode", e.index)
+        except Exception as e:
+            outcomes[job_id] = ("error", str(e))
+
+    if owners:
+        if isinstance(queries[0], tuple):
+            merged = tuple(torch.cat(group) for group in zip(*queries))
+        else:
+            merged = torch.cat(queries)
+
+        try:
+            ranked = search_queries(merged, max(top_k for _, _, top_k in owners), snapshot)
+        except Exception as e:
+            for job_id, _, _ in owners:
+                outcomes[job_id] = ("error", str(e))
+        else:
+            start = 0
+            for job_id, count, top_k in owners:
+                outcomes[job_id] = ("ok", [final[:top_k] for final in ranked[start:start + count]])
+                start += count
+
+    return [(msg[1], outcomes[msg[1]]) for msg in batch]
+
+
+def _worker_main(worker_id, cores, jobs, results):
+    """推理进程入口"""
+    # Ctrl-C 由前端进程处理，前端负责通知推理进程退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if cores is not None:
+        os.sched_setaffinity(0, cores)
+
+    from . import loader, executor
+    from .batcher import BATCH_MAX_SIZE
+    from .predictor import warm_up
+
+    if cores is not None and executor.INFERENCE_THREADS_AUTO:
+        executor.INFERENCE_THREADS = len(cores)
+        loader.INFERENCE_THREADS = len(cores)
+    executor.configure_threads()
+    # 各进程映射同一个 gallery 文件，而不是各自读入一份
+    loader.GALLERY_FORMAT = "mmap"
+
+    try:
+        loader.load_model(prepare=warm_up)
+    except Exception as e:
+        results.put(("failed", worker_id, str(e)))
+        return
+    results.put(("ready", worker_id, os.getpid()))
+
+    parent = mp.parent_process()
+    pending = None
+    while True:
+        if pending is None:
+            try:
+                pending = jobs.get(timeout=1.0)
+            except queue.Empty:
+                # 前端进程意外退出时不会发送 stop 消息
+                if parent is not None and not parent.is_alive():
+                    break
+                continue
+        msg, pending = pending, None
+
+        if msg[0] == "stop":
+            break
+
+        if msg[0] == "reload":
+            try:
+                loader.load_model(prepare=warm_up)
+            except Exception as e:
+                results.put(("reloaded", worker_id, str(e)))
+            else:
+                results.put(("reloaded", worker_id, None))
+            continue
+
+        # 微批：取出已排队的请求一起前向，遇到控制消息时先处理完当前批次
+        batch = [msg]
+        count = len(msg[2])
+        while count < BATCH_MAX_SIZE:
+            try:
+                msg = jobs.get_nowait()
+            except queue.Empty:
+                break
+            if msg[0] != "predict":
+                pending = msg
+                break
+            batch.append(msg)
+            count += len(msg[2])
+
+        for job_id, outcome in _run_jobs(batch):
+            results.put(("result", worker_id, job_id, outcome))
+
+
+def _resolve(future, result=None, exception=None):
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class _Worker:
+    """前端记录的单个推理进程状态"""
+
+    def __init__(self, worker_id, cores):
+        self.worker_id = worker_id
+        self.cores = cores
+        self.process = None
+        self.jobs = None
+        self.ready = False
+        self.started = None
+        self.reloaded = None
+        # 进程持有的模型/gallery版本（进程池的版本号）
+        self.version = None
+        # job_id -> (future, 图片数)
+        self.pending = {}
+        self.load = 0
+        self.completed = 0
+
+
+class WorkerPool:
+    """
+    推理进程池（前端部分）
+
+    请求按排队图片数分配给最空闲的就绪进程；结果由后台线程从结果队列读出，
+    再回到事件循环中完成对应的 future。推理进程意外退出时，其未完成的请求以异常结束并重启该进程。
+    """
+
+    def __init__(self, num_workers=WORKER_PROCESSES, max_pending=WORKER_MAX_PENDING, pin_cores=WORKER_PIN_CORES,
+                 reload_timeout=WORKER_RELOAD_TIMEOUT):
+        """
+        Args:
+            num_workers: 推理进程数
+            max_pending: 每个进程最多排队的图片数，所有进程都排满时拒绝新请求
+            pin_cores: 是否把每个进程绑定到一组核心
+            reload_timeout: 单个进程重新加载的最长等待时间（秒）
+        """
+        self.num_workers = max(1, int(num_workers))
+        self.max_pending = max(1, int(max_pending))
+        self.reload_timeout = max(0.0, float(reload_timeout))
+
+        cores = assign_cores(self.num_workers) if pin_cores else [None] * self.num_workers
+        self._workers = [_Worker(i, cores[i]) for i in range(self.num_workers)]
+
+        # spawn：不在已经初始化了 PyTorch 线程池的进程上 fork
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._loop = None
+        self._reader = None
+        self._stopping = False
+
+        self.version = None
+        self.reloading = False
+        self._rejected = 0
+        self._restarts = 0
+
+    def _spawn(self, worker):
+        if worker.jobs is not None:
+            # 旧进程已退出，其队列中未读出的任务不再发送，否则退出时会一直等待写入管道
+            worker.jobs.cancel_join_thread()
+        worker.jobs = self._ctx.Queue()
+        worker.ready = False
+        worker.started = self._loop.create_future()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, worker.cores, worker.jobs, self._results),
+            # 非守护进程：首次加载时构建gallery需要创建 DataLoader 子进程
+            name=f"revelation-inference-{worker.worker_id}",
+            daemon=False
+        )
+        worker.process.start()
+        print(f"[Workers] Started inference worker {worker.worker_id} (pid {worker.process.pid}, "
+              f"cores {worker.cores if worker.cores is not None else 'all'})")
+
+    def _restart(self, worker):
+        """在事件循环中重启推理进程（启动时的加载失败由 start 处理，这里处理运行中的重启）"""
+        self._restarts += 1
+        self._spawn(worker)
+        worker.started.add_done_callback(lambda started: self._restarted(worker, started))
+
+    def _restarted(self, worker, started):
+        error = started.exception()
+        if error is None:
+            return
+        # 加载失败的进程保持退出状态，下一次重新加载时再重启
+        print(f"[Workers] ✗ {error}")
+        if worker.reloaded is not None:
+            _resolve(worker.reloaded, str(error))
+
+    @staticmethod
+    def _running(worker):
+        """进程存活且已加载完成（重启中、加载失败或已退出的进程返回 False）"""
+        return (worker.process is not None and worker.process.is_alive()
+                and worker.started.done() and worker.started.exception() is None)
+
+    async def start(self):
+        """启动推理进程并等待全部加载完成"""
+        if self._reader is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        # 进程就绪时记录其版本
+        self.version = 1
+        self._reader = threading.Thread(target=self._read_results, name="revelation-worker-results", daemon=True)
+        self._reader.start()
+
+        # 第一个进程先加载，按需导出模型、构建 mmap gallery；其余进程直接复用生成的文件
+        first, *rest = self._workers
+        self._spawn(first)
+        await first.started
+        for worker in rest:
+            self._spawn(worker)
+        await asyncio.gather(*(worker.started for worker in rest))
+
+    async def stop(self):
+        """通知推理进程退出，未完成的请求以异常结束"""
+        if self._reader is None:
+            return
+
+        self._stopping = True
+        for worker in self._workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.jobs.put(("stop",))
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            await asyncio.to_thread(worker.process.join, 10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            self._fail_pending(worker, RuntimeError("Worker pool stopped"))
+
+        await asyncio.to_thread(self._reader.join)
+        self._reader = None
+
+    async def submit(self, images, top_k):
+        """
+        提交一组图片并等待检索结果
+
+        Args:
+            images: 图片数据列表（bytes）
+            top_k: 每张图片返回的label数量
+
+        Returns:
+            (每张图片的 [(label, score), ...] 列表, 处理请求的进程持有的版本号)
+
+        Raises:
+            WorkerPoolBusy: 所有进程都已排满
+            ImageDecodeError: 某张图片无法解码
+        """
+        from .predictor import ImageDecodeError
+
+        count = len(images)
+        with self._lock:
+            candidates = [worker for worker in self._workers if worker.ready]
+            if not candidates:
+                self._rejected += 1
+                raise WorkerPoolBusy("No inference worker is ready")
+
+            worker = min(candidates, key=lambda w: w.load)
+            # 空闲进程总是接受请求，单个请求的图片数可以超过 max_pending
+            if worker.load > 0 and worker.load + count > self.max_pending:
+                self._rejected += 1
+                raise WorkerPoolBusy("All inference workers are busy")
+
+            job_id = next(self._job_ids)
+            future = self._loop.create_future()
+            worker.pending[job_id] = (future, count)
+            worker.load += count
+            # 重新加载消息排在已分配的任务之后，分配时的版本就是处理时的版本
+            version = worker.version
+
+        worker.jobs.put(("predict", job_id, list(images), top_k))
+        kind, value = await future
+
+        if kind == "decode":
+            raise ImageDecodeError(value)
+        if kind == "error":
+            raise RuntimeError(value)
+        return value, version
+
+    async def reload(self):
+        """
+        逐个重新加载推理进程，重新加载中的进程不再分配新请求，其余进程继续服务
+
+        某个进程失败时仍继续重新加载其余进程，结束时所有提供服务的进程持有同一版本：
+            - 全部失败：各进程仍为旧快照，版本号不变
+            - 部分失败：失败的进程仍持有旧快照，不再分配请求并被重启（重启后加载当前文件），版本号递增
+        未在运行的进程（重启中、加载失败后已退出）不发送重新加载消息，直接记为失败；
+        已退出的进程随后重启，重启中的进程本身就会加载当前文件。
+        单个进程超过 reload_timeout 秒未完成视为失败。
+
+        Returns:
+            新版本号；已有重新加载在进行中时返回 None
+
+        Raises:
+            RuntimeError: 有进程重新加载失败（部分失败时版本号已递增）
+        """
+        if self.reloading:
+            return None
+
+        self.reloading = True
+        target = self.version + 1
+        failed = {}
+        try:
+            for worker in self._workers:
+                if not self._running(worker):
+                    # 任务队列可能随重启被替换，发送的消息会丢失，也不会有进程回复
+                    failed[worker.worker_id] = "worker is not running"
+                    continue
+                with self._lock:
+                    worker.ready = False
+                    worker.reloaded = self._loop.create_future()
+                worker.jobs.put(("reload",))
+                try:
+                    error = await asyncio.wait_for(worker.reloaded, self.reload_timeout or None)
+                except asyncio.TimeoutError:
+                    error = f"reload timed out after {self.reload_timeout:g}s"
+                if error is not None:
+                    failed[worker.worker_id] = error
+                else:
+                    worker.version = target
+        finally:
+            # 部分失败时，失败的进程不再恢复服务
+            excluded = failed if len(failed) < self.num_workers else {}
+            with self._lock:
+                for worker in self._workers:
+                    if worker.worker_id in excluded:
+                        continue
+                    if self._running(worker):
+                        worker.ready = True
+            self.reloading = False
+
+        details = "; ".join(f"worker {worker_id}: {error}" for worker_id, error in failed.items())
+        if failed and len(failed) == self.num_workers:
+            raise RuntimeError(f"All inference workers failed to reload, still serving version {self.version}: {details}")
+
+        for worker_id in failed:
+            worker = self._workers[worker_id]
+            print(f"[Workers] ✗ Inference worker {worker_id} failed to reload, restarting it: {failed[worker_id]}")
+            if worker.process is None or not worker.started.done():
+                # 重启中，启动后加载的就是当前文件
+                continue
+            if worker.process.is_alive():
+                # 进程退出后由存活检查重启
+                worker.process.terminate()
+            else:
+                # 之前加载失败而退出的进程，存活检查不会重启它
+                self._restart(worker)
+
+        self.version = target
+        if failed:
+            raise RuntimeError(f"Reloaded to version {self.version}, but some inference workers failed "
+                               f"and are restarting: {details}")
+        return self.version
+
+    def _read_results(self):
+        """后台线程：读取推理进程的消息，并每隔 WORKER_CHECK_INTERVAL 秒检查进程是否意外退出"""
+        next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+        while not self._stopping:
+            try:
+                msg = self._results.get(timeout=max(0.0, next_check - time.monotonic()))
+            except queue.Empty:
+                msg = None
+
+            # 持续有结果时结果队列不会空闲，存活检查不能只在超时时进行
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+            if msg is None:
+                continue
+
+            kind, worker = msg[0], self._workers[msg[1]]
+            if kind == "result":
+                _, _, job_id, outcome = msg
+                with self._lock:
+                    entry = worker.pending.pop(job_id, None)
+                    if entry is None:
+                        continue
+                    future, count = entry
+                    worker.load -= count
+                    worker.completed += 1
+                self._loop.call_soon_threadsafe(_resolve, future, outcome)
+            elif kind == "ready":
+                with self._lock:
+                    worker.version = self.version
+                    worker.ready = True
+                print(f"[Workers] ✓ Inference worker {worker.worker_id} ready")
+                self._loop.call_soon_threadsafe(_resolve, worker.started, None)
+            elif kind == "failed":
+                error = RuntimeError(f"Inference worker {worker.worker_id} failed to load: {msg[2]}")
+                self._loop.call_soon_threadsafe(_resolve, worker.started, None, error)
+            elif kind == "reloaded":
+                self._loop.call_soon_threadsafe(_resolve, worker.reloaded, msg[2])
+
+    def _fail_pending(self, worker, error):
+        with self._lock:
+            pending = list(worker.pending.values())
+            worker.pending.clear()
+            worker.load = 0
+            worker.ready = False
+        for future, _ in pending:
+            self._loop.call_soon_threadsafe(_resolve, future, None, error)
+
+    def _check_workers(self):
+        """重启意外退出的推理进程（启动阶段加载失败的除外）"""
+        for worker in self._workers:
+            if self._stopping or worker.process is None or worker.process.is_alive():
+                continue
+            if not worker.started.done() or worker.started.exception() is not None:
+                continue
+
+            print(f"[Workers] ✗ Inference worker {worker.worker_id} exited "
+                  f"(code {worker.process.exitcode}), restarting")
+            self._fail_pending(worker, RuntimeError(f"Inference worker {worker.worker_id} exited"))
+            if worker.reloaded is not None:
+                self._loop.call_soon_threadsafe(_resolve, worker.reloaded, "worker exited")
+            # 新进程在事件循环中启动，先清空避免下一次检查重复重启
+            worker.process = None
+            self._loop.call_soon_threadsafe(self._restart, worker)
+
+    @property
+    def ready_workers(self):
+        return sum(worker.ready for worker in self._workers)
+
+    def stats(self):
+        """进程池运行指标"""
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "ready": self.ready_workers,
+                "max_pending": self.max_pending,
+                "pending": [worker.load for worker in self._workers],
+                "completed": sum(worker.completed for worker in self._workers),
+                "rejected": self._rejected,
+                "restarts": self._restarts,
+            }
+
+
+def get_worker_pool():
+    """获取全局推理进程池，SERVING_MODE 不是 process 时返回 None"""
+    global _pool
+
+    if SERVING_MODE not in SERVING_MODES:
+        raise ValueError(f"Unknown SERVING_MODE: {SERVING_MODE}. Use one of {SERVING_MODES}.")
+    if SERVING_MODE != "process":
+        return None
+
+    if _pool is None:
+        _pool = WorkerPool()
+
+    return _pool
@@ -0,0 +1,63 @@
+"""
+启动耗时统计
+
+按阶段（导入、模型构建、权重加载、gallery加载、预热等）累计耗时，启动完成后输出一行分解。
+阶段可以嵌套，外层阶段只计入不属于内层阶段的时间，各阶段之和即为总耗时。
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_timings = {}
+_local = threading.local()
+
+
+def record_phase(name, seconds):
+    """累加一个阶段的耗时"""
+    with _lock:
+        _timings[name] = _timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def phase(name):
+    """
+    统计代码块耗时并计入阶段 name
+
+        with phase("weight load"):
+            model.load_state_dict(...)
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+
+    start = time.perf_counter()
+    # 栈中记录每一层内层阶段的累计耗时
+    stack.append(0.0)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        record_phase(name, elapsed - nested)
+
+
+def get_timings():
+    """各阶段累计耗时（秒），按首次记录的顺序"""
+    with _lock:
+        return dict(_timings)
+
+
+def log_timings(prefix="[Startup]"):
+    """输出各阶段耗时并清空，之后的重新加载重新计时"""
+    with _lock:
+        timings = dict(_timings)
+        _timings.clear()
+
+    if not timings:
+        return
+    parts = [f"{name} {seconds:.2f}s" for name, seconds in timings.items()]
+    print(f"{prefix} Time: " + " | ".join(parts) + f" | total {sum(timings.values()):.2f}s")
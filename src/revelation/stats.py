@@ -0,0 +1,20 @@
+"""
+运行指标的统计工具
+
+推理调度器、反馈写入器等后台组件共用，不依赖 PyTorch。
+"""
+
+
+def latency_summary(samples):
+    """计算一组耗时样本（毫秒）的统计值"""
+    if not samples:
+        return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "avg": sum(ordered) / n,
+        "p50": ordered[(n - 1) // 2],
+        "p95": ordered[min(n - 1, int(n * 0.95))],
+        "max": ordered[-1],
+    }
@@ -0,0 +1,38 @@
+"""
+导出一致性测试：导出的 TorchScript / ONNX 模型与 eager 模型的嵌入误差在容差内
+
+使用 timm 的小型测试网络（随机初始化），不需要模型文件；未安装 onnx extra 时跳过 ONNX。
+"""
+
+import pytest
+import torch
+
+from revelation.ml.export import compare_embeddings, load_runtime, missing_onnx_modules
+from revelation.ml.model import EmbeddingModel
+
+# 与 `python -m revelation export --tolerance` 的默认值一致
+TOLERANCE = 1e-3
+SIZE = 64
+
+_onnx = pytest.param("onnx", marks=pytest.mark.skipif(
+    bool(missing_onnx_modules()), reason="onnx extra not installed"))
+
+
+@pytest.fixture(scope="module")
+def eager():
+    torch.manual_seed(0)
+    model = EmbeddingModel(model_name="test_efficientnet", emb_dim=32, pretrained=False)
+    return model.eval()
+
+
+@pytest.mark.parametrize("runtime", ["torchscript", _onnx])
+def test_export_parity(tmp_path, eager, runtime):
+    model_path = str(tmp_path / "aethersight.pth")
+    exported = load_runtime(runtime, model_path, "test", torch.device("cpu"), lambda: eager, size=SIZE)
+
+    # 批大小与导出时的示例输入不同，同时检查动态 batch 维
+    inputs = torch.randn(3, 3, SIZE, SIZE)
+    max_abs_diff, min_cosine = compare_embeddings(eager, exported, inputs)
+
+    assert max_abs_diff <= TOLERANCE
+    assert min_cosine >= 1 - TOLERANCE